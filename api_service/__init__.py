@@ -0,0 +1,11 @@
+NAME = 'api_service_package'
+
+from .session import HttpSessionPool, http_pool
+from .single_flight import SingleFlight, single_flight
+from .scheduler import QuotaScheduler, PriorityTicket, quota_scheduler, request_ticket, current_priority
+from .resilience import RetryPolicy, CircuitBreaker, policy_for, breaker_for, count_event, resilience_stats
+from .cache import FRESH, STALE, EXPIRED, MISSING, freshness, file_freshness
+from .cache import MemoryTier, FileTier, ResponseCache, response_cache
+from .sqlite_store import SqliteTier
+from .compression import compress_directory, read_file, write_file
+from .prefetch import Prefetcher, summary_prefetcher, offer_prefetcher, page_prefetcher
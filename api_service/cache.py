@@ -0,0 +1,282 @@
+import asyncio
+import json
+import os
+import time
+import zlib
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Tuple, Union
+
+from constants import CACHE_TTL, CACHE_STALE_GRACE, CACHE_MEMORY_MAX_BYTES, CACHE_BACKEND
+from constants import NEGATIVE_CACHE_TTL, NEGATIVE_CACHE_MAX_BYTES
+from api_service.compression import find_file, read_file, write_file
+
+FRESH = "fresh"  # ответ можно отдавать
+STALE = "stale"  # ответ можно отдать, но его нужно обновить в фоне
+EXPIRED = "expired"  # ответ устарел, нужен новый запрос
+MISSING = "missing"  # ответа в кэше нет
+
+
+def freshness(created: Union[float, None], endpoint: str, now: float = None) -> str:
+    """
+    Определяет свежесть ответа в кэше по времени его создания и TTL для этого типа запросов.
+    :param created: время создания ответа (time.time()) или None если ответа нет
+    :param endpoint: тип запроса: place, offer или summary
+    :param now: текущее время
+    :return: FRESH, STALE, EXPIRED или MISSING
+    """
+    if created is None:
+        return MISSING
+    age = (time.time() if now is None else now) - created
+    ttl = CACHE_TTL.get(endpoint, 0)
+    if age <= ttl:
+        return FRESH
+    if age <= ttl + CACHE_STALE_GRACE.get(endpoint, 0):
+        return STALE
+    return EXPIRED
+
+
+def file_freshness(file_name: str, endpoint: str) -> str:
+    """ Определяет свежесть ответа, записанного в файл (сжатый или нет), по времени изменения файла """
+    found = find_file(file_name) if file_name else None
+    if found:
+        return freshness(os.path.getmtime(found), endpoint)
+    return MISSING
+
+
+class MemoryTier:
+    """
+    Кэш ответов в памяти процесса с вытеснением давно не использованных (LRU).
+    Размер каждого ответа учитывается по длине его json, общий объем ограничен max_bytes.
+    Ответ хранится уже разобранным, поэтому повторный запрос не читает файл и не разбирает json.
+    Хранимые ответы общие для всех, изменять их нельзя.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MEMORY_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size: int = 0
+        self._items: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __str__(self):
+        """ Строковое представление класса """
+        return f"память: {len(self._items)} ответов, {self.size} байт, попаданий: {self.hits}, промахов: {self.misses}"
+
+    def get(self, key: str) -> Tuple[Union[float, None], Any]:
+        """
+        Возвращает ответ по ключу и отмечает его как недавно использованный.
+        :return: кортеж (время создания, ответ) или (None, None) если ответа нет
+        """
+        item = self._items.get(key, None)
+        if item is None:
+            self.misses += 1
+            return None, None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[0], item[1]
+
+    def put(self, key: str, value: Any, created: float = None, size: int = None) -> bool:
+        """
+        Запоминает ответ, вытесняя давно не использованные, если превышен объем.
+        Ответ больше четверти всего объема не запоминается.
+        :param size: размер ответа в байтах, если неизвестен, то вычисляется по json
+        :return: True если ответ запомнен
+        """
+        if size is None:
+            size = len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        self.pop(key)
+        if size > self.max_bytes // 4:
+            return False
+        self._items[key] = (time.time() if created is None else created, value, size)
+        self.size += size
+        while self.size > self.max_bytes and self._items:
+            _, (_, _, old_size) = self._items.popitem(last=False)
+            self.size -= old_size
+            self.evictions += 1
+        return True
+
+    def pop(self, key: str) -> None:
+        """ Удаляет ответ из кэша """
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.size -= item[2]
+
+
+class FileTier:
+    """
+    Кэш ответов в файлах папки json_data.
+    Файлы сжимаются методом CACHE_COMPRESSION, несжатые .json файлы тоже читаются.
+    Время создания ответа - время изменения файла.
+    """
+
+    def __init__(self):
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __str__(self):
+        """ Строковое представление класса """
+        return f"файлы: попаданий: {self.hits}, промахов: {self.misses}"
+
+    def get(self, key: str, file_name: str) -> Tuple[Union[float, None], Any, int]:
+        """
+        Читает ответ из файла.
+        :param key: ключ запроса, не используется, файл определяется его именем
+        :param file_name: имя файла с ответом
+        :return: кортеж (время создания, ответ, размер в байтах) или (None, None, 0) если файла нет
+        """
+        try:
+            created, raw = read_file(file_name)
+            value = json.loads(raw) if raw is not None else None
+        except (OSError, ValueError, EOFError, zlib.error) as err:
+            print(f"ошибка чтения кэша из файла {file_name}: {err}")
+            created = None
+        if created is None:
+            self.misses += 1
+            return None, None, 0
+        self.hits += 1
+        return created, value, len(raw)
+
+    def put(self, key: str, file_name: str, endpoint: str, value: Any, created: float = None) -> bool:
+        """
+        Записывает сжатый ответ во временный файл и переименовывает его,
+        поэтому другой процесс никогда не прочитает недописанный файл.
+        :param created: время создания ответа, если он получен раньше, чем записывается
+        :return: True если файл записан
+        """
+        try:
+            write_file(file_name, json.dumps(value, ensure_ascii=False).encode("utf-8"), created)
+            return True
+        except OSError as err:
+            print(f">>FileTier: файл {file_name} записать не удалось.\n{err}")
+        return False
+
+    def close(self) -> None:
+        """ Файлы закрываются после каждого чтения и записи, закрывать нечего """
+
+
+class ResponseCache:
+    """
+    Двухуровневый кэш ответов Hotels.com: память процесса (MemoryTier) перед диском.
+    Диск - файлы json_data (FileTier) или одна БД SQLite (SqliteTier), выбирается константой CACHE_BACKEND.
+    Ответ ищется сначала в памяти по ключу запроса, потом на диске. Найденный на диске ответ
+    запоминается в памяти, поэтому повторные запросы популярных регионов и отелей
+    не обращаются к файловой системе.
+    Кроме ответов хранит в памяти отрицательные ответы: пустой результат или ошибку запроса
+    с коротким временем жизни NEGATIVE_CACHE_TTL.
+    Асинхронный код использует get_async и put_async: диск читается и пишется в потоке, не блокируя event loop.
+    """
+
+    def __init__(self, memory: MemoryTier = None, disk: FileTier = None):
+        self.memory = MemoryTier() if memory is None else memory
+        self.disk = FileTier() if disk is None else disk
+        self.negative = MemoryTier(max_bytes=NEGATIVE_CACHE_MAX_BYTES)
+        self.negative_hits: Counter = Counter()
+        self.negative_stored: Counter = Counter()
+
+    def __str__(self):
+        """ Строковое представление класса """
+        return f"{self.memory}; {self.disk}"
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """ Счетчики попаданий и промахов по уровням кэша """
+        return {
+            "memory": {"hits": self.memory.hits, "misses": self.memory.misses, "items": len(self.memory),
+                       "bytes": self.memory.size, "evictions": self.memory.evictions},
+            "disk": {"hits": self.disk.hits, "misses": self.disk.misses},
+        }
+
+    def get(self, key: str, file_name: str) -> Tuple[Union[float, None], Any]:
+        """
+        Ищет ответ в памяти, потом на диске.
+        :param key: ключ запроса
+        :param file_name: имя файла с ответом
+        :return: кортеж (время создания, ответ) или (None, None) если ответа нет
+        """
+        created, value = self.memory.get(key)
+        if created is None and file_name:
+            created, value, size = self.disk.get(key, file_name)
+            if created is not None:
+                self.memory.put(key, value, created, size)
+        return created, value
+
+    def put(self, key: str, file_name: str, value: Any, endpoint: str = "", created: float = None) -> None:
+        """
+        Запоминает ответ в памяти и записывает на диск
+        :param created: время создания ответа, по умолчанию текущее
+        """
+        self.memory.put(key, value, created)
+        if file_name:
+            self.disk.put(key, file_name, endpoint, value, created)
+
+    def close(self) -> None:
+        """ Закрывает дисковый уровень, например соединение SqliteTier, при остановке бота """
+        self.disk.close()
+
+    async def get_async(self, key: str, file_name: str) -> Tuple[Union[float, None], Any]:
+        """
+        Асинхронный вариант get: ответ из памяти отдается сразу,
+        чтение с диска выполняется в потоке asyncio.to_thread и не блокирует event loop бота.
+        """
+        created, value = self.memory.get(key)
+        if created is None and file_name:
+            created, value, size = await asyncio.to_thread(self.disk.get, key, file_name)
+            if created is not None:
+                self.memory.put(key, value, created, size)
+        return created, value
+
+    async def put_async(self, key: str, file_name: str, value: Any, endpoint: str = "",
+                        created: float = None) -> None:
+        """ Асинхронный вариант put: запись на диск выполняется в потоке asyncio.to_thread """
+        self.memory.put(key, value, created)
+        if file_name:
+            await asyncio.to_thread(self.disk.put, key, file_name, endpoint, value, created)
+
+    def get_negative(self, key: str, endpoint: str) -> Union[str, None]:
+        """
+        Проверяет, есть ли еще живой отрицательный ответ на запрос.
+        :return: причина отрицательного ответа или None
+        """
+        reason = self._negative_reason(key, endpoint)
+        if reason is not None:
+            self.negative_hits[endpoint] += 1
+        return reason
+
+    def is_empty(self, key: str, endpoint: str) -> bool:
+        """
+        Известно ли, что сервер недавно ответил на запрос пустым результатом.
+        В отличие от get_negative, не считается сэкономленным запросом: вызывается после самого запроса,
+        чтобы отличить пустой ответ от неудачного.
+        """
+        return self._negative_reason(key, endpoint) == "empty"
+
+    def _negative_reason(self, key: str, endpoint: str) -> Union[str, None]:
+        """ Причина еще живого отрицательного ответа на запрос или None """
+        created, reason = self.negative.get(key)
+        if created is None or time.time() - created > NEGATIVE_CACHE_TTL.get(endpoint, 0):
+            return None
+        return reason
+
+    def put_negative(self, key: str, endpoint: str, reason: str) -> None:
+        """ Запоминает отрицательный ответ на запрос: "empty" - пустой результат, "http_400" - ошибка запроса """
+        self.negative_stored[endpoint] += 1
+        self.negative.put(key, reason, size=len(key) + len(reason))
+
+    def negative_stats(self) -> Dict[str, dict]:
+        """ Счетчики отрицательных ответов: сколько запомнено и сколько запросов ими сэкономлено """
+        return {"stored": dict(self.negative_stored), "hits": dict(self.negative_hits)}
+
+
+def make_disk_tier() -> Union[FileTier, "SqliteTier"]:
+    """ Создает дисковый уровень кэша в соответствии с константой CACHE_BACKEND """
+    if CACHE_BACKEND == "sqlite":
+        from api_service.sqlite_store import SqliteTier
+        return SqliteTier()
+    return FileTier()
+
+
+# общий для всех пользователей кэш ответов Hotels.com
+response_cache = ResponseCache(disk=make_disk_tier())
@@ -0,0 +1,124 @@
+import gzip
+import os
+from typing import List, Tuple, Union
+
+from constants import CACHE_COMPRESSION
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+""" окончания имен сжатых файлов """
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def current_compression() -> str:
+    """ Возвращает используемое сжатие: CACHE_COMPRESSION, или gzip, если для zstd не установлен zstandard """
+    if CACHE_COMPRESSION == "zstd" and zstandard is None:
+        return "gzip"
+    return CACHE_COMPRESSION if CACHE_COMPRESSION in SUFFIXES else ""
+
+
+def compress(data: bytes, method: str) -> bytes:
+    """ Сжимает данные указанным методом """
+    if method == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if method == "zstd":
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return data
+
+
+def decompress(data: bytes, file_name: str) -> bytes:
+    """ Распаковывает данные, метод определяется по окончанию имени файла """
+    if file_name.endswith(SUFFIXES["gzip"]):
+        return gzip.decompress(data)
+    if file_name.endswith(SUFFIXES["zstd"]):
+        if zstandard is None:
+            raise OSError(f"для чтения {file_name} нужен пакет zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def stored_name(file_name: str) -> str:
+    """ Имя файла, в который записываются данные для file_name с учетом сжатия """
+    suffix = SUFFIXES.get(current_compression(), "")
+    return file_name if not suffix or file_name.endswith(suffix) else file_name + suffix
+
+
+def find_file(file_name: str) -> Union[str, None]:
+    """
+    Ищет записанный файл для file_name: сначала сжатый текущим методом, потом другими,
+    последним несжатый, поэтому старые .json файлы тоже читаются.
+    :return: имя найденного файла или None
+    """
+    candidates = [stored_name(file_name)] + [file_name + suffix for suffix in SUFFIXES.values()] + [file_name]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def read_file(file_name: str) -> Tuple[Union[float, None], Union[bytes, None]]:
+    """
+    Читает и распаковывает данные, записанные для file_name.
+    :return: кортеж (время изменения файла, данные) или (None, None) если файла нет
+    """
+    found = find_file(file_name) if file_name else None
+    if found is None:
+        return None, None
+    created = os.path.getmtime(found)
+    with open(found, 'rb') as file_in:
+        return created, decompress(file_in.read(), found)
+
+
+def write_file(file_name: str, data: bytes, created: float = None) -> str:
+    """
+    Сжимает и записывает данные для file_name во временный файл, потом переименовывает его,
+    поэтому другой процесс никогда не прочитает недописанный файл.
+    Несжатый файл с тем же именем, если он был, удаляется.
+    :param created: время создания данных, если они получены раньше, чем записываются
+    :return: имя записанного файла
+    """
+    target = stored_name(file_name)
+    tmp_file_name = f"{target}.{os.getpid()}.tmp"
+    with open(tmp_file_name, 'wb') as file_out:
+        file_out.write(compress(data, current_compression()))
+    os.replace(tmp_file_name, target)
+    if created is not None:
+        os.utime(target, (created, created))
+    if target != file_name and os.path.exists(file_name):
+        os.remove(file_name)
+    return target
+
+
+def compress_directory(directory: str, method: str = None) -> List[str]:
+    """
+    Сжимает на месте все несжатые .json файлы папки, сохраняя время их изменения.
+    :param directory: папка с файлами, обычно json_data
+    :param method: метод сжатия, по умолчанию текущий
+    :return: список записанных файлов
+    """
+    method = current_compression() if method is None else method
+    suffix = SUFFIXES.get(method, "")
+    written = []
+    if not suffix or (method == "zstd" and zstandard is None):
+        print(f"сжатие {method} недоступно")
+        return written
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        source = os.path.join(directory, name)
+        created = os.path.getmtime(source)
+        with open(source, 'rb') as file_in:
+            data = file_in.read()
+        target = source + suffix
+        tmp_file_name = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_file_name, 'wb') as file_out:
+            file_out.write(compress(data, method))
+        os.replace(tmp_file_name, target)
+        os.utime(target, (created, created))
+        os.remove(source)
+        written.append(target)
+    return written
+
@@ -0,0 +1,155 @@
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from constants import PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, PREFETCH_CONCURRENCY, PREFETCH_RESULT_TTL
+from api_service.scheduler import PriorityTicket, quota_scheduler, request_ticket
+
+
+class PrefetchTask:
+    """
+    Упреждающий запрос: задача, функция запроса и билет приоритета для планировщика.
+    started: задача дождалась семафора и выполняет factory()
+    """
+    __slots__ = ("task", "factory", "ticket", "started")
+
+    def __init__(self, factory: Callable[[], Awaitable[Any]]):
+        self.factory = factory
+        self.ticket = PriorityTicket(PRIORITY_PREFETCH)
+        self.started = False
+        self.task: asyncio.Task = None
+
+
+class Prefetcher:
+    """
+    Упреждающие запросы для пользователя: запускаются в фоне, пока пользователь читает меню,
+    а результат забирается, когда пользователь сделает выбор.
+    Задачи хранятся по id пользователя и ключу запроса, одновременно выполняется не больше concurrency.
+    Задачи не запускаются, если планировщик отбрасывает запросы с приоритетом PRIORITY_PREFETCH.
+    Если пользователь пришел за результатом раньше, чем запрос выполнен, то запрос становится запросом
+    пользователя (PRIORITY_INTERACTIVE) и не ждет за другими упреждающими запросами.
+    Результат, который никто не забрал, удаляется через PREFETCH_RESULT_TTL секунд.
+    started: запущено задач, used: результат пригодился, wasted: не пригодился или отменен,
+    promoted: пользователь ждал незаконченный запрос, expired: результат удален без использования
+    """
+
+    def __init__(self, concurrency: int = PREFETCH_CONCURRENCY, result_ttl: float = PREFETCH_RESULT_TTL):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.result_ttl = result_ttl
+        self._tasks: Dict[int, Dict[str, PrefetchTask]] = {}
+        self.counters: Counter = Counter()
+
+    def __str__(self):
+        """ Строковое представление класса """
+        return f"упреждающие запросы: {dict(self.counters)}, доля попаданий: {self.hit_rate():.2f}"
+
+    def hit_rate(self) -> float:
+        """ Доля упреждающих запросов, результат которых пригодился """
+        done = self.counters["used"] + self.counters["wasted"]
+        return self.counters["used"] / done if done else 0.0
+
+    def worthwhile(self, min_hit_rate: float, min_samples: int) -> bool:
+        """
+        Стоит ли продолжать упреждающие запросы: пока результатов меньше min_samples,
+        запросы выполняются для набора статистики, затем только если доля попаданий не ниже min_hit_rate.
+        """
+        done = self.counters["used"] + self.counters["wasted"]
+        return done < min_samples or self.hit_rate() >= min_hit_rate
+
+    def stats(self) -> Dict[str, Any]:
+        """ Счетчики упреждающих запросов """
+        return {**dict(self.counters), "hit_rate": self.hit_rate()}
+
+    @staticmethod
+    async def _call(prefetch: PrefetchTask) -> Any:
+        """ Выполняет запрос с билетом приоритета: его наследуют все запросы и задачи, созданные factory() """
+        request_ticket.set(prefetch.ticket)
+        return await prefetch.factory()
+
+    async def _run(self, prefetch: PrefetchTask) -> Any:
+        """ Выполняет запрос, ограничивая количество одновременных упреждающих запросов """
+        async with self.semaphore:
+            prefetch.started = True
+            return await self._call(prefetch)
+
+    def start(self, user_id: int, key: str, factory: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Запускает упреждающий запрос factory() для пользователя, если он еще не запущен.
+        :param user_id: id пользователя
+        :param key: ключ запроса, по нему результат забирается методом take
+        :param factory: функция, создающая корутину запроса
+        :return: True если запрос запущен
+        """
+        tasks = self._tasks.setdefault(user_id, {})
+        if key in tasks:
+            return False
+        if quota_scheduler.should_shed(PRIORITY_PREFETCH):
+            self.counters["shed"] += 1
+            return False
+        prefetch = PrefetchTask(factory)
+        prefetch.task = asyncio.ensure_future(self._run(prefetch))
+        prefetch.task.add_done_callback(lambda done: self._finished(user_id, key, prefetch))
+        tasks[key] = prefetch
+        self.counters["started"] += 1
+        return True
+
+    def _finished(self, user_id: int, key: str, prefetch: PrefetchTask) -> None:
+        """ Через result_ttl секунд после завершения удаляет результат, если его так и не забрали """
+        if not prefetch.task.cancelled():
+            prefetch.task.exception()
+            asyncio.get_running_loop().call_later(self.result_ttl, self._expire, user_id, key, prefetch)
+
+    def _expire(self, user_id: int, key: str, prefetch: PrefetchTask) -> None:
+        """ Удаляет незабранный результат упреждающего запроса """
+        tasks = self._tasks.get(user_id, {})
+        if tasks.get(key, None) is prefetch:
+            tasks.pop(key)
+            self.counters["wasted"] += 1
+            self.counters["expired"] += 1
+            if not tasks:
+                self._tasks.pop(user_id, None)
+
+    async def take(self, user_id: int, key: str) -> Tuple[bool, Any]:
+        """
+        Забирает результат упреждающего запроса, если запрос еще выполняется, то дожидается его.
+        Запрос, который еще ждет семафора, отменяется и выполняется сразу с приоритетом PRIORITY_INTERACTIVE,
+        а запросы уже выполняемого поднимаются в очереди планировщика до PRIORITY_INTERACTIVE.
+        :return: кортеж (найден ли запрос, результат запроса)
+        """
+        prefetch = self._tasks.get(user_id, {}).pop(key, None)
+        if prefetch is None:
+            return False, None
+        task = prefetch.task
+        if not task.done():
+            self.counters["promoted"] += 1
+            quota_scheduler.promote(prefetch.ticket, PRIORITY_INTERACTIVE)
+            if not prefetch.started:
+                task.cancel()
+                task = asyncio.ensure_future(self._call(prefetch))
+        try:
+            result = await task
+        except Exception:
+            result = None
+        self.counters["used" if result else "wasted"] += 1
+        return bool(result), result
+
+    def discard(self, user_id: int, key: str) -> None:
+        """ Отменяет упреждающий запрос, результат которого не понадобится """
+        prefetch = self._tasks.get(user_id, {}).pop(key, None)
+        if prefetch is not None:
+            prefetch.task.cancel()
+            self.counters["wasted"] += 1
+
+    def cancel(self, user_id: int) -> None:
+        """ Отменяет все упреждающие запросы пользователя, например по команде /cancel """
+        for key in list(self._tasks.get(user_id, {})):
+            self.discard(user_id, key)
+        self._tasks.pop(user_id, None)
+
+
+# упреждающие запросы подробностей отеля для первых отелей меню
+summary_prefetcher = Prefetcher()
+# упреждающие запросы списка отелей после ввода дат для самого частого состава гостей
+offer_prefetcher = Prefetcher()
+# упреждающие запросы следующей страницы выдачи отелей, когда пользователь листает меню
+page_prefetcher = Prefetcher()
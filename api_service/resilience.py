@@ -0,0 +1,135 @@
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict
+
+from constants import BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Политика повторов и таймаутов для одного типа запросов к Hotels.com
+    attempts: количество попыток
+    base_delay: пауза перед первым повтором, секунд
+    max_delay: максимальная пауза между повторами, секунд
+    connect_timeout: таймаут установки соединения, секунд
+    read_timeout: таймаут чтения ответа, секунд
+    """
+    attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 4.0
+    connect_timeout: float = 3.05
+    read_timeout: float = 6.1
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Пауза перед повтором номер attempt (с 0): экспоненциальный рост, ограниченный max_delay,
+        со случайным разбросом (full jitter), чтобы повторы разных пользователей не совпадали.
+        """
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+""" политики для каждого типа запросов, ключ - tail_url запроса """
+ENDPOINT_POLICIES: Dict[str, RetryPolicy] = {
+    "/locations/v3/search": RetryPolicy(attempts=3, base_delay=0.3, max_delay=2.0, read_timeout=4.0),
+    "/properties/v2/list": RetryPolicy(attempts=3, base_delay=0.5, max_delay=4.0, read_timeout=8.0),
+    "/properties/v2/get-summary": RetryPolicy(attempts=2, base_delay=0.5, max_delay=3.0, read_timeout=6.1),
+}
+DEFAULT_POLICY = RetryPolicy()
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для одного типа запросов.
+    После failure_threshold неудач подряд цепь размыкается (OPEN) и запросы сразу завершаются неудачей,
+    не дожидаясь таймаутов. Через reset_timeout секунд пропускается один пробный запрос (HALF_OPEN):
+    если он удачный, цепь замыкается (CLOSED), иначе снова размыкается.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state: str = self.CLOSED
+        self.failures: int = 0
+        self.opened_at: float = 0.0
+        self._probe_in_flight: bool = False
+
+    def __str__(self):
+        """ Строковое представление класса """
+        return f"state: {self.state}, failures: {self.failures}"
+
+    def allow(self) -> bool:
+        """ Можно ли сейчас отправить запрос """
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        # пробный запрос, который так и не завершился, через reset_timeout заменяется новым
+        if self.state == self.HALF_OPEN and (not self._probe_in_flight or now - self.opened_at >= self.reset_timeout):
+            self._probe_in_flight = True
+            self.opened_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """ Удачный запрос замыкает цепь """
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> bool:
+        """
+        Учитывает неудачный запрос.
+        :return: True если цепь только что разомкнулась
+        """
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            opened = self.state != self.OPEN
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            return opened
+        return False
+
+
+breakers: Dict[str, CircuitBreaker] = {}
+
+""" счетчики событий по типам запросов, ключ (tail_url, событие) """
+resilience_metrics: Counter = Counter()
+
+
+def policy_for(tail_url: str) -> RetryPolicy:
+    """ Возвращает политику повторов для запроса с окончанием url tail_url """
+    return ENDPOINT_POLICIES.get(tail_url, DEFAULT_POLICY)
+
+
+def breaker_for(tail_url: str) -> CircuitBreaker:
+    """ Возвращает размыкатель цепи для запроса с окончанием url tail_url """
+    if tail_url not in breakers:
+        breakers[tail_url] = CircuitBreaker()
+    return breakers[tail_url]
+
+
+def count_event(tail_url: str, event: str) -> None:
+    """ Увеличивает счетчик события event для запроса tail_url """
+    resilience_metrics[(tail_url, event)] += 1
+    if event == "breaker_open":
+        print(f"{tail_url}: цепь разомкнута, запросы к Hotels.com временно не отправляются")
+
+
+def resilience_stats() -> Dict[str, dict]:
+    """ Счетчики повторов, таймаутов и состояние размыкателей по типам запросов """
+    stats = {}
+    for (tail_url, event), value in resilience_metrics.items():
+        stats.setdefault(tail_url, {})[event] = value
+    for tail_url, breaker in breakers.items():
+        stats.setdefault(tail_url, {})["breaker"] = breaker.state
+    return stats
@@ -0,0 +1,221 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, List, Tuple, Union
+
+from constants import API_RATE_PER_SECOND, API_RATE_BURST, QUOTA_RESERVE, PRIORITY_INTERACTIVE
+
+
+class PriorityTicket:
+    """
+    Приоритет всех запросов одной фоновой задачи, например упреждающего запроса.
+    Задача устанавливает билет в request_ticket, планировщик запоминает в нем ожидающие запросы,
+    поэтому, когда результат задачи понадобился пользователю, ее запросы можно поднять в очереди (promote),
+    даже если они выполняются в общих задачах single_flight: задачи наследуют билет вместе с контекстом.
+    """
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.waiters: List[asyncio.Future] = []
+
+
+""" билет приоритета текущей задачи или None, если запросы задачи идут со своим приоритетом """
+request_ticket: ContextVar[Union[PriorityTicket, None]] = ContextVar("request_ticket", default=None)
+
+
+def current_priority(priority: int) -> int:
+    """ Приоритет запроса с учетом билета текущей задачи: билет может только повысить приоритет """
+    ticket = request_ticket.get()
+    return priority if ticket is None else min(priority, ticket.priority)
+
+
+class QuotaScheduler:
+    """
+    Центральный планировщик запросов к Hotels.com.
+    Ограничивает частоту запросов алгоритмом token bucket и следит за остатком лимитов RapidAPI,
+    который приходит в headers каждого ответа.
+    Запросы ждут свою очередь в порядке приоритета: сначала запросы пользователей (PRIORITY_INTERACTIVE),
+    потом упреждающие запросы и прогрев кэша. Когда месячный лимит заканчивается, запросы с низким
+    приоритетом отбрасываются (доля резерва для каждого приоритета в QUOTA_RESERVE),
+    а запросы пользователей проходят всегда.
+    rate: сколько запросов в секунду можно отправлять
+    burst: сколько запросов можно отправить подряд без ожидания
+    reserve: словарь {приоритет: доля месячного лимита, ниже которой запрос отбрасывается}
+    """
+
+    def __init__(self, rate: float = API_RATE_PER_SECOND, burst: int = API_RATE_BURST,
+                 reserve: Dict[int, float] = None):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = QUOTA_RESERVE if reserve is None else reserve
+        self.tokens: float = float(burst)
+        self.updated: float = time.monotonic()
+        self.paused_until: float = 0.0
+
+        self.limit: Union[int, None] = None  # месячный лимит запросов
+        self.remaining: Union[int, None] = None  # остаток месячного лимита
+        self.second_remaining: Union[int, None] = None  # остаток запросов в текущую секунду
+
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._dispatcher: Union[asyncio.Task, None] = None
+
+        self.granted: Counter = Counter()
+        self.queued: Counter = Counter()
+        self.shed: Counter = Counter()
+        self.promoted: Counter = Counter()
+
+    def __str__(self):
+        """ Строковое представление класса """
+        return f"лимит: {self.limit}, осталось: {self.remaining}, токенов: {self.tokens:.1f}, " \
+               f"в очереди: {len(self._waiters)}, отправлено: {dict(self.granted)}, " \
+               f"отброшено: {dict(self.shed)}"
+
+    def stats(self) -> Dict[str, Any]:
+        """ Счетчики планировщика по приоритетам """
+        return {"limit": self.limit, "remaining": self.remaining, "waiting": len(self._waiters),
+                "granted": dict(self.granted), "queued": dict(self.queued), "shed": dict(self.shed),
+                "promoted": dict(self.promoted)}
+
+    def budget_fraction(self) -> Union[float, None]:
+        """ Доля оставшегося месячного лимита или None, если лимит еще неизвестен """
+        if self.limit and self.remaining is not None:
+            return self.remaining / self.limit
+        return None
+
+    def should_shed(self, priority: int) -> bool:
+        """ Нужно ли отбросить запрос с приоритетом priority при текущем остатке лимита """
+        if priority <= PRIORITY_INTERACTIVE:
+            return False
+        fraction = self.budget_fraction()
+        return fraction is not None and fraction <= self.reserve.get(priority, 0.0)
+
+    def update_from_headers(self, headers: Any) -> None:
+        """
+        Запоминает остатки лимитов из headers ответа RapidAPI.
+        X-RateLimit-Requests-*: месячный лимит, X-RateLimit-*: лимит текущего окна (секунды).
+        """
+        limit = _int_header(headers, 'X-RateLimit-Requests-Limit')
+        remaining = _int_header(headers, 'X-RateLimit-Requests-Remaining')
+        if limit is not None:
+            self.limit = limit
+        if remaining is not None:
+            self.remaining = remaining
+        second_remaining = _int_header(headers, 'X-RateLimit-Remaining')
+        if second_remaining is not None:
+            self.second_remaining = second_remaining
+            if second_remaining <= 0:
+                reset = _int_header(headers, 'X-RateLimit-Reset')
+                self.throttle(float(reset) if reset else 1.0)
+
+    def throttle(self, seconds: float) -> None:
+        """ Приостанавливает отправку запросов на seconds секунд, например после ответа 429 """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def too_many_requests(self, headers: Any = None) -> None:
+        """ Приостанавливает отправку запросов после ответа 429 на время из заголовка Retry-After """
+        retry_after = _int_header(headers, 'Retry-After')
+        self.throttle(float(retry_after) if retry_after else 1.0)
+
+    def _refill(self) -> None:
+        """ Пополняет token bucket за прошедшее время """
+        now = time.monotonic()
+        self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _wait_time(self) -> float:
+        """ Сколько секунд ждать до следующего свободного токена """
+        now = time.monotonic()
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1.0:
+            wait = max(wait, (1.0 - self.tokens) / self.rate)
+        return wait
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> bool:
+        """
+        Ждет разрешения отправить один запрос.
+        Если у задачи есть билет приоритета (request_ticket), то ожидание запоминается в билете для promote.
+        :param priority: приоритет запроса, чем меньше число, тем раньше он будет отправлен
+        :return: True если запрос можно отправлять, False если он отброшен из-за остатка лимита
+        """
+        priority = current_priority(priority)
+        if self.should_shed(priority):
+            self.shed[priority] += 1
+            return False
+        self._refill()
+        if not self._waiters and self._wait_time() == 0.0:
+            self.tokens -= 1.0
+            self.granted[priority] += 1
+            return True
+
+        self.queued[priority] += 1
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        ticket = request_ticket.get()
+        if ticket is not None:
+            ticket.waiters.append(waiter)
+        self._start_dispatcher()
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            waiter.cancel()
+            raise
+        finally:
+            if ticket is not None:
+                ticket.waiters.remove(waiter)
+
+    def promote(self, ticket: PriorityTicket, priority: int = PRIORITY_INTERACTIVE) -> None:
+        """
+        Повышает приоритет запросов задачи с билетом ticket: уже ожидающие запросы ставятся в очередь
+        еще раз с новым приоритетом, следующие запросы задачи сразу получат его в acquire.
+        Старая запись ожидания остается в очереди и пропускается, когда запрос уже получил разрешение.
+        """
+        if priority >= ticket.priority:
+            return
+        ticket.priority = priority
+        for waiter in ticket.waiters:
+            if not waiter.done():
+                heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+                self.promoted[priority] += 1
+        if self._waiters:
+            self._start_dispatcher()
+
+    def _start_dispatcher(self) -> None:
+        """ Запускает раздачу токенов, если она еще не запущена """
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        """ Раздает токены ожидающим запросам в порядке приоритета """
+        while self._waiters:
+            self._refill()
+            wait = self._wait_time()
+            if wait > 0.0:
+                await asyncio.sleep(wait)
+                continue
+            priority, _, waiter = heapq.heappop(self._waiters)
+            if waiter.done():
+                continue
+            if self.should_shed(priority):
+                self.shed[priority] += 1
+                waiter.set_result(False)
+                continue
+            self.tokens -= 1.0
+            self.granted[priority] += 1
+            waiter.set_result(True)
+
+
+def _int_header(headers: Any, name: str) -> Union[int, None]:
+    """ Возвращает целое значение заголовка или None """
+    value = headers.get(name, None) if headers else None
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# общий для всех пользователей планировщик запросов к Hotels.com
+quota_scheduler = QuotaScheduler()
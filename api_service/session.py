@@ -0,0 +1,67 @@
+import asyncio
+from typing import Union
+
+import aiohttp
+
+from constants import HTTP_CONNECTIONS_LIMIT, HTTP_CONNECTIONS_LIMIT_PER_HOST, HTTP_KEEPALIVE_TIMEOUT
+
+
+class HttpSessionPool:
+    """
+    Общая для всех запросов к Hotels.com сессия aiohttp.
+    Сессия создается лениво при первом обращении внутри работающего event loop и
+    держит пул keep-alive соединений, поэтому медленный ответ на один запрос
+    не блокирует обработку сообщений других пользователей.
+    limit: общее количество соединений в пуле
+    limit_per_host: количество одновременных соединений к одному хосту
+    keepalive_timeout: сколько секунд держать простаивающее соединение открытым
+    """
+
+    def __init__(self, limit: int = HTTP_CONNECTIONS_LIMIT,
+                 limit_per_host: int = HTTP_CONNECTIONS_LIMIT_PER_HOST,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Union[aiohttp.ClientSession, None] = None
+        self._lock: Union[asyncio.Lock, None] = None
+
+    def __str__(self):
+        """ Строковое представление класса """
+        return f"limit: {self.limit}, limit_per_host: {self.limit_per_host}, " \
+               f"keepalive: {self.keepalive_timeout}, open: {self.is_open}"
+
+    @property
+    def is_open(self) -> bool:
+        """ Открыта ли сессия """
+        return self._session is not None and not self._session.closed
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        Возвращает открытую сессию, при необходимости создает ее.
+        :return: экземпляр aiohttp.ClientSession
+        """
+        if self.is_open:
+            return self._session
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.is_open:
+                connector = aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                    ttl_dns_cache=300
+                )
+                self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        """ Закрывает сессию и все соединения пула """
+        if self.is_open:
+            await self._session.close()
+        self._session = None
+
+
+# общий пул соединений для всех запросов к Hotels.com
+http_pool = HttpSessionPool()
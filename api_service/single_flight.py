@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """
+    Объединяет одинаковые одновременные запросы к Hotels.com.
+    Первый вызов с ключом key запускает запрос, все остальные вызовы с тем же ключом,
+    пришедшие пока запрос выполняется, ждут его результат и не тратят лимит запросов.
+    leaders: сколько запросов было действительно отправлено
+    shared: сколько вызовов получили результат чужого запроса (сэкономлено запросов)
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+        self.leaders: int = 0
+        self.shared: int = 0
+
+    def __str__(self):
+        """ Строковое представление класса """
+        return f"отправлено запросов: {self.leaders}, сэкономлено запросов: {self.shared}, " \
+               f"выполняется: {len(self._flights)}"
+
+    def in_flight(self, key: str) -> bool:
+        """ Выполняется ли сейчас запрос с ключом key """
+        return key in self._flights
+
+    def stats(self) -> Dict[str, int]:
+        """ Счетчики объединенных запросов """
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._flights)}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Возвращает результат запроса с ключом key.
+        Если такой запрос уже выполняется, то ждет его результат, иначе запускает factory().
+        Запрос выполняется в отдельной задаче, поэтому отмена одного из ожидающих
+        не прерывает запрос для остальных.
+        :param key: нормализованный ключ запроса
+        :param factory: функция, создающая корутину запроса
+        :return: результат запроса
+        """
+        flight = self._flights.get(key, None)
+        if flight is not None:
+            self.shared += 1
+        else:
+            self.leaders += 1
+            flight = asyncio.ensure_future(factory())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(flight)
+
+    def _forget(self, key: str, flight: asyncio.Future) -> None:
+        """ Удаляет завершенный запрос, чтобы следующий вызов с тем же ключом отправил новый """
+        if self._flights.get(key, None) is flight:
+            self._flights.pop(key, None)
+        if not flight.cancelled():
+            flight.exception()
+
+
+# общий для всех пользователей объединитель запросов к Hotels.com
+single_flight = SingleFlight()
@@ -0,0 +1,171 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Tuple, Union
+
+from constants import CACHE_DB_NAME, CACHE_DB_MAX_BYTES, CACHE_DB_BUSY_TIMEOUT, CACHE_DB_TOUCH_INTERVAL
+from constants import CACHE_DB_TOUCH_BATCH
+
+
+class SqliteTier:
+    """
+    Дисковый уровень кэша ответов Hotels.com в одной БД SQLite вместо отдельного файла на каждый запрос.
+    БД работает в режиме WAL, поэтому несколько процессов бота могут одновременно читать и писать,
+    а занятая другим процессом БД ждет CACHE_DB_BUSY_TIMEOUT миллисекунд вместо ошибки.
+    Соединение одно на все время работы, поэтому PRAGMA действуют для каждого запроса.
+    Методы вызываются из потоков asyncio.to_thread (ResponseCache.get_async/put_async), доступ к соединению
+    разделяется блокировкой.
+    Ответы хранятся сжатыми zlib. Когда объем ответов превышает max_bytes,
+    вытесняются те, что дольше всех не читались (LRU по last_access).
+    Чтение не пишет в БД: время чтения запоминается, если прежнее старше CACHE_DB_TOUCH_INTERVAL секунд,
+    и записывается пачкой из CACHE_DB_TOUCH_BATCH ответов или вместе со следующей записью ответа.
+    db_name: имя файла БД
+    max_bytes: максимальный объем сжатых ответов
+    """
+    queries = {
+        "CREATE_RESPONSES": """ /* Таблица ответов Hotels.com */
+                CREATE TABLE IF NOT EXISTS responses
+                (
+                    key TEXT PRIMARY KEY,           -- хэш параметров запроса
+                    endpoint TEXT NOT NULL,         -- тип запроса: place, offer, summary
+                    created REAL NOT NULL,          -- время получения ответа
+                    last_access REAL NOT NULL,      -- время последнего чтения с точностью CACHE_DB_TOUCH_INTERVAL
+                    size INTEGER NOT NULL,          -- размер сжатого ответа
+                    body BLOB NOT NULL              -- json ответа сжатый zlib
+                );
+                """,
+        "CREATE_ACCESS_INDEX": """CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);""",
+        "SELECT_RESPONSE": """SELECT created, last_access, body FROM responses WHERE key = ?;""",
+        "DELETE_RESPONSE": """DELETE FROM responses WHERE key = ?;""",
+        "TOUCH_RESPONSE": """UPDATE responses SET last_access = ? WHERE key = ?;""",
+        "UPSERT_RESPONSE": """
+                INSERT INTO responses (key, endpoint, created, last_access, size, body) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    endpoint = excluded.endpoint, created = excluded.created, last_access = excluded.last_access,
+                    size = excluded.size, body = excluded.body;
+                """,
+        "TOTAL_SIZE": """SELECT COALESCE(SUM(size), 0) FROM responses;""",
+        "EVICT_OLDEST": """
+                DELETE FROM responses WHERE key IN
+                    (SELECT key FROM responses ORDER BY last_access LIMIT ?);
+                """,
+    }
+
+    def __init__(self, db_name: str = CACHE_DB_NAME, max_bytes: int = CACHE_DB_MAX_BYTES):
+        self.db_name = db_name
+        self.max_bytes = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.touch_writes: int = 0
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.connect = sqlite3.connect(db_name, timeout=CACHE_DB_BUSY_TIMEOUT / 1000, check_same_thread=False)
+        try:
+            with self._lock, self.connect:
+                self.connect.execute(f"PRAGMA busy_timeout={int(CACHE_DB_BUSY_TIMEOUT)};")
+                self.connect.execute("PRAGMA journal_mode=WAL;")
+                self.connect.execute("PRAGMA synchronous=NORMAL;")
+                self.connect.execute(self.queries['CREATE_RESPONSES'])
+                self.connect.execute(self.queries['CREATE_ACCESS_INDEX'])
+        except sqlite3.Error as err:
+            print(f"ошибка создания кэша в БД Sqlite3: {err}")
+
+    def __str__(self):
+        """ Строковое представление класса """
+        return f"sqlite {self.db_name}: попаданий: {self.hits}, промахов: {self.misses}, вытеснено: {self.evictions}"
+
+    def get(self, key: str, file_name: str = "") -> Tuple[Union[float, None], Any, int]:
+        """
+        Читает ответ из БД. Время чтения запоминается в памяти и записывается пачкой (_flush_touched).
+        Ответ, который не распаковывается или не разбирается как json, удаляется и считается промахом.
+        :param key: ключ запроса
+        :param file_name: не используется
+        :return: кортеж (время создания, ответ, размер в байтах) или (None, None, 0) если ответа нет
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                row = self.connect.execute(self.queries['SELECT_RESPONSE'], (key,)).fetchone()
+                if row and now - max(row[1], self._touched.get(key, 0.0)) > CACHE_DB_TOUCH_INTERVAL:
+                    self._touched[key] = now
+                    if len(self._touched) >= CACHE_DB_TOUCH_BATCH:
+                        with self.connect:
+                            self._flush_touched()
+        except sqlite3.Error as err:
+            print(f"ошибка чтения кэша из БД Sqlite3: {err}")
+            row = None
+        if row is not None:
+            try:
+                raw = zlib.decompress(row[2])
+                value = json.loads(raw)
+            except (zlib.error, ValueError, TypeError) as err:
+                print(f"ошибка чтения кэша из БД Sqlite3, испорченный ответ удален: {err}")
+                self._delete(key)
+                row = None
+        if row is None:
+            self.misses += 1
+            return None, None, 0
+        self.hits += 1
+        return row[0], value, len(raw)
+
+    def put(self, key: str, file_name: str, endpoint: str, value: Any, created: float = None) -> bool:
+        """
+        Записывает сжатый ответ в БД одной транзакцией вместе с накопленными временами чтения
+        и вытесняет старые ответы при превышении объема.
+        :param created: время создания ответа, по умолчанию текущее
+        :return: True если ответ записан
+        """
+        body = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        try:
+            with self._lock, self.connect:
+                self._touched.pop(key, None)
+                self._flush_touched()
+                self.connect.execute(self.queries['UPSERT_RESPONSE'],
+                                     (key, endpoint, now if created is None else created, now, len(body), body))
+                self._evict(self.connect.cursor())
+            return True
+        except sqlite3.Error as err:
+            print(f"ошибка записи кэша в БД Sqlite3: {err}")
+        return False
+
+    def close(self) -> None:
+        """ Записывает накопленные времена чтения и закрывает соединение """
+        with self._lock:
+            try:
+                with self.connect:
+                    self._flush_touched()
+            except sqlite3.Error as err:
+                print(f"ошибка записи кэша в БД Sqlite3: {err}")
+            self.connect.close()
+
+    def _delete(self, key: str) -> None:
+        """ Удаляет ответ, который не удалось прочитать, чтобы он не читался снова """
+        try:
+            with self._lock, self.connect:
+                self._touched.pop(key, None)
+                self.connect.execute(self.queries['DELETE_RESPONSE'], (key,))
+        except sqlite3.Error as err:
+            print(f"ошибка удаления кэша из БД Sqlite3: {err}")
+
+    def _flush_touched(self) -> None:
+        """ Записывает накопленные времена чтения одним executemany, вызывается под блокировкой в транзакции """
+        if self._touched:
+            self.connect.executemany(self.queries['TOUCH_RESPONSE'], [(y, x) for x, y in self._touched.items()])
+            self.touch_writes += 1
+            self._touched.clear()
+
+    def _evict(self, cur: sqlite3.Cursor) -> None:
+        """ Удаляет давно не читанные ответы, пока их объем больше max_bytes """
+        cur.execute(self.queries['TOTAL_SIZE'])
+        total = cur.fetchone()[0]
+        while total > self.max_bytes:
+            cur.execute(self.queries['EVICT_OLDEST'], (16,))
+            if cur.rowcount <= 0:
+                break
+            self.evictions += cur.rowcount
+            cur.execute(self.queries['TOTAL_SIZE'])
+            total = cur.fetchone()[0]
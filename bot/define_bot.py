@@ -65,6 +65,9 @@ async def constants_set(user_id: int = None) -> None:
         user_set = storage_db.get_user_constant(user_id)
         if user_set:
             online_user_db.update({user_id: UsersConstants(*user_set)})
+            weights = storage_db.get_user_weights(user_id)
+            if weights:
+                online_user_db[user_id].WEIGHTS = weights
         else:
             online_user_db.update({user_id: UsersConstants()})
             default_const_user = online_user_db.get(user_id, None)
@@ -6,7 +6,8 @@ import re
 from typing import Union
 
 from db import UsersActions
-from constants import LEXICON, RE_DIGITS, MAX_IMAGE_SIZE, MAX_RESULT_SIZE, MAX_STORY_SIZE
+from constants import LEXICON, RE_DIGITS, RE_NUMBER, MAX_IMAGE_SIZE, MAX_RESULT_SIZE, MAX_STORY_SIZE
+from constants import RANK_FACTORS, RANK_MAX_WEIGHT
 from constants import online_user_db
 
 from bot.define_bot import bot, constants_set
@@ -131,3 +132,41 @@ async def warning_not_constants(message: types.Message, state: FSMContext):
     await message.answer(text=f"{LEXICON['wrong_constant']}{LEXICON['info_constant']}")
     await message.delete()
     await FSMconfigForm.fill_constants.set()
+
+
+def check_weights_string(weights_src: str) -> Union[tuple, None]:
+    """
+    Выделяет из входной строки веса показателей сортировки bestdeal, по одному на каждый из RANK_FACTORS.
+    Каждое слово строки должно целиком быть числом, поэтому '-1' или '1,5' - ошибка, а не вес 1.
+    :param weights_src: Входная строка.
+    :return: Кортеж весов или None, если в строке не только числа, весов не столько, сколько показателей,
+    или все они нулевые
+    """
+    words = weights_src.split()
+    if not all(re.fullmatch(RE_NUMBER, x) for x in words):
+        return None
+    weights = tuple(map(float, words))
+    if len(weights) == len(RANK_FACTORS) and max(weights) <= RANK_MAX_WEIGHT and sum(weights) > 0:
+        return weights
+    return None
+
+
+async def weights_command(message: types.Message):
+    """
+    Хэндлер будет срабатывать на команду /weights.
+    Без параметров выводит текущие веса показателей сортировки bestdeal,
+    с параметрами '/weights 1 0.5 0 2' записывает новые веса в онлайн хранилище и в БД.
+    """
+    if online_user_db.get(message.from_user.id, None) is None:
+        await constants_set(message.from_user.id)
+    user_config = online_user_db.get(message.from_user.id)
+    args = message.get_args()
+    if args:
+        weights = check_weights_string(args)
+        if weights is None:
+            await message.answer(text=f"{LEXICON['wrong_weights']}{LEXICON['info_weights']}")
+            return
+        user_config.WEIGHTS = weights
+        UsersActions().set_user_weights(message.from_user.id, weights)
+    await message.answer(text=f"{LEXICON['/weights']}{LEXICON['weights_list'](user_config.WEIGHTS)}"
+                              f"\n{LEXICON['weights_stars']}\n{LEXICON['info_weights']}")
@@ -6,6 +6,7 @@ import re
 import json
 
 from typing import Union, List, Tuple
+from collections import Counter
 
 from aiogram import types
 from aiogram.dispatcher import FSMContext
@@ -15,20 +16,23 @@ from aiogram.dispatcher.filters.state import State, StatesGroup
 
 from aiogram.types.input_media import InputMediaPhoto
 
-from constants import LEXICON, RE_DIGITS, RE_DATE, TRANSLATE_REGION_DICT, SORT_LIST
-from constants import MAX_ADULTS, MIN_AGE_CHILD, MAX_AGE_CHILD, MAX_CHILDREN, MAX_DAYS
-from constants import USE_TMP_FILE, MAX_STORY_SIZE, MAX_RESULT_SIZE
+from constants import LEXICON, RE_DIGITS, RE_DATE, RE_FILTER, TRANSLATE_REGION_DICT, SORT_LIST
+from constants import MAX_ADULTS, MIN_AGE_CHILD, MAX_AGE_CHILD, MAX_CHILDREN, MAX_DAYS, MAX_REGIONS, MAX_WATCHES
+from constants import USE_TMP_FILE, MAX_STORY_SIZE, MAX_RESULT_SIZE, MILE_KM, RANK_WEIGHTS, REGION_INDEX_LIMIT
+from constants import PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, PREFETCH_SUMMARY_TOP, MAX_HOTEL_PAGES
+from constants import PREFETCH_OFFER, PREFETCH_OFFER_GUESTS, PREFETCH_OFFER_MIN_HIT_RATE, PREFETCH_OFFER_MIN_SAMPLES
 
 from constants import online_user_db
 
 import site_api
-from settingsAPI import create_file_name
+from api_service import summary_prefetcher, offer_prefetcher, page_prefetcher
+from settingsAPI import build_offer_request
 
 from bot.keyboards import inline_keyboards
 from bot.define_bot import bot_delete_message, bot_edit_message, constants_set
 
 """ БД для хранения исторических данных полученных от пользователя и его конфигурации. """
-from db import UsersActions
+from db import UsersActions, HotelsCatalog, PriceWatch
 
 
 class FSMRequestForm(StatesGroup):
@@ -45,8 +49,10 @@ class FSMRequestForm(StatesGroup):
 
         используемые в диалоге ключи, те что со звездочками после закрытия диалога, удаляются:
 
-        'region_name', 'region_info', 'dates', 'adults', 'children', 'hotel', 'hotel_info', 'hotel_url'
-        ***'invitation_message', 'region_list', 'hotels_list', 'hotels_menu'
+        'region_name', 'region_info', 'regions_info', 'dates', 'adults', 'children', 'hotel', 'hotel_info', 'hotel_url'
+        ***'invitation_message', 'region_list', 'hotels_list', 'hotels_orders', 'hotels_menus', 'sort_method',
+        'menu_page', 'menu_size', 'pages_loaded', 'pages_done', 'hotels_blocks', 'hotels_index', 'hotels_filter',
+        'filtered_orders'
     """
     fill_region = State()
     fill_region_id = State()
@@ -59,6 +65,9 @@ class FSMRequestForm(StatesGroup):
 """ формируем список возможных состояний FSMRequestFor"""
 states_request_form = list(map(lambda x: f"FSMRequestForm.{x}", [x for x in dir(FSMRequestForm) if x[:4] == 'fill']))
 
+""" сколько раз вводился каждый состав гостей (взрослых, возраст детей), для упреждающего запроса отелей """
+guests_counter: Counter = Counter()
+
 
 async def send_answer(message: types.Message):
     """Хэндлер для сообщений которые не попали ни под какие другие фильтры"""
@@ -98,21 +107,29 @@ def make_places_menu(regions: list = None) -> Union[str, None]:
     return None
 
 
-def request_region_name(data: FSMContextProxy) -> list:
+async def request_region_name(data: FSMContextProxy) -> list:
     """
     Получает с API Hotels.com список доступных регионов.
+    Если на то же название уже был ответ сервера, то регионы берутся из локального индекса region_index.
+    Иначе запрос отправляется к API, а к его ответу добавляются подсказки индекса по началу или похожему названию,
+    которых нет в ответе. Если API ничего не вернул, то показываются только подсказки.
     Если в constants.py установлен USE_TMP_FILE, то для экономии трафика
-    данные берутся из ранее записанного файла.
+    данные берутся из ранее записанного файла, имя которого вычисляется из параметров запроса.
     :param data: Текущий словарь машины состояний.
     :return: Список регионов
     """
     region_name = data.get('region_name', "") if 'region_name' in data else ""
     if region_name:
-        json_file_name = create_file_name(region_name, relative_position=".") if USE_TMP_FILE else None
-        places = site_api.get_places_list(target_place=region_name, file_name=json_file_name, not_debug=False)
+        places = site_api.region_index.lookup(region_name)
         if places:
-            # site_api.show_places(places)
-            return places
+            return list(places)
+        places = await site_api.get_places_list_async(
+            target_place=region_name, use_cache=USE_TMP_FILE, not_debug=False
+        ) or []
+        # site_api.show_places(places)
+        known = {x['id'] for x in places}
+        suggestions = [x for x in site_api.region_index.suggest(region_name) if x['id'] not in known]
+        return places + suggestions[:max(0, REGION_INDEX_LIMIT - len(places))]
     return []
 
 
@@ -130,7 +147,7 @@ async def region_name_sent(message: types.Message, state: FSMContext):
         await delete_swear_message_chat(data)
         await message.answer(text=f"{LEXICON['look_region']} <b>{data['region_name'].title()}</b>\n{LEXICON['wait']}")
 
-        places = request_region_name(data)
+        places = await request_region_name(data)
 
         if places:
             data['region_list'] = places
@@ -171,9 +188,10 @@ async def delete_swear_message_chat(data: FSMContextProxy) -> bool:
 
 async def region_index_choice(message: types.Message, state: FSMContext):
     """
-        Хэндлер сработает, если введен корректный индекс региона из меню.
-        Проверяет полученное число/индекс меню, оно должно быть 'внутри' меню.
-        Сохраняет в словарь data с ключом 'region_info' информацию по выбранному региону.
+        Хэндлер сработает, если введен корректный индекс региона из меню или несколько индексов через пробел.
+        Проверяет полученные числа/индексы меню, они должны быть 'внутри' меню, не больше MAX_REGIONS.
+        Сохраняет в словарь data с ключом 'region_info' информацию по первому выбранному региону,
+        а с ключом 'regions_info' список всех выбранных регионов для поиска сразу в нескольких регионах.
         Удаляет меню регионов из чата.
         Формирует строку дат для копирования, текущая дата+1 неделя, от нее еще 4 дня.
         Предлагает ввести даты.
@@ -181,15 +199,16 @@ async def region_index_choice(message: types.Message, state: FSMContext):
     """
     current_state = await state.get_state()
 
-    index_index = int(message.text.strip())
+    indexes = list(dict.fromkeys(int(x) for x in re.findall(RE_DIGITS, message.text)))
     async with state.proxy() as data:
         len_regions = len(data['region_list'])
 
     # len_regions = len(dict(await state.get_data())['region_list'])
 
-    if 1 <= index_index <= len_regions:
+    if indexes and len(indexes) <= MAX_REGIONS and all(1 <= x <= len_regions for x in indexes):
         async with state.proxy() as data:
-            data['region_info'] = data['region_list'][index_index - 1]
+            data['regions_info'] = [data['region_list'][x - 1] for x in indexes]
+            data['region_info'] = data['regions_info'][0]
             data.pop('region_list', None)
             await delete_swear_message_chat(data)
             await bot_delete_message(
@@ -197,8 +216,9 @@ async def region_index_choice(message: types.Message, state: FSMContext):
                 message_id=data['invitation_message'].message_id
             )
             data['invitation_message'] = await message.answer(
-                text=f"{LEXICON['final_region']} <b>{data['region_info']['name']}</b> "
-                     f"{TRANSLATE_REGION_DICT.get(data['region_info']['type'], '')}"
+                text=LEXICON['final_region'] + "\n".join(
+                    f"<b>{x['name']}</b> {TRANSLATE_REGION_DICT.get(x['type'], '')}" for x in data['regions_info']
+                )
             )
             today = date.today()
             check_in_date = (today + relativedelta(weeks=+1)).strftime("%d/%m/%y")
@@ -271,6 +291,7 @@ async def process_dates_sent(message: types.Message, state: FSMContext):
             async with state.proxy() as data:
                 await delete_swear_message_chat(data)
                 data['dates'] = [check_in_date_src, check_out_date_src]
+                await prefetch_hotel_offer(message.from_user.id, data)
                 await bot_delete_message(
                     chat_id=data['invitation_message'].chat.id,
                     message_id=data['invitation_message'].message_id
@@ -370,33 +391,98 @@ def make_children_string(children: List[int]) -> str:
     return children_info
 
 
-async def request_hotel_data(user_id: int, data: FSMContextProxy, sort_method: str = SORT_LIST[0]) -> list:
+async def user_result_size(user_id: int) -> int:
+    """ Возвращает количество отелей в выдаче из конфигурации пользователя """
+    if online_user_db.get(user_id, None) is None:
+        await constants_set(user_id)
+    user_config = online_user_db.get(user_id, None)
+    if user_config:
+        return user_config.RESULT_SIZE
+    return MAX_RESULT_SIZE
+
+
+async def user_rank_weights(user_id: int) -> tuple:
+    """ Возвращает веса показателей сортировки bestdeal из конфигурации пользователя """
+    if online_user_db.get(user_id, None) is None:
+        await constants_set(user_id)
+    user_config = online_user_db.get(user_id, None)
+    if user_config:
+        return user_config.WEIGHTS
+    return RANK_WEIGHTS
+
+
+async def prefetch_hotel_offer(user_id: int, data: FSMContextProxy) -> None:
     """
-    Получает с API Hotels.com список доступных отелей, сортирует список по умолчанию возрастанию цены.
+    Если установлен PREFETCH_OFFER, то сразу после ввода дат запускает в фоне упреждающий запрос списка отелей
+    для самого частого состава гостей, пока пользователь вводит количество взрослых и возраст детей.
+    Запросы отключаются, если доля попаданий ниже PREFETCH_OFFER_MIN_HIT_RATE.
+    Даты запоминаются при запуске, поэтому запрос всегда совпадает со своим ключом request.key,
+    даже если выполняется позже, когда его забирает request_hotel_data.
     :param user_id: id пользователя.
     :param data: машина состояний.
+    """
+    region_id = data['region_info'].get('id', "") if 'region_info' in data else ""
+    if not (PREFETCH_OFFER and region_id) or len(data.get('regions_info', None) or []) > 1:
+        return
+    if not offer_prefetcher.worthwhile(PREFETCH_OFFER_MIN_HIT_RATE, PREFETCH_OFFER_MIN_SAMPLES):
+        return
+    adults, children = guests_counter.most_common(1)[0][0] if guests_counter else PREFETCH_OFFER_GUESTS
+    result_size = await user_result_size(user_id)
+    in_date, out_date = data['dates']
+    request = build_offer_request(region_id, in_date, out_date, adults, list(children), result_size)
+    offer_prefetcher.cancel(user_id)
+    offer_prefetcher.start(
+        user_id, request.key,
+        lambda: site_api.get_hotels_list_async(
+            region_id=region_id, in_date=in_date, out_date=out_date,
+            adults=adults, children=list(children), results_size=result_size,
+            priority=PRIORITY_PREFETCH, use_cache=USE_TMP_FILE
+        )
+    )
+
+
+async def request_hotel_data(user_id: int, data: FSMContextProxy, sort_method: str = SORT_LIST[0],
+                             page: int = 0, priority: int = PRIORITY_INTERACTIVE) -> list:
+    """
+    Получает с API Hotels.com список доступных отелей, сортирует список по умолчанию возрастанию цены.
+    Если упреждающий запрос после ввода дат был сделан для того же состава гостей, то берется его результат,
+    иначе упреждающий запрос отменяется. Незаконченный упреждающий запрос не ждет в очереди упреждающих:
+    offer_prefetcher.take выполняет его с приоритетом запроса пользователя.
+    Если выбрано несколько регионов, то они запрашиваются одновременно и результаты объединяются в один список.
+    :param user_id: id пользователя.
+    :param data: машина состояний или словарь с ее ключами 'region_info', 'regions_info', 'dates', 'adults', 'children'.
     :param sort_method: метод сортировки списка отелей.
+    :param page: номер страницы выдачи сервера, на странице столько отелей, сколько в конфигурации пользователя.
+    :param priority: приоритет запроса для планировщика запросов.
     :return: список отелей
     """
     region_id = data['region_info'].get('id', "") if 'region_info' in data else ""
 
     if region_id:
-        region_name = data.get('region_name', "")
-        json_file_name = create_file_name(region_id, region_name, relative_position=".") if USE_TMP_FILE else None
-
-        if online_user_db.get(user_id, None) is None:
-            await constants_set(user_id)
-        user_config = online_user_db.get(user_id, None)
-        if user_config:
-            result_size = user_config.RESULT_SIZE
-        else:
-            result_size = MAX_RESULT_SIZE
+        result_size = await user_result_size(user_id)
+        regions_id = [x['id'] for x in data.get('regions_info', None) or []]
+        if len(regions_id) > 1:
+            return await site_api.get_hotels_multi_async(
+                regions_id=regions_id, in_date=data['dates'][0], out_date=data['dates'][1],
+                adults=data['adults'], children=data['children'],
+                results_size=result_size, sort_method=sort_method,
+                use_cache=USE_TMP_FILE, not_debug=False, priority=priority, start_index=page * result_size
+            )
+        if not page:
+            request = build_offer_request(
+                region_id, data['dates'][0], data['dates'][1], data['adults'], data['children'], result_size
+            )
+            found, hotels = await offer_prefetcher.take(user_id, request.key)
+            offer_prefetcher.cancel(user_id)
+            if found:
+                site_api.sort_hotel_list(hotels, sort_method)
+                return hotels
 
-        hotels = site_api.get_hotels_list(
+        hotels = await site_api.get_hotels_list_async(
             region_id=region_id, in_date=data['dates'][0], out_date=data['dates'][1],
             adults=data['adults'], children=data['children'],
             results_size=result_size, sort_method=sort_method,
-            file_name=json_file_name, not_debug=False
+            use_cache=USE_TMP_FILE, not_debug=False, priority=priority, start_index=page * result_size
         )
         # site_api.show_hotels(hotels)
         return hotels
@@ -411,23 +497,23 @@ def distance_to_km(distance: str, unit: str) -> str:
         unit: единица измерения.
         :return: форматированная строка - километры.
     """
-    mile_km = 1.60934
     if distance and unit == "MILE":
-        return f"{float(distance) * mile_km: .2f} km"
+        return f"{float(distance) * MILE_KM: .2f} km"
     return f"{distance: .2f} {unit.lower()}"
 
 
-def make_hotels_menu(hotels: list = None) -> str:
+def make_hotels_menu(hotels: list = None, start: int = 0) -> str:
     """
     Создает сообщение/меню с номерами отелей для выбора пользователем номера нужного отеля.
     :param hotels: Список отелей полученных из API hotels.com
+    :param start: Сколько отелей на предыдущих страницах меню, с него продолжается нумерация
     :return: текст для создания сообщения со списком отелей и их номеров в меню.
     """
     out_text = ""
     char_non_spacer = "\u00A0"
     if hotels:
         out = [
-            f"<b>{i + 1}</b>.\t{hotel_i['name']} {hotel_i['price']: .2f} {hotel_i['currency'].lower()} {distance_to_km(hotel_i['dist'], hotel_i['unit'])}"
+            f"<b>{start + i + 1}</b>.\t{hotel_i['name']} {hotel_i['price']: .2f} {hotel_i['currency'].lower()} {distance_to_km(hotel_i['dist'], hotel_i['unit'])}"
             for i, hotel_i in enumerate(hotels)
         ]
         out_text = "\n".join(out)
@@ -436,18 +522,183 @@ def make_hotels_menu(hotels: list = None) -> str:
     return out_text
 
 
+def add_catalog_stars(hotels: Union[list, None]) -> Union[list, None]:
+    """
+    В ответе Hotels.com на запрос списка отелей звезд нет ('star' всегда null), поэтому звезды для фильтра /filter
+    и сортировки bestdeal берутся одним запросом из общего каталога HotelsCatalog у отелей,
+    подробности которых уже запрашивались. У остальных отелей звезды остаются неизвестными.
+    :param hotels: список отелей
+    :return: новый список отелей, записи из кэша не изменяются
+    """
+    stars = HotelsCatalog().get_stars([x['id'] for x in hotels if x['stars'] is None]) if hotels else {}
+    if not stars:
+        return hotels
+    return [x._replace(stars=stars[x['id']]) if x['id'] in stars else x for x in hotels]
+
+
+def set_hotels_menu(data: FSMContextProxy, hotels: list, page_size: int, sort_method: str = SORT_LIST[0]) -> None:
+    """
+    Сохраняет первую страницу выдачи сервера как список отелей меню и начинает показ меню с первой страницы.
+    Следующие страницы выдачи запрашиваются, когда пользователь листает меню (load_hotels_page),
+    и добавляются в конец меню (add_hotels_block).
+    :param data: машина состояний.
+    :param hotels: список отелей первой страницы выдачи.
+    :param page_size: сколько отелей на странице выдачи и на странице меню.
+    :param sort_method: метод сортировки, с которым меню показывается первый раз.
+    """
+    data['menu_size'] = page_size
+    data['menu_page'] = 0
+    data['sort_method'] = sort_method
+    data['pages_loaded'] = 1
+    data['pages_done'] = len(hotels) < page_size
+    data['hotels_filter'] = {}
+    set_hotels_list(data, hotels)
+
+
+def set_hotels_list(data: FSMContextProxy, hotels: list) -> None:
+    """
+    Сохраняет список отелей меню и один раз вычисляет порядок отелей для каждого метода из SORT_LIST,
+    поэтому смена сортировки не пересортировывает список, и индексы для фильтра /filter.
+    Тексты страниц меню запоминаются в 'hotels_menus', порядки отфильтрованных отелей - в 'filtered_orders'.
+    """
+    data['hotels_list'] = hotels
+    data['hotels_blocks'] = (0,)
+    data['hotels_orders'] = site_api.sort_orders(hotels)
+    data['hotels_index'] = site_api.build_filter_index(hotels)
+    data['filtered_orders'] = {}
+    data['hotels_menus'] = {}
+
+
+def add_hotels_block(data: FSMContextProxy, hotels: list) -> None:
+    """
+    Добавляет в меню отели следующей страницы выдачи отдельным блоком: они сортируются только между собой
+    и встают после уже полученных, поэтому номера и порядок отелей, которые пользователь уже видел, не меняются.
+    В 'hotels_blocks' запоминается номер первого отеля блока, по нему так же сортируются отели под фильтром.
+    """
+    start = len(data['hotels_list'])
+    block_orders = site_api.sort_orders(hotels)
+    data['hotels_orders'] = {
+        x: y + tuple(start + i for i in block_orders[x]) for x, y in data['hotels_orders'].items()
+    }
+    data['hotels_list'] = data['hotels_list'] + hotels
+    data['hotels_blocks'] = data['hotels_blocks'] + (start,)
+    data['hotels_index'] = site_api.build_filter_index(data['hotels_list'])
+    data['filtered_orders'] = {}
+    data['hotels_menus'] = {}
+
+
+def hotels_menu_text(data: FSMContextProxy) -> str:
+    """
+    Возвращает текст текущей страницы меню в текущем порядке сортировки.
+    Текст для каждой сортировки и страницы создается один раз, при повторном выборе берется запомненный.
+    """
+    key = f"{data['sort_method']} {data['menu_page']}"
+    menus = data['hotels_menus']
+    if key not in menus:
+        menus[key] = make_hotels_menu(page_hotels(data), data['menu_page'] * data['menu_size'])
+    return menus[key]
+
+
+def menu_order(data: FSMContextProxy) -> tuple:
+    """
+    Номера отелей меню в текущем порядке сортировки. Если задан фильтр /filter, то только подходящие отели:
+    они находятся поиском по индексам, и сортируются только найденные, порядок запоминается в 'filtered_orders'.
+    """
+    sort_method = data['sort_method']
+    if not data.get('hotels_filter', None):
+        return data['hotels_orders'][sort_method]
+    filtered = data['filtered_orders']
+    if sort_method not in filtered:
+        found = site_api.filter_hotels(data['hotels_index'], data['hotels_filter'])
+        filtered[sort_method] = site_api.filtered_order(data['hotels_list'], found, sort_method, data['hotels_blocks'])
+    return filtered[sort_method]
+
+
+def page_hotels(data: FSMContextProxy) -> list:
+    """ Отели текущей страницы меню в текущем порядке сортировки """
+    start = data['menu_page'] * data['menu_size']
+    return [data['hotels_list'][i] for i in menu_order(data)[start:start + data['menu_size']]]
+
+
+def has_next_page(data: FSMContextProxy) -> bool:
+    """ Есть ли следующая страница меню: среди уже полученных отелей или на сервере """
+    return (data['menu_page'] + 1) * data['menu_size'] < len(menu_order(data)) or not data['pages_done']
+
+
+async def show_hotels_menu(data: FSMContextProxy, message: types.Message = None) -> None:
+    """
+    Выводит текущую страницу меню отелей с клавиатурой сортировки и листания.
+    Если message указан, то меню отправляется новым сообщением, иначе изменяется сообщение меню.
+    """
+    text = f"{LEXICON['choice_hotels']}\n{hotels_menu_text(data)}\n\n" \
+           f"{LEXICON['sort_hotels']} <b>{data['sort_method']}</b>, {LEXICON['hotels_page']} {data['menu_page'] + 1}"
+    if data.get('hotels_filter', None):
+        text += f"\n{LEXICON['hotels_filter']} {make_filter_string(data['hotels_filter'])}"
+        unknown = site_api.unknown_stars(data['hotels_index']) if 'stars' in data['hotels_filter'] else 0
+        if unknown:
+            text += f"\n{LEXICON['unknown_stars'](unknown, len(data['hotels_list']))}"
+    keyboard = inline_keyboards.sort_keyboard(prev_page=data['menu_page'] > 0, next_page=has_next_page(data))
+    if message:
+        data['invitation_message'] = await message.answer(text=text, reply_markup=keyboard)
+    else:
+        menu_message: types.Message = data['invitation_message']
+        await bot_edit_message(
+            chat_id=menu_message.chat.id, message_id=menu_message.message_id, text=text, reply_markup=keyboard
+        )
+
+
+def prefetch_hotels_page(user_id: int, data: FSMContextProxy) -> None:
+    """
+    Когда пользователь дошел до последней полученной страницы меню, запускает в фоне запрос
+    следующей страницы выдачи сервера, чтобы при нажатии "дальше" она уже была готова.
+    """
+    if data['pages_done'] or (data['menu_page'] + 2) * data['menu_size'] < len(menu_order(data)):
+        return
+    page = data['pages_loaded']
+    query = {x: data[x] for x in ('region_info', 'regions_info', 'dates', 'adults', 'children') if x in data}
+    page_prefetcher.start(
+        user_id, f"page {page}",
+        lambda: request_hotel_data(user_id, query, page=page, priority=PRIORITY_PREFETCH)
+    )
+
+
+async def load_hotels_page(user_id: int, data: FSMContextProxy) -> bool:
+    """
+    Получает следующую страницу выдачи сервера: из упреждающего запроса или новым запросом.
+    Новые отели добавляются в конец меню блоком (add_hotels_block), показатель bestdeal вычисляется внутри блока.
+    Выдача считается законченной, если страница неполная, не добавила новых отелей
+    или получено MAX_HOTEL_PAGES страниц.
+    Если ответ получить не удалось, то ничего не меняется и страницу можно запросить еще раз.
+    :return: True, если ответ сервера получен
+    """
+    page = data['pages_loaded']
+    found, hotels = await page_prefetcher.take(user_id, f"page {page}")
+    if not found or hotels is None:
+        hotels = await request_hotel_data(user_id, data, page=page)
+    if hotels is None:
+        return False
+    known = {x['id'] for x in data['hotels_list']}
+    new_hotels = [x for x in hotels if x['id'] not in known]
+    data['pages_loaded'] = page + 1
+    data['pages_done'] = not new_hotels or len(hotels) < data['menu_size'] or page + 1 >= MAX_HOTEL_PAGES
+    if new_hotels:
+        add_hotels_block(data, site_api.rank_hotels(add_catalog_stars(new_hotels), await user_rank_weights(user_id)))
+    return True
+
+
 async def process_children_sent(message: types.Message, state: FSMContext):
     """
     Хэндлер сработает, если введены цифры.
     Проверяет корректный возраст детей.
     Сохраняет их в целочисленный список в словарь data с ключом 'children'.
-    Создает меню для выбора отеля и выводит клавиатуру для сортировки этого меню.
+    Создает меню для выбора отеля из первой страницы выдачи и выводит клавиатуру для сортировки и листания меню.
     Переводит машину состояний в состояние ожидания ввода выбора отеля 'fill_hotel'.
     """
     check_result, children = check_children_string(message.text)
     if check_result:
         async with state.proxy() as data:
             data['children'] = children
+            guests_counter[(data['adults'], tuple(sorted(children)))] += 1
             await delete_swear_message_chat(data)
             await bot_delete_message(
                 chat_id=data['invitation_message'].chat.id,
@@ -458,14 +709,15 @@ async def process_children_sent(message: types.Message, state: FSMContext):
                 await message.answer(text=f"{children_info}\n{LEXICON['wait']}")
             else:
                 await message.answer(text=f"{LEXICON['wait']}")
+            page_prefetcher.cancel(message.from_user.id)
             hotels = await request_hotel_data(message.from_user.id, data, SORT_LIST[0])
             if hotels:
-                data['hotels_list'] = hotels
-                data['invitation_message'] = await message.answer(
-                    text=f"{LEXICON['choice_hotels']}\n{make_hotels_menu(data['hotels_list'])}\n\n"
-                         f"{LEXICON['sort_hotels']} <b>{SORT_LIST[0]}</b>",
-                    reply_markup=inline_keyboards.sort_keyboard()
-                )
+                hotels = add_catalog_stars(hotels)
+                hotels = site_api.rank_hotels(hotels, await user_rank_weights(message.from_user.id))
+                set_hotels_menu(data, hotels, await user_result_size(message.from_user.id), SORT_LIST[0])
+                await show_hotels_menu(data, message)
+                prefetch_hotels_page(message.from_user.id, data)
+                prefetch_hotel_summaries(message.from_user.id, page_hotels(data)[:PREFETCH_SUMMARY_TOP])
                 await FSMRequestForm.fill_hotel.set()
             else:
                 await message.answer(text=LEXICON['no_find_hotels'])
@@ -487,19 +739,52 @@ async def warning_not_children(message: types.Message, state: FSMContext, broken
     await FSMRequestForm.fill_children.set()
 
 
-def request_hotel_summary(data: FSMContextProxy) -> list:
+def prefetch_hotel_summaries(user_id: int, hotels: list) -> None:
+    """
+    Запускает в фоне упреждающие запросы подробностей первых PREFETCH_SUMMARY_TOP отелей меню,
+    пока пользователь читает меню. Отели, которые уже есть в каталоге, не запрашиваются.
+    Если PREFETCH_SUMMARY_TOP = 0, то упреждающие запросы не выполняются.
+    :param user_id: id пользователя.
+    :param hotels: список отелей в текущем порядке сортировки.
+    """
+    if not PREFETCH_SUMMARY_TOP or not hotels:
+        return
+    catalog = HotelsCatalog()
+    for hotel_i in hotels[:PREFETCH_SUMMARY_TOP]:
+        hotel_id = hotel_i.get('id', "")
+        if hotel_id and catalog.get_hotel(hotel_id) is None:
+            summary_prefetcher.start(
+                user_id, hotel_id,
+                lambda x=hotel_id: site_api.get_summary_list_async(
+                    look_hotel_id=x, priority=PRIORITY_PREFETCH, use_cache=USE_TMP_FILE
+                )
+            )
+
+
+async def request_hotel_summary(data: FSMContextProxy, user_id: int = None) -> list:
     """
     Получает с API Hotels.com подробную информацию об отеле.
+    Сначала отель ищется в общем каталоге отелей БД, затем среди упреждающих запросов пользователя,
+    к API обращается только если отеля там нет или сведения старше CATALOG_TTL.
+    Полученные с API сведения записываются в каталог.
     :param data: Машина состояний.
+    :param user_id: id пользователя.
     :return: Список данных об отеле.
     """
-    region_id = data['region_info'].get('id', "") if 'region_info' in data else ""
-    region_name = data.get('region_name', "")
     hotel_id = data['hotel'].get('id', "") if 'hotel' in data else ""
-    json_file_name = create_file_name(hotel_id, region_id, region_name, relative_position=".") if USE_TMP_FILE else None
     if hotel_id:
-        hotels_summary = site_api.get_summary_list(look_hotel_id=hotel_id, file_name=json_file_name, not_debug=False)
+        catalog = HotelsCatalog()
+        hotels_summary = catalog.get_hotel(hotel_id)
+        if hotels_summary:
+            return hotels_summary
+        found, hotels_summary = await summary_prefetcher.take(user_id, hotel_id)
+        if not found:
+            hotels_summary = await site_api.get_summary_list_async(
+                look_hotel_id=hotel_id, use_cache=USE_TMP_FILE, not_debug=False
+            )
         # site_api.show_summary(hotels_summary)
+        if hotels_summary:
+            catalog.put_hotel(hotels_summary)
         return hotels_summary
     return []
 
@@ -515,21 +800,25 @@ async def hotel_index_choice(message: types.Message, state: FSMContext):
     """
     hotel_index = int(message.text.strip())
     async with state.proxy() as data:
-        len_hotels = len(data['hotels_list'])
+        len_hotels = len(menu_order(data))
     if 1 <= hotel_index <= len_hotels:
         async with state.proxy() as data:
-            data['hotel'] = data['hotels_list'][hotel_index - 1]
+            data['hotel'] = data['hotels_list'][menu_order(data)[hotel_index - 1]]
             await bot_delete_message(
                 chat_id=data['invitation_message'].chat.id,
                 message_id=data['invitation_message'].message_id
             )
-            data.pop('hotels_list', None)
-            data.pop('invitation_message', None)
+            for key_i in ('hotels_list', 'hotels_orders', 'hotels_menus', 'sort_method', 'invitation_message',
+                          'menu_page', 'menu_size', 'pages_loaded', 'pages_done',
+                          'hotels_blocks', 'hotels_index', 'hotels_filter', 'filtered_orders'):
+                data.pop(key_i, None)
             await delete_swear_message_chat(data)
             data.pop('swear_message', None)
             await message.answer(text=f"{LEXICON['final_hotel']} <b>{data['hotel']['name']}</b>\n{LEXICON['wait']}")
 
-            summary_info = request_hotel_summary(data)
+            summary_info = await request_hotel_summary(data, message.from_user.id)
+            summary_prefetcher.cancel(message.from_user.id)
+            page_prefetcher.cancel(message.from_user.id)
 
             if summary_info:
                 data['hotel_info'], data['hotel_url'] = summary_info[:2]
@@ -564,7 +853,7 @@ async def hotel_index_choice(message: types.Message, state: FSMContext):
 async def warning_not_hotel_index(message: types.Message, state: FSMContext):
     """  Хэндлер сработает, если во время ввода индекса отеля будет введено что-то некорректное"""
     async with state.proxy() as data:
-        len_menu = len(data['hotels_list'])
+        len_menu = len(menu_order(data))
         swear_word = LEXICON['swear_word'] if await delete_swear_message_chat(data) else ""
         data['swear_message'] = await message.answer(
             text=f"{swear_word}{LEXICON['wrong_hotel_index']} {len_menu}{LEXICON['/cancel']}"
@@ -576,21 +865,17 @@ async def warning_not_hotel_index(message: types.Message, state: FSMContext):
 async def hotels_sort(message: types.Message, state: FSMContext):
     """
         Хэндлер сработает на команды "lowprice", "highprice", "bestdeal".
-        Сортирует список отелей и выводит новое меню выбора отеля.
+        Берет заранее вычисленный порядок отелей и выводит новое меню выбора отеля.
         В меню добавляет информацию о текущем методе сортировки.
      """
     async with state.proxy() as data:
         if data['hotels_list']:
             sort_method = message.text[1:] if message.text[1:] in SORT_LIST else None
             if sort_method:
-                site_api.sort_hotel_list(data['hotels_list'], sort_method)
-                menu_message: types.Message = data['invitation_message']
-                await bot_edit_message(
-                    chat_id=menu_message.chat.id, message_id=menu_message.message_id,
-                    text=f"{LEXICON['choice_hotels']}\n{make_hotels_menu(data['hotels_list'])}\n\n"
-                         f"{LEXICON['sort_hotels']} <b>{sort_method}</b>",
-                    reply_markup=inline_keyboards.sort_keyboard()
-                )
+                data['sort_method'] = sort_method
+                data['menu_page'] = 0
+                await show_hotels_menu(data)
+                prefetch_hotel_summaries(message.from_user.id, page_hotels(data)[:PREFETCH_SUMMARY_TOP])
             await FSMRequestForm.fill_hotel.set()
         else:
             await message.answer(text='список отелей пуст, сортировать нечего')
@@ -600,26 +885,87 @@ async def hotels_sort(message: types.Message, state: FSMContext):
 async def hotels_sort_buttons(callback: types.CallbackQuery, state: FSMContext):
     """
     Хэндлер сработает по нажатию на кнопки сортировки "lowprice", "highprice", "bestdeal".
-    Сортирует список отелей и выводит новое меню выбора отеля.
+    Берет заранее вычисленный порядок отелей и выводит новое меню выбора отеля.
     В меню добавляет информацию о текущем методе сортировки
     """
     async with state.proxy() as data:
         if data['hotels_list']:
             sort_method = callback.data if callback.data in SORT_LIST else None
             if sort_method:
-                site_api.sort_hotel_list(data['hotels_list'], sort_method)
-                menu_message: types.Message = data['invitation_message']
-                await bot_edit_message(
-                    chat_id=menu_message.chat.id, message_id=menu_message.message_id,
-                    text=f"{LEXICON['choice_hotels']}\n{make_hotels_menu(data['hotels_list'])}\n\n"
-                         f"{LEXICON['sort_hotels']} <b>{sort_method}</b>",
-                    reply_markup=inline_keyboards.sort_keyboard()
-                )
+                data['sort_method'] = sort_method
+                data['menu_page'] = 0
+                await show_hotels_menu(data)
+                prefetch_hotel_summaries(callback.from_user.id, page_hotels(data)[:PREFETCH_SUMMARY_TOP])
             await FSMRequestForm.fill_hotel.set()
         else:
             await callback.message.answer(text='список отелей пуст, сортировать нечего')
 
 
+async def hotels_page_buttons(callback: types.CallbackQuery, state: FSMContext):
+    """
+    Хэндлер сработает по нажатию на кнопки листания меню отелей "page prev" и "page next".
+    Если следующей страницы меню еще нет среди полученных отелей, то запрашивает следующую страницу выдачи сервера,
+    при включенном фильтре новые подходящие отели дополняют текущую страницу.
+    Если страницу получить не удалось, то пользователь может нажать "дальше" еще раз.
+    На последней полученной странице в фоне запрашивается следующая.
+    """
+    answer_text = None
+    async with state.proxy() as data:
+        if data.get('hotels_list', None):
+            page = data['menu_page'] + (1 if callback.data == "page next" else -1)
+            if page * data['menu_size'] >= len(menu_order(data)) and not data['pages_done']:
+                if not await load_hotels_page(callback.from_user.id, data):
+                    answer_text = LEXICON['page_not_loaded']
+            if 0 <= page and page * data['menu_size'] < len(menu_order(data)):
+                data['menu_page'] = page
+            elif data['pages_done']:
+                answer_text = LEXICON['no_more_hotels']
+            await show_hotels_menu(data)
+            prefetch_hotels_page(callback.from_user.id, data)
+            prefetch_hotel_summaries(callback.from_user.id, page_hotels(data)[:PREFETCH_SUMMARY_TOP])
+    await callback.answer(text=answer_text)
+
+
+def check_filter_string(filter_src: str) -> Union[dict, None]:
+    """
+    Выделяет из строки условия фильтра отелей: 'price 150 dist 2 stars 4' в любом порядке и сочетании.
+    :param filter_src: Входная строка.
+    :return: Словарь условий {'price', 'dist', 'stars'}, пустой словарь для 'off' или None, если условий нет
+    """
+    if filter_src.strip().lower() == "off":
+        return {}
+    criteria = {x.lower(): float(y) for x, y in re.findall(RE_FILTER, filter_src, flags=re.IGNORECASE)}
+    return criteria if criteria else None
+
+
+def make_filter_string(criteria: dict) -> str:
+    """ Текстовое описание условий фильтра отелей """
+    return ", ".join(LEXICON['filter_part'](x, y) for x, y in criteria.items())
+
+
+async def filter_command(message: types.Message, state: FSMContext):
+    """
+    Хэндлер сработает на команду /filter, например '/filter price 150 dist 2 stars 4'.
+    Уточняет условия фильтра меню отелей: новые условия добавляются к прежним, '/filter off' снимает фильтр.
+    Фильтр применяется к уже полученным отелям без запросов к API и сочетается с текущей сортировкой.
+    """
+    async with state.proxy() as data:
+        if not data.get('hotels_list', None):
+            await message.answer(text=LEXICON['wrong_filter'])
+            return
+        criteria = check_filter_string(message.get_args())
+        if criteria is None:
+            await message.answer(text=LEXICON['info_filter'])
+        else:
+            data['hotels_filter'] = {**data['hotels_filter'], **criteria} if criteria else {}
+            data['filtered_orders'] = {}
+            data['hotels_menus'] = {}
+            data['menu_page'] = 0
+            await show_hotels_menu(data)
+            prefetch_hotels_page(message.from_user.id, data)
+    await message.delete()
+
+
 async def cancel_command(message: types.Message, state: FSMContext):
     """ Хэндлер сработает на команду '/cancel' и отключит машину состояний"""
 
@@ -627,6 +973,9 @@ async def cancel_command(message: types.Message, state: FSMContext):
     if current_state is None:
         await message.answer(text=LEXICON['not_in_cancel'])
         return
+    summary_prefetcher.cancel(message.from_user.id)
+    offer_prefetcher.cancel(message.from_user.id)
+    page_prefetcher.cancel(message.from_user.id)
     async with state.proxy() as data:
         data.clear()
     await state.reset_state()
@@ -640,6 +989,101 @@ async def cancel_command(message: types.Message, state: FSMContext):
     await message.answer(text=LEXICON['info_cancel'])
 
 
+def make_price_grid(grid: List[dict], in_date: str) -> str:
+    """
+    Создает текст сетки цен для гибких дат: даты заезда и выезда, цена и валюта самого дешевого отеля.
+    Выбранные пользователем даты отмечаются стрелкой, самый дешевый вариант звездой.
+    :param grid: сетка цен из get_price_grid_async.
+    :param in_date: выбранная пользователем дата заезда.
+    :return: текст для сообщения.
+    """
+    char_star = "\u2B50"
+    char_arrow = "\u25C0"
+    prices = [x['price'] for x in grid if x['price']]
+    min_price = min(prices) if prices else None
+    out = []
+    for row_i in grid:
+        dates_line = f"{row_i['in_date'][:5].replace('/', '.')} - {row_i['out_date'][:5].replace('/', '.')}"
+        if row_i['price']:
+            price_line = f"<b>{row_i['price']: .2f}</b> {row_i['currency'].lower()}"
+        else:
+            price_line = LEXICON['no_flex_hotels']
+        marks = f"{char_star if row_i['price'] and row_i['price'] == min_price else ''}" \
+                f"{char_arrow if row_i['in_date'] == in_date else ''}"
+        out.append(f"{dates_line}: {price_line} {marks}")
+    return "\n".join(out)
+
+
+async def flexdates_command(message: types.Message, state: FSMContext):
+    """
+    Хэндлер сработает на команду /flexdates.
+    Берет регион, даты и гостей текущего поиска, если он уже дошел до выбора отеля, иначе последнего поиска.
+    Одновременно ищет отели для дат заезда, сдвинутых на -FLEX_DAYS..+FLEX_DAYS дней,
+    и выводит сетку самых дешевых цен, не проходя заново весь диалог /fillform.
+    """
+    async with state.proxy() as data:
+        query = {x: data.get(x, None) for x in ('region_info', 'regions_info', 'dates', 'adults', 'children')}
+    if query['children'] is None:
+        user_config = online_user_db.get(message.from_user.id, None)
+        query = user_config.last_query_data if user_config and user_config.last_query_data else None
+    if not query or not query.get('region_info', None) or not query.get('dates', None):
+        await message.answer(text=LEXICON['wrong_flexdates'])
+        return
+    await message.answer(text=LEXICON['wait'])
+    regions_info = query.get('regions_info', None) or [query['region_info']]
+    grid = await site_api.get_price_grid_async(
+        regions_id=[x['id'] for x in regions_info], in_date=query['dates'][0], out_date=query['dates'][1],
+        adults=query['adults'], children=query['children'],
+        results_size=await user_result_size(message.from_user.id),
+        use_cache=USE_TMP_FILE, not_debug=False
+    )
+    await message.answer(text=LEXICON['flex_grid'] + make_price_grid(grid, query['dates'][0]))
+
+
+def make_watches_list(watches: List[tuple]) -> str:
+    """
+    Создает текст со списком подписок пользователя на цену отеля.
+    :param watches: подписки из БД: (название отеля, заезд, выезд, цена, валюта).
+    :return: текст для сообщения.
+    """
+    return "\n".join(
+        f"<b>{index + 1}</b>.\t{name} {in_date} - {out_date}: {price: .2f} {currency.lower()}"
+        for index, (name, in_date, out_date, price, currency) in enumerate(watches)
+    )
+
+
+async def watch_command(message: types.Message):
+    """
+    Хэндлер сработает на команду /watch.
+    Подписывает пользователя на снижение цены отеля последнего поиска на те же даты и тот же состав гостей.
+    Цены всех подписок проверяет price_watch_loop.
+    """
+    user_config = online_user_db.get(message.from_user.id, None)
+    info_user = user_config.last_query_data if user_config else None
+    if not info_user or not info_user.get('hotel', None) or not info_user.get('region_info', None):
+        await message.answer(text=LEXICON['wrong_watch'])
+        return
+    storage = PriceWatch()
+    if len(storage.get_user_watches(message.from_user.id)) >= MAX_WATCHES:
+        await message.answer(text=LEXICON['watch_limit'])
+        return
+    hotel = info_user['hotel']
+    storage.add_watch(
+        user_id=message.from_user.id, chat_id=message.chat.id, hotel=hotel,
+        region_id=hotel.get('region_id', info_user['region_info']['id']), dates=info_user['dates'],
+        adults=info_user['adults'], children=info_user['children'],
+        results_size=await user_result_size(message.from_user.id)
+    )
+    watches = storage.get_user_watches(message.from_user.id)
+    await message.answer(text=LEXICON['watch_added'] + make_watches_list(watches))
+
+
+async def unwatch_command(message: types.Message):
+    """ Хэндлер сработает на команду /unwatch и удалит все подписки пользователя на цену отеля """
+    removed = PriceWatch().delete_user_watches(message.from_user.id)
+    await message.answer(text=f"{LEXICON['watch_removed']} <b>{removed}</b>")
+
+
 async def showdata_command(message: types.Message):
     """
     Хэндлер сработает на команду /showdata и отправит в чат данные об отеле записанные в БД.
@@ -698,7 +1142,7 @@ async def showdata_command(message: types.Message):
                          f"{LEXICON['image_quantity'](len_hotel_url)}\n"
                          f"{LEXICON['push-button']}",
                     reply_markup=inline_keyboards.show_image_keyboard(len_hotel_url))
-            await message.answer(text=LEXICON['finish'])
+            await message.answer(text=f"{LEXICON['/watch']}\n{LEXICON['finish']}")
         else:
             await message.answer(text=LEXICON['wrong_showdata'])
     else:
@@ -777,8 +1221,8 @@ def hotel_line(hotel_row) -> Union[str, None]:
     """
     if hotel_row:
         query_info: dict = json.loads(hotel_row[5])
-        hotel_info = query_info['hotel_info']
-        hotel = query_info['hotel']
+        hotel_info = site_api.HotelSummary.load(query_info['hotel_info'])
+        hotel = site_api.Hotel.load(query_info['hotel'])
         time_info = datetime.fromtimestamp(hotel_row[2]).strftime('%d.%m.%Y, %H:%M')
         return f"{time_info} <b>{hotel_info['name']}</b>, {hotel_info['address']}, {hotel_info['country']}, <b>{round(hotel['price'], 2)}</b> {hotel['currency']}"
     return None
@@ -3,15 +3,22 @@ from constants import SORT_LIST
 from typing import Union
 
 
-def sort_keyboard() -> InlineKeyboardMarkup:
+def sort_keyboard(prev_page: bool = False, next_page: bool = False) -> InlineKeyboardMarkup:
     """
-    Создает клавиатуру для сортировки списка отелей.
+    Создает клавиатуру для сортировки списка отелей и листания страниц меню.
+    :param prev_page: показывать кнопку предыдущей страницы
+    :param next_page: показывать кнопку следующей страницы
     :return: инлайн клавиатуру
     """
     buttons = [
         [InlineKeyboardButton(text=sort_method_i, callback_data=sort_method_i, resize_keyboard=True)
          for sort_method_i in SORT_LIST]
     ]
+    page_buttons = [(text_i, data_i) for text_i, data_i, show_i in
+                    (("«", "page prev", prev_page), ("»", "page next", next_page)) if show_i]
+    if page_buttons:
+        buttons.append([InlineKeyboardButton(text=text_i, callback_data=data_i, resize_keyboard=True)
+                        for text_i, data_i in page_buttons])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, date
+from typing import Any, Dict, List, Tuple
+
+from aiogram.utils.exceptions import TelegramAPIError
+
+import site_api
+from api_service import quota_scheduler
+from settingsAPI import build_offer_request
+from constants import LEXICON, PRIORITY_PREFETCH, MAX_RESULT_SIZE
+from constants import PRICE_WATCH_INTERVAL, PRICE_WATCH_CONCURRENCY, PRICE_WATCH_MIN_DROP, PRICE_WATCH_BATCH_SIZE
+from constants import PRICE_WATCH_MAX_PAGES, PRICE_WATCH_UNTRACKED_AFTER
+from bot.define_bot import bot
+from db import PriceWatch
+
+
+def group_watches(watches: List[dict]) -> Dict[str, List[dict]]:
+    """
+    Группирует подписки по ключу нормализованного запроса списка отелей:
+    все пользователи, следящие за отелями одного региона на одни даты с одним составом гостей,
+    попадают в одну группу и проверяются одним запросом. Запрос группы всегда на MAX_RESULT_SIZE отелей,
+    поэтому размер выдачи в конфигурации пользователя не делит группу на несколько запросов.
+    """
+    groups: Dict[str, List[dict]] = {}
+    for watch_i in watches:
+        request = build_offer_request(
+            watch_i['region_id'], watch_i['in_date'], watch_i['out_date'],
+            watch_i['adults'], watch_i['children'], MAX_RESULT_SIZE
+        )
+        groups.setdefault(request.key, []).append(watch_i)
+    return groups
+
+
+async def find_group_hotels(group: List[dict], not_debug: bool = True) -> Tuple[Dict[str, Any], bool, int]:
+    """
+    Ищет отели подписок группы в выдаче общего запроса группы. Выдача отсортирована по цене,
+    поэтому отель, выбранный пользователем не из самых дешевых, может быть на следующих страницах:
+    они запрашиваются, пока не найдены все отели группы, но не больше PRICE_WATCH_MAX_PAGES страниц.
+    :return: кортеж ({id отеля: отель}, все ли страницы получены без ошибок, количество запросов)
+    """
+    first = group[0]
+    wanted = {x['hotel_id'] for x in group}
+    found: Dict[str, Any] = {}
+    for page in range(PRICE_WATCH_MAX_PAGES):
+        hotels = await site_api.get_hotels_list_async(
+            region_id=first['region_id'], in_date=first['in_date'], out_date=first['out_date'],
+            adults=first['adults'], children=first['children'], results_size=MAX_RESULT_SIZE,
+            priority=PRIORITY_PREFETCH, use_cache=True, not_debug=not_debug, start_index=page * MAX_RESULT_SIZE
+        )
+        if hotels is None:
+            return found, False, page + 1
+        found.update((x['id'], x) for x in hotels if x['id'] in wanted)
+        if wanted.issubset(found) or len(hotels) < MAX_RESULT_SIZE:
+            return found, True, page + 1
+    return found, True, PRICE_WATCH_MAX_PAGES
+
+
+async def poll_price_watches(not_debug: bool = True) -> Counter:
+    """
+    Проверяет цены всех подписок. Устаревшие подписки, дата заезда которых прошла, удаляются.
+    На каждую группу одинаковых запросов отправляются общие запросы с приоритетом PRIORITY_PREFETCH
+    (find_group_hotels), поэтому при малом остатке месячного лимита проверка откладывается до следующего раза.
+    Если отеля подписки нет в выдаче дольше PRICE_WATCH_UNTRACKED_AFTER секунд, то следить за ним нельзя:
+    подписка удаляется, и пользователь получает об этом уведомление.
+    Новые цены записываются в БД одной транзакцией, уведомления отправляются пачками.
+    :return: счетчики проверки
+    """
+    counters: Counter = Counter()
+    storage = PriceWatch()
+    watches = storage.get_all_watches()
+    today = date.today()
+    expired = {x['watch_id'] for x in watches if datetime.strptime(x['in_date'], "%d/%m/%Y").date() < today}
+    storage.delete_watches(list(expired))
+    counters["expired"] = len(expired)
+
+    groups = group_watches([x for x in watches if x['watch_id'] not in expired])
+    semaphore = asyncio.Semaphore(PRICE_WATCH_CONCURRENCY)
+    prices: List[tuple] = []
+    notifications: Dict[int, List[str]] = {}
+    untracked: Dict[int, List[str]] = {}
+    lost: List[int] = []
+    now = time.time()
+
+    async def check_group(group: List[dict]) -> None:
+        if quota_scheduler.should_shed(PRIORITY_PREFETCH):
+            counters["shed"] += 1
+            return
+        async with semaphore:
+            hotels_by_id, complete, requests = await find_group_hotels(group, not_debug)
+        counters["requests"] += requests
+        for watch_i in group:
+            hotel = hotels_by_id.get(watch_i['hotel_id'], None)
+            if not hotel or not hotel['price']:
+                if complete and now - (watch_i['checked'] or now) > PRICE_WATCH_UNTRACKED_AFTER:
+                    untracked.setdefault(watch_i['chat_id'], []).append(
+                        f"<b>{watch_i['hotel_name']}</b> {watch_i['in_date']} - {watch_i['out_date']}"
+                    )
+                    lost.append(watch_i['watch_id'])
+                continue
+            prices.append((hotel['price'], time.time(), watch_i['watch_id']))
+            last_price = watch_i['last_price']
+            if last_price and hotel['price'] < last_price * (1 - PRICE_WATCH_MIN_DROP):
+                notifications.setdefault(watch_i['chat_id'], []).append(
+                    f"<b>{watch_i['hotel_name']}</b> {watch_i['in_date']} - {watch_i['out_date']}: "
+                    f"{last_price: .2f} -> <b>{hotel['price']: .2f}</b> {hotel['currency'].lower()}"
+                )
+
+    await asyncio.gather(*[check_group(x) for x in groups.values()])
+    storage.update_prices(prices)
+    storage.delete_watches(lost)
+    counters["watches"] = len(watches) - len(expired)
+    counters["groups"] = len(groups)
+    counters["drops"] = sum(len(x) for x in notifications.values())
+    counters["untracked"] = len(lost)
+    await send_notifications(notifications)
+    await send_notifications(untracked, LEXICON['watch_untracked'])
+    return counters
+
+
+async def send_notifications(notifications: Dict[int, List[str]], title: str = LEXICON['price_drop']) -> None:
+    """
+    Отправляет уведомления: одно сообщение с заголовком title на чат со всеми его отелями,
+    после каждых PRICE_WATCH_BATCH_SIZE сообщений пауза в секунду, чтобы не превысить лимиты Telegram.
+    """
+    for index, (chat_id, lines) in enumerate(notifications.items()):
+        try:
+            await bot.send_message(chat_id, title + "\n".join(lines))
+        except TelegramAPIError as err:
+            print(f"ошибка отправки уведомления о цене в чат {chat_id}: {err}")
+        if (index + 1) % PRICE_WATCH_BATCH_SIZE == 0:
+            await asyncio.sleep(1)
+
+
+async def price_watch_loop(interval: float = PRICE_WATCH_INTERVAL) -> None:
+    """ Проверяет цены подписок каждые interval секунд, пока бот работает """
+    while True:
+        try:
+            counters = await poll_price_watches()
+            print(f"проверка подписок на цену: {dict(counters)}")
+        except Exception as err:
+            print(f"ошибка проверки подписок на цену: {err}")
+        await asyncio.sleep(interval)
@@ -2,7 +2,7 @@ from aiogram import types, Dispatcher
 from aiogram.dispatcher import filters
 
 from bot.handlers import commands_bot, machine_bot
-from constants import RE_DATE, RE_DIGITS, RE_NAME_REGION, SORT_LIST
+from constants import RE_DATE, RE_DIGITS, RE_INDEXES, RE_NAME_REGION, SORT_LIST
 import re
 
 async def set_main_menu(disp: Dispatcher) -> None:
@@ -12,6 +12,8 @@ async def set_main_menu(disp: Dispatcher) -> None:
         types.BotCommand(command="/fillform", description="поиск отеля"),
         types.BotCommand(command="/showdata", description="информация об отеле"),
         types.BotCommand(command="/showimage", description="фотографии отеля"),
+        types.BotCommand(command="/flexdates", description="цены на соседние даты"),
+        types.BotCommand(command="/watch", description="следить за ценой отеля"),
         types.BotCommand(command="/cancel", description="прервать запрос"),
         types.BotCommand(command="/history", description="история поисков"),
 
@@ -53,7 +55,7 @@ def register_region_handlers(dispatcher: Dispatcher) -> None:
     )
     dispatcher.register_message_handler(
         machine_bot.region_index_choice,
-        lambda x: re.fullmatch(RE_DIGITS, x.text.strip()) is not None,
+        lambda x: re.fullmatch(RE_INDEXES, x.text.strip()) is not None,
         content_types=types.ContentType.TEXT,
         state=machine_bot.FSMRequestForm.fill_region_id
     )
@@ -113,7 +115,7 @@ def register_children_handlers(dispatcher: Dispatcher) -> None:
 def register_hotel_handlers(dispatcher: Dispatcher) -> None:
     """
         Создаем диалог для создания меню по которому получим id отеля.
-        Даем возможность сортировки.
+        Даем возможность сортировки и листания страниц меню.
         Получаем ответ из меню выбора отеля из которого выделим id отеля
         Показываем результат.
     """
@@ -135,6 +137,12 @@ def register_hotel_handlers(dispatcher: Dispatcher) -> None:
         state=machine_bot.FSMRequestForm.fill_hotel
     )
 
+    dispatcher.register_callback_query_handler(
+        machine_bot.hotels_page_buttons,
+        filters.Text(startswith="page", ignore_case=True),
+        state=machine_bot.FSMRequestForm.fill_hotel
+    )
+
     dispatcher.register_callback_query_handler(
         machine_bot.show_image_callback,
         filters.Text(startswith="show_image", ignore_case=True),
@@ -171,9 +179,14 @@ def register_all_handlers(disp: Dispatcher) -> None:
     disp.register_message_handler(commands_bot.start_command, filters.CommandStart(), state='*')
     disp.register_message_handler(commands_bot.help_command, filters.CommandHelp())
     disp.register_message_handler(commands_bot.config_command, commands=['config'], state='*')
+    disp.register_message_handler(commands_bot.weights_command, commands='weights', state='*')
     disp.register_message_handler(machine_bot.fillform_command, commands=['fillform'], state='*')
     disp.register_message_handler(machine_bot.cancel_command, commands='cancel', state='*')
     disp.register_message_handler(machine_bot.showdata_command, commands='showdata', state='*')
+    disp.register_message_handler(machine_bot.flexdates_command, commands='flexdates', state='*')
+    disp.register_message_handler(machine_bot.watch_command, commands='watch', state='*')
+    disp.register_message_handler(machine_bot.unwatch_command, commands='unwatch', state='*')
+    disp.register_message_handler(machine_bot.filter_command, commands='filter', state='*')
     disp.register_message_handler(machine_bot.show_image_command, commands='showimage', state='*')
     disp.register_message_handler(machine_bot.history_command, commands='history', state='*')
     disp.register_message_handler(commands_bot.customising_command, commands='customising', state='*')
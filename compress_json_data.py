@@ -0,0 +1,25 @@
+import argparse
+import os
+
+from api_service.compression import compress_directory, SUFFIXES
+
+
+def folder_size(directory: str) -> int:
+    """ Суммарный размер файлов папки в байтах """
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+if __name__ == '__main__':
+    """
+    Сжимает на месте несжатые .json файлы кэша ответов Hotels.com.
+    python compress_json_data.py json_data --method gzip
+    """
+    parser = argparse.ArgumentParser(description="Сжимает на месте файлы кэша ответов Hotels.com")
+    parser.add_argument("directory", nargs="?", default="json_data", help="папка с .json файлами")
+    parser.add_argument("--method", choices=list(SUFFIXES), default=None,
+                        help="метод сжатия, по умолчанию CACHE_COMPRESSION")
+    args = parser.parse_args()
+
+    before = folder_size(args.directory)
+    files = compress_directory(args.directory, args.method)
+    print(f"сжато файлов: {len(files)}, было {before} байт, стало {folder_size(args.directory)} байт")
@@ -15,9 +15,88 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", None)
 """ для сокращения обращений к серверу Hotels.com, использовать запись ответов сервера в файлы """
 USE_TMP_FILE = True
 
+""" пул соединений aiohttp для асинхронных запросов к Hotels.com """
+HTTP_CONNECTIONS_LIMIT: int = 100  # общее количество соединений в пуле
+HTTP_CONNECTIONS_LIMIT_PER_HOST: int = 20  # одновременных соединений к одному хосту
+HTTP_KEEPALIVE_TIMEOUT: float = 30.0  # сколько секунд держать простаивающее соединение
+
+""" планировщик запросов к Hotels.com с учетом лимитов RapidAPI """
+PRIORITY_INTERACTIVE: int = 0  # запрос пользователя, который ждет ответ, не отбрасывается никогда
+PRIORITY_PREFETCH: int = 1  # упреждающий запрос
+PRIORITY_WARMER: int = 2  # прогрев кэша
+API_RATE_PER_SECOND: float = 5.0  # сколько запросов в секунду можно отправлять
+API_RATE_BURST: int = 5  # сколько запросов можно отправить подряд без ожидания
+# доля оставшегося месячного лимита, при которой запросы с этим приоритетом отбрасываются
+QUOTA_RESERVE: Dict[int, float] = {PRIORITY_PREFETCH: 0.2, PRIORITY_WARMER: 0.4}
+WARMER_CONCURRENCY: int = 4  # сколько запросов прогрева кэша выполняется одновременно
+PREFETCH_CONCURRENCY: int = 2  # сколько упреждающих запросов выполняется одновременно
+PREFETCH_RESULT_TTL: int = 600  # через сколько секунд удаляется результат упреждающего запроса, который не забрали
+PREFETCH_SUMMARY_TOP: int = 0  # для скольких первых отелей меню заранее запрашивать подробности, 0 - не запрашивать
+PREFETCH_OFFER: bool = False  # запрашивать список отелей сразу после ввода дат, до ввода состава гостей
+PREFETCH_OFFER_GUESTS: tuple = (2, ())  # состав гостей по умолчанию: взрослых и возраст детей
+PREFETCH_OFFER_MIN_HIT_RATE: float = 0.3  # ниже этой доли попаданий запросы списка отелей отключаются
+PREFETCH_OFFER_MIN_SAMPLES: int = 20  # сколько результатов набрать, прежде чем оценивать долю попаданий
+
+""" размыкатель цепи для запросов к Hotels.com """
+BREAKER_FAILURE_THRESHOLD: int = 5  # неудач подряд, после которых запросы перестают отправляться
+BREAKER_RESET_TIMEOUT: float = 30.0  # через сколько секунд пробовать отправить запрос снова
+
+""" свежесть ответов в кэше по типам запросов, секунд """
+CACHE_TTL: Dict[str, int] = {
+    "place": 21 * 24 * 3600,  # регионы меняются редко
+    "offer": 1 * 3600,  # цены отелей
+    "summary": 3 * 24 * 3600,  # подробности отеля
+}
+# сколько секунд после окончания TTL устаревший ответ еще отдается сразу, пока в фоне запрашивается новый
+CACHE_STALE_GRACE: Dict[str, int] = {
+    "place": 14 * 24 * 3600,
+    "offer": 3 * 3600,
+    "summary": 7 * 24 * 3600,
+}
+# сколько секунд помнить пустой результат или ошибку запроса, чтобы не повторять тот же запрос
+NEGATIVE_CACHE_TTL: Dict[str, int] = {
+    "place": 6 * 3600,  # регион с опечаткой
+    "offer": 15 * 60,  # нет свободных отелей
+    "summary": 3600,
+}
+NEGATIVE_CACHE_MAX_BYTES: int = 1024 * 1024  # объем памяти для отрицательных ответов
+CACHE_MEMORY_MAX_BYTES: int = 64 * 1024 * 1024  # объем ответов, которые хранятся в памяти процесса
+CACHE_BACKEND: str = "files"  # где хранить ответы на диске: "files" - папка json_data, "sqlite" - одна БД
+CACHE_DB_NAME: str = "cache_hotels.db"  # БД SQLite для ответов, если CACHE_BACKEND = "sqlite"
+CACHE_DB_MAX_BYTES: int = 512 * 1024 * 1024  # объем сжатых ответов в БД, сверх него вытесняются давно не читанные
+CACHE_DB_BUSY_TIMEOUT: int = 5000  # сколько миллисекунд ждать БД кэша, занятую другим процессом
+CACHE_DB_TOUCH_INTERVAL: int = 300  # с какой точностью в секундах хранить время последнего чтения ответа
+CACHE_DB_TOUCH_BATCH: int = 64  # сколько времен чтения накапливать до записи в БД
+CACHE_PARSED: bool = True  # хранить в кэше разобранные списки регионов, отелей и подробности отеля
+CACHE_RAW: bool = True  # хранить в кэше полные ответы сервера
+CACHE_COMPRESSION: str = "gzip"  # сжатие файлов json_data: "gzip", "zstd" (нужен пакет zstandard) или "" без сжатия
+
+""" общий каталог отелей в БД """
+CATALOG_TTL: int = 30 * 24 * 3600  # сколько секунд сведения об отеле в каталоге считаются актуальными
+
+""" ранжирование отелей для сортировки bestdeal """
+MILE_KM: float = 1.60934  # километров в миле
+RANK_FACTORS: tuple = ("price", "dist", "stars", "score")  # показатели: цена, расстояние, звезды, оценка гостей
+RANK_WEIGHTS: tuple = (1.0, 1.0, 0.0, 0.0)  # веса показателей по умолчанию
+RANK_MAX_WEIGHT: float = 10.0  # максимальный вес показателя, который может задать пользователь
+
 MAX_IMAGE_SIZE: int = 10  # максимальное количество результатов в запросе изображений отеля
                           # Media group must include 2-10 items
 MAX_RESULT_SIZE: int = 10  # максимальное количество результатов в запросе поиска отелей
+MAX_HOTEL_PAGES: int = 30  # сколько страниц выдачи отелей можно пролистать в меню
+MAX_REGIONS: int = 4  # сколько регионов можно выбрать для одного поиска
+MULTI_REGION_CONCURRENCY: int = 4  # сколько регионов запрашивается одновременно
+FLEX_DAYS: int = 3  # на сколько дней раньше и позже сдвигать дату заезда в сетке цен /flexdates
+FLEX_CONCURRENCY: int = 4  # сколько вариантов дат сетки цен запрашивается одновременно
+
+""" подписки на снижение цены отеля """
+PRICE_WATCH_INTERVAL: int = 3600  # как часто в секундах проверять цены подписок
+PRICE_WATCH_CONCURRENCY: int = 4  # сколько запросов проверки цен выполняется одновременно
+PRICE_WATCH_MIN_DROP: float = 0.01  # о каком снижении цены уведомлять, доля от прежней цены
+PRICE_WATCH_BATCH_SIZE: int = 20  # сколько уведомлений отправлять без паузы
+PRICE_WATCH_MAX_PAGES: int = 3  # сколько страниц выдачи просматривать в поиске отелей подписок
+PRICE_WATCH_UNTRACKED_AFTER: int = 24 * 3600  # через сколько секунд без цены отеля подписка удаляется
+MAX_WATCHES: int = 10  # сколько подписок может быть у одного пользователя
 MAX_STORY_SIZE: int = 10  # максимальное количество результатов в выдаче истории запросов
 
 MAX_ADULTS = 4  # максимальное число взрослых путешественников
@@ -36,6 +115,7 @@ class UsersConstants:
     RESULT_SIZE: int = 10
     STORY_SIZE: int = 9
     last_query_data: dict = None
+    WEIGHTS: tuple = RANK_WEIGHTS
 
 
 """ хранилище для последней сессии/поиска """
@@ -43,12 +123,21 @@ online_user_db: dict = {int: UsersConstants}
 
 RE_DATE = r"(?:[0-9]{1,2}[-|/|.]){2}[0-9]{2,4}"
 RE_DIGITS = r"(\d+)"
+RE_NUMBER = r"\d+(?:\.\d+)?"  # целое или дробное число через точку
+RE_FILTER = r"(price|dist|stars)\s*[=:]?\s*(\d+(?:\.\d+)?)"  # условие фильтра отелей и его значение
+RE_INDEXES = r"\d+(?:[\s,;]+\d+)*"  # несколько номеров меню через пробел или запятую
 RE_NAME_REGION = r"[A-Za-zА-Яа-я— -]"  # только буквы тире длинное тире и пробел
 
 REGION_TYPE_FILTER = ["CITY", "AIRPORT", "NEIGHBORHOOD"]  # фильтр регионов
 RUS_REGION_TRANS = ["город", "аэропорт", "район"]
 TRANSLATE_REGION_DICT = dict(zip(REGION_TYPE_FILTER, RUS_REGION_TRANS))
 
+""" локальный индекс известных регионов """
+REGION_INDEX_FILE: str = "region_index.jsonl"  # файл индекса, дописывается ответами сервера
+REGION_INDEX_MIN_PREFIX: int = 4  # минимальная длина начала названия для поиска по префиксу
+REGION_INDEX_FUZZY_CUTOFF: float = 0.85  # минимальная похожесть названий для нечеткого поиска
+REGION_INDEX_LIMIT: int = 10  # максимальное количество регионов в ответе индекса
+
 SORT_LIST = ("lowprice", "highprice", "bestdeal")
 
 LEXICON: Dict[str, Union[str, Callable]] = {
@@ -56,6 +145,11 @@ LEXICON: Dict[str, Union[str, Callable]] = {
     '/help_command': "<b>/start</b>\t\tперезапуск бота\n"
                      "<b>/cancel</b>\t\tпрервать поиск\n"
                      "<b>/fillform</b>\tначать поиск\n"
+                     "<b>/flexdates</b>\tцены на соседние даты\n"
+                     "<b>/watch</b>\tследить за ценой отеля\n"
+                     "<b>/unwatch</b>\tперестать следить\n"
+                     "<b>/filter</b>\tфильтр меню отелей\n"
+                     "<b>/weights</b>\tвеса сортировки bestdeal\n"
                      "<b>/config</b>\t\tустановки\n",
 
     '/help_info': "Введи команду <b>/fillform</b>, "
@@ -78,6 +172,16 @@ LEXICON: Dict[str, Union[str, Callable]] = {
                      f"  глубину истории от 1 до {MAX_STORY_SIZE}.\n"
                      f"  <em>например:</em>  <code>4, 9, 5</code> или  <code>8 10 7</code>"
     ,
+    '/weights': "Сортировка <b>bestdeal</b> учитывает цену, расстояние от центра, звезды и оценку гостей.\n"
+                "Текущие веса:\n",
+    'info_weights': f"\nЧтобы изменить, отправь четыре веса от 0 до {RANK_MAX_WEIGHT:g} в том же порядке,\n"
+                    f"  <em>например:</em>  <code>/weights 1 0.5 0 2</code>",
+    'weights_stars': "<em>Звезды известны только у отелей, подробности которых уже кто-то смотрел, "
+                     "у остальных отелей вес звезд не влияет на место в списке.</em>",
+    'wrong_weights': f"Надо ввести через пробел <b>4</b> числа от 0 до {RANK_MAX_WEIGHT:g}, хотя бы одно больше 0.\n",
+    'weights_list': lambda x: "\n".join(
+        f"  {name_i}: <b>{weight_i:g}</b>" for name_i, weight_i in zip(("цена", "расстояние", "звезды", "оценка гостей"), x)
+    ),
     'wrong_constant': f"Надо ввести <b>3</b> числа,\nсколько хочешь получить результатов:\n",
 
     '/fillform': "Веди название города или региона, например:\n"
@@ -98,7 +202,8 @@ LEXICON: Dict[str, Union[str, Callable]] = {
 
     'wait': "<em>подожди немного</em>",
     'look_region': "Ищу варианты регионов:",
-    'choice_region': "Выбери из списка <b>номер</b> региона который тебе нужен:\n",
+    'choice_region': "Выбери из списка <b>номер</b> региона который тебе нужен:\n"
+                     f"(можно до {MAX_REGIONS} номеров через пробел, чтобы искать сразу в нескольких)\n",
     'wrong_region': "не похоже на название региона.\n"
                     "Используй только буквы, дефис и пробел.\n"
                     "Пожалуйста, введи название региона, например: 'milan', 'Manchester'...  ",
@@ -132,10 +237,32 @@ LEXICON: Dict[str, Union[str, Callable]] = {
     'choice_hotels': "Выбери из списка <b>номер</b> отеля который тебе нужен:\n"
                      "(<em>название, цена, расстояние от центра</em>)\n",
     'sort_hotels': f"сортировка:",
+    'hotels_page': "страница",
+    'no_more_hotels': "Больше отелей нет",
+    'page_not_loaded': "Следующую страницу получить не удалось, попробуйте еще раз",
+    'hotels_filter': "фильтр:",
+    'filter_part': lambda x, y: {"price": f"цена до {y:g}", "dist": f"до {y:g} км от центра",
+                                 "stars": f"от {y:g} звезд"}.get(x, ""),
+    'info_filter': "Чтобы оставить в меню только подходящие отели, отправь условия, например:\n"
+                   "<code>/filter price 150 dist 2 stars 4</code> - цена не выше 150, не дальше 2 км, от 4 звезд.\n"
+                   "Условия можно добавлять по одному, <code>/filter off</code> снимает фильтр.",
+    'unknown_stars': lambda x, y: "звезды неизвестны ни у одного отеля, условие по звездам не применяется" if x == y
+                                  else f"звезды неизвестны у {x} отелей из {y}, они показаны без проверки звезд",
+    'wrong_filter': "Фильтр работает в меню отелей. Сначала найди отели командой /fillform",
     'no_find_hotels': "Не могу найти отели по твоему запросу. Попробуй другие параметры.",
     'wrong_hotel_index': "При выборе отеля используй его номер, цифры от 1 до",
     'zero_hotel_list': "список отелей пуст, сортировать нечего",
     'final_hotel': "Выбран отель:\n",
+    'flex_grid': f"Самые дешевые отели при сдвиге даты заезда до {FLEX_DAYS} дней, ночей столько же:\n",
+    'wrong_flexdates': "Сначала выбери регион, даты и гостей командой /fillform, потом набери /flexdates",
+    'no_flex_hotels': "нет отелей",
+    '/watch': "Чтобы следить за снижением цены этого отеля отправь команду /watch",
+    'watch_added': "Слежу за ценой отеля. Сообщу, когда она снизится.\nТвои подписки:\n",
+    'wrong_watch': "Сначала выбери отель командой /fillform, потом набери /watch",
+    'watch_limit': f"Можно следить не больше чем за {MAX_WATCHES} отелями. Отправь /unwatch, чтобы удалить подписки.",
+    'watch_removed': "Удалено подписок на цену:",
+    'price_drop': "Цена снизилась:\n",
+    'watch_untracked': "Не могу следить за ценой: отеля больше нет среди предложений на эти даты, подписка удалена:\n",
 
     'wrong_show_image': "Нет доступных фотографий.",
 
@@ -2,3 +2,5 @@
 NAME = 'db_package'
 
 from .db_config import UsersActions
+from .hotel_catalog import HotelsCatalog
+from .price_watch import PriceWatch
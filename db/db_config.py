@@ -92,13 +92,22 @@ class UsersActions:
         "SELECT_CONSTANTS": """SELECT image_size, result_size, story_size FROM constants WHERE user_id = ?;""",
         "INSERT_CONSTANTS": """INSERT INTO constants (user_id, image_size, result_size, story_size) VALUES (?, ?, ?, ?);""",
         "UPDATE_CONSTANTS": """UPDATE constants SET image_size = ?, result_size=?, story_size=? WHERE user_id = ?;""",
+        "CREATE_WEIGHTS_DB": """
+                CREATE TABLE IF NOT EXISTS rank_weights      -- веса показателей сортировки bestdeal пользователей
+                (
+                    user_id INTEGER PRIMARY KEY,
+                    weights TEXT NOT NULL                    -- json список весов в порядке RANK_FACTORS
+                );
+        """,
+        "SELECT_WEIGHTS": """SELECT weights FROM rank_weights WHERE user_id = ?;""",
+        "UPSERT_WEIGHTS": """INSERT OR REPLACE INTO rank_weights (user_id, weights) VALUES (?, ?);""",
 
     }
 
     def __init__(self, name_file_db: str = ""):
         """
-        В указанном файле БД создаются две таблицы, для хранения истории запросов пользователей и для
-        хранения кофигов пользователей
+        В указанном файле БД создаются таблицы для хранения истории запросов пользователей,
+        кофигов пользователей и весов сортировки bestdeal
 
         """
         if name_file_db:
@@ -109,6 +118,7 @@ class UsersActions:
             with self.db as cur:
                 cur.execute(self.queries.get('CREATE_USERS_HISTORY_DB', None))
                 cur.execute(self.queries.get('CREATE_CONSTANT_DB', None))
+                cur.execute(self.queries.get('CREATE_WEIGHTS_DB', None))
         except sqlite3.Error as err:
             print(f"ошибка создания в БД Sqlite3: {err}")
 
@@ -206,6 +216,23 @@ class UsersActions:
             print(f"ошибка изменения таблицы constants БД Sqlite3: {err}")
         return False
 
+    def get_user_weights(self, user_id: int) -> Union[tuple, None]:
+        """ Возвращает веса показателей сортировки bestdeal для user_id, если пользователь их задавал """
+        with self.db as cursor:
+            cursor.execute(self.queries.get('SELECT_WEIGHTS', None), (user_id,))
+            data = cursor.fetchone()
+        return tuple(json.loads(data[0])) if data else None
+
+    def set_user_weights(self, user_id: int, weights: tuple) -> bool:
+        """ Записывает веса показателей сортировки bestdeal для user_id """
+        try:
+            with self.db as cur:
+                cur.execute(self.queries.get('UPSERT_WEIGHTS', None), (user_id, json.dumps(list(weights))))
+                return True
+        except sqlite3.Error as err:
+            print(f"ошибка изменения таблицы rank_weights БД Sqlite3: {err}")
+        return False
+
 
 if __name__ == '__main__':
     u = UsersActions("../history_bot.db")
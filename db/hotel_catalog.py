@@ -0,0 +1,142 @@
+import sqlite3
+import time
+from typing import Dict, Union, List
+import json
+
+from db.db_config import dbControl
+from constants import CATALOG_TTL
+from records import HotelSummary
+
+
+class HotelsCatalog:
+    """
+    Общий для всех пользователей каталог отелей в БД db_name.
+    Хранит редко меняющиеся сведения об отеле из ответа summary_json_parse: название, адрес, страну,
+    координаты, звезды, ссылку на карту и ссылки на фотографии, с временем последнего обновления.
+    Ключ - id отеля, поэтому второй пользователь, выбравший тот же отель, получает его без запроса к API.
+    """
+    db_name = 'history_bot.db'
+    queries = {
+        "CREATE_CATALOG_DB": """ /* Запрос для создания таблицы каталога отелей в БД */
+                CREATE TABLE IF NOT EXISTS hotels_catalog
+                (
+                    hotel_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    address TEXT,
+                    country TEXT,
+                    latitude REAL,
+                    longitude REAL,
+                    stars REAL,
+                    map_url TEXT,
+                    images TEXT,                      -- json список ссылок на фотографии
+                    refreshed REAL NOT NULL           -- время последнего обновления
+                );
+                """,
+        "SELECT_HOTEL": """
+                SELECT hotel_id, name, address, country, latitude, longitude, stars, map_url, images, refreshed
+                FROM hotels_catalog WHERE hotel_id = ?;
+                """,
+        "UPSERT_HOTEL": """
+                INSERT INTO hotels_catalog
+                    (hotel_id, name, address, country, latitude, longitude, stars, map_url, images, refreshed)
+                    VALUES (:id, :name, :address, :country, :latitude, :longitude, :stars, :map_url, :images, :refreshed)
+                ON CONFLICT(hotel_id) DO UPDATE SET
+                    name=excluded.name, address=excluded.address, country=excluded.country,
+                    latitude=excluded.latitude, longitude=excluded.longitude, stars=excluded.stars,
+                    map_url=excluded.map_url, images=excluded.images, refreshed=excluded.refreshed;
+                """,
+        "SELECT_STARS": """
+                SELECT hotel_id, stars FROM hotels_catalog WHERE stars IS NOT NULL AND hotel_id IN ({});
+                """,
+        "COUNT_HOTELS": """SELECT COUNT(1) from hotels_catalog""",
+    }
+
+    def __init__(self, name_file_db: str = ""):
+        """ В указанном файле БД создается таблица каталога отелей """
+        self.db = dbControl(name_file_db if name_file_db else self.db_name)
+        try:
+            with self.db as cur:
+                cur.execute(self.queries.get('CREATE_CATALOG_DB', None))
+        except sqlite3.Error as err:
+            print(f"ошибка создания в БД Sqlite3: {err}")
+
+    def get_hotel(self, hotel_id: str, max_age: float = CATALOG_TTL) -> Union[List, None]:
+        """
+        Возвращает подробности отеля в формате summary_json_parse: [сведения об отеле, список фотографий].
+        :param hotel_id: id отеля
+        :param max_age: сколько секунд сведения считаются актуальными
+        :return: подробности отеля или None, если отеля нет в каталоге или сведения устарели
+        """
+        try:
+            with self.db as cursor:
+                cursor.execute(self.queries.get('SELECT_HOTEL', None), (str(hotel_id),))
+                row = cursor.fetchone()
+        except sqlite3.Error as err:
+            print(f"ошибка чтения каталога отелей БД Sqlite3: {err}")
+            return None
+        if row is None or time.time() - row[9] > max_age:
+            return None
+        info = HotelSummary(
+            id=row[0],
+            name=row[1],
+            address=row[2],
+            country=row[3],
+            location=(row[4], row[5]) if row[4] is not None or row[5] is not None else None,
+            stars=row[6],
+            map_url=row[7],
+        )
+        return [info, json.loads(row[8]) if row[8] else []]
+
+    def get_stars(self, hotels_id: List[str]) -> Dict[str, float]:
+        """
+        Возвращает звезды отелей одним запросом. Звезды почти не меняются, поэтому возраст сведений не проверяется.
+        :param hotels_id: список id отелей
+        :return: {id отеля: звезды} для отелей каталога, у которых звезды известны
+        """
+        hotels_id = [str(x) for x in hotels_id]
+        if not hotels_id:
+            return {}
+        query = self.queries.get('SELECT_STARS', None).format(", ".join("?" * len(hotels_id)))
+        try:
+            with self.db as cursor:
+                cursor.execute(query, hotels_id)
+                return {x[0]: x[1] for x in cursor.fetchall()}
+        except sqlite3.Error as err:
+            print(f"ошибка чтения каталога отелей БД Sqlite3: {err}")
+        return {}
+
+    def put_hotel(self, summary: List) -> bool:
+        """
+        Записывает или обновляет отель в каталоге.
+        :param summary: подробности отеля в формате summary_json_parse
+        :return: True если запись выполнена
+        """
+        if not summary or not summary[0].get("id", None):
+            return False
+        info, images = summary[0], summary[1]
+        location = info.get("location", None) or (None, None)
+        try:
+            with self.db as cursor:
+                cursor.execute(self.queries.get('UPSERT_HOTEL', None), {
+                    "id": str(info["id"]), "name": info.get("name", ""), "address": info.get("address", None),
+                    "country": info.get("country", None), "latitude": location[0], "longitude": location[1],
+                    "stars": info.get("stars", None), "map_url": info.get("map_url", None),
+                    "images": json.dumps(images), "refreshed": time.time()
+                })
+                return True
+        except sqlite3.Error as err:
+            if self.db.connect:
+                self.db.connect.rollback()
+            print(f"ошибка записи каталога отелей БД Sqlite3: {err}")
+        return False
+
+    def count(self) -> int:
+        """ Количество отелей в каталоге """
+        with self.db as cursor:
+            cursor.execute(self.queries.get('COUNT_HOTELS', None))
+            return cursor.fetchone()[0]
+
+
+if __name__ == '__main__':
+    catalog = HotelsCatalog("../history_bot.db")
+    print(f"отелей в каталоге: {catalog.count()}")
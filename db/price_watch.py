@@ -0,0 +1,133 @@
+import sqlite3
+import time
+from typing import List, Tuple
+import json
+
+from db.db_config import dbControl
+
+
+class PriceWatch:
+    """
+    Подписки пользователей на снижение цены отеля на выбранные даты в БД db_name.
+    Для каждой подписки хранятся параметры запроса списка отелей, последняя известная цена
+    и время последней проверки, на которой цена отеля найдена.
+    """
+    db_name = 'history_bot.db'
+    queries = {
+        "CREATE_WATCH_DB": """ /* Запрос для создания таблицы подписок на цену отеля в БД */
+                CREATE TABLE IF NOT EXISTS price_watch
+                (
+                    watch_id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    hotel_id TEXT NOT NULL,
+                    hotel_name TEXT,
+                    region_id TEXT NOT NULL,
+                    in_date TEXT NOT NULL,            -- дата заезда dd/mm/YYYY
+                    out_date TEXT NOT NULL,           -- дата выезда dd/mm/YYYY
+                    adults INTEGER NOT NULL,
+                    children TEXT,                    -- json список возрастов детей
+                    results_size INTEGER NOT NULL,
+                    last_price REAL,
+                    currency TEXT,
+                    created REAL NOT NULL,
+                    checked REAL,                     -- время последней найденной цены
+                    UNIQUE (user_id, hotel_id, in_date, out_date)
+                );
+                """,
+        "INSERT_WATCH": """
+                INSERT OR REPLACE INTO price_watch
+                    (user_id, chat_id, hotel_id, hotel_name, region_id, in_date, out_date, adults, children,
+                     results_size, last_price, currency, created, checked)
+                    VALUES (:user_id, :chat_id, :hotel_id, :hotel_name, :region_id, :in_date, :out_date, :adults,
+                            :children, :results_size, :last_price, :currency, :created, :created);
+                """,
+        "SELECT_ALL_WATCH": """
+                SELECT watch_id, user_id, chat_id, hotel_id, hotel_name, region_id, in_date, out_date, adults,
+                       children, results_size, last_price, currency, checked
+                FROM price_watch;
+                """,
+        "SELECT_USER_WATCH": """SELECT hotel_name, in_date, out_date, last_price, currency
+                FROM price_watch WHERE user_id = ? ORDER BY created;""",
+        "UPDATE_PRICE": """UPDATE price_watch SET last_price = ?, checked = ? WHERE watch_id = ?;""",
+        "DELETE_WATCH": """DELETE FROM price_watch WHERE watch_id = ?;""",
+        "DELETE_USER_WATCH": """DELETE FROM price_watch WHERE user_id = ?;""",
+    }
+    columns = ("watch_id", "user_id", "chat_id", "hotel_id", "hotel_name", "region_id", "in_date", "out_date",
+               "adults", "children", "results_size", "last_price", "currency", "checked")
+
+    def __init__(self, name_file_db: str = ""):
+        """ В указанном файле БД создается таблица подписок на цену отеля """
+        self.db = dbControl(name_file_db if name_file_db else self.db_name)
+        try:
+            with self.db as cur:
+                cur.execute(self.queries.get('CREATE_WATCH_DB', None))
+        except sqlite3.Error as err:
+            print(f"ошибка создания в БД Sqlite3: {err}")
+
+    def add_watch(self, user_id: int, chat_id: int, hotel: dict, region_id: str, dates: List[str],
+                  adults: int, children: List[int], results_size: int) -> bool:
+        """
+        Записывает подписку пользователя на цену отеля, повторная подписка на те же даты заменяет прежнюю.
+        :param hotel: отель из списка отелей: 'id', 'name', 'price', 'currency'
+        :param dates: даты заезда и выезда
+        :return: True если запись выполнена
+        """
+        try:
+            with self.db as cursor:
+                cursor.execute(self.queries.get('INSERT_WATCH', None), {
+                    "user_id": user_id, "chat_id": chat_id, "hotel_id": str(hotel['id']),
+                    "hotel_name": hotel.get('name', ''), "region_id": str(region_id),
+                    "in_date": dates[0], "out_date": dates[1], "adults": adults,
+                    "children": json.dumps(sorted(children or [])), "results_size": results_size,
+                    "last_price": hotel.get('price', None), "currency": hotel.get('currency', ''),
+                    "created": time.time()
+                })
+                return True
+        except sqlite3.Error as err:
+            if self.db.connect:
+                self.db.connect.rollback()
+            print(f"ошибка записи подписки БД Sqlite3: {err}")
+        return False
+
+    def get_all_watches(self) -> List[dict]:
+        """ Возвращает все подписки списком словарей """
+        with self.db as cursor:
+            cursor.execute(self.queries.get('SELECT_ALL_WATCH', None))
+            rows = cursor.fetchall()
+        watches = [dict(zip(self.columns, row_i)) for row_i in rows]
+        for watch_i in watches:
+            watch_i['children'] = json.loads(watch_i['children']) if watch_i['children'] else []
+        return watches
+
+    def get_user_watches(self, user_id: int) -> List[tuple]:
+        """ Возвращает подписки пользователя: (название отеля, заезд, выезд, цена, валюта) """
+        with self.db as cursor:
+            cursor.execute(self.queries.get('SELECT_USER_WATCH', None), (user_id,))
+            return cursor.fetchall()
+
+    def update_prices(self, prices: List[Tuple[float, float, int]]) -> None:
+        """
+        Записывает новые цены одной транзакцией.
+        :param prices: список (цена, время проверки, id подписки)
+        """
+        if prices:
+            with self.db as cursor:
+                cursor.executemany(self.queries.get('UPDATE_PRICE', None), prices)
+
+    def delete_watches(self, watches_id: List[int]) -> None:
+        """ Удаляет подписки по id, например устаревшие, дата заезда которых уже прошла """
+        if watches_id:
+            with self.db as cursor:
+                cursor.executemany(self.queries.get('DELETE_WATCH', None), [(x,) for x in watches_id])
+
+    def delete_user_watches(self, user_id: int) -> int:
+        """ Удаляет все подписки пользователя, возвращает количество удаленных """
+        with self.db as cursor:
+            cursor.execute(self.queries.get('DELETE_USER_WATCH', None), (user_id,))
+            return cursor.rowcount
+
+
+if __name__ == '__main__':
+    watch = PriceWatch("../history_bot.db")
+    [print(x) for x in watch.get_all_watches()]
@@ -1,11 +1,15 @@
-from settingsAPI import HotelsAPIsetup
+from settingsAPI import HotelsAPIsetup, ApiRequest, ENDPOINT_NAMES
+from api_service import http_pool, single_flight, quota_scheduler, policy_for, breaker_for, count_event
+from api_service import FRESH, STALE, file_freshness, freshness, response_cache
+from api_service.compression import read_file, write_file
+from constants import PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, CACHE_PARSED, CACHE_RAW
 from pydantic import BaseModel
-from typing import Any, Dict, Optional, Union
+from typing import Any, Callable, Dict, Optional, Union, Tuple
 import requests
+import aiohttp
+import asyncio
 import json
-import os
 import time
-import random
 from pprint import pprint
 import sys
 
@@ -24,6 +28,7 @@ class SiteApi(BaseModel):
     query_name: имя параметра в запросе
     status: статус ответа на запрос
     json_encoders: значение ответа
+    error: ошибка в самом запросе, на которую сервер ответит так же и при повторе, например "http_400"
 
     current_costs_response: сколько осталось запросов к Hotels.com
     limit_response: лимит на количество запросов Hotels.com из headers
@@ -37,6 +42,7 @@ class SiteApi(BaseModel):
     query_name: str = None
     status: bool = False
     json_encoders: Union[Any, None] = None
+    error: Optional[str] = None
 
     current_costs_response: str = None
     limit_response: str = None
@@ -51,6 +57,11 @@ class SiteApi(BaseModel):
         """ Возвращает полный url"""
         return self.base_url + self.tail_url
 
+    @property
+    def endpoint(self) -> str:
+        """ Короткое имя типа запроса: place, offer или summary """
+        return ENDPOINT_NAMES.get(self.tail_url, self.tail_url)
+
     def balance_current_costs_response(self) -> Union[int, None]:
         """
         Возвращает остаток подключений к Hotels.com
@@ -67,71 +78,181 @@ class SiteApi(BaseModel):
                f"Осталось запросов: {self.current_costs_response}\n" \
                f"Использовано запросов: {self.balance_current_costs_response()}"
 
+    def set_limits(self, headers: Any) -> None:
+        """
+        Запоминает из headers ответа состояние лимита запросов к Hotels.com
+        :param headers: заголовки ответа сервера
+        """
+        self.current_costs_response = headers.get('X-RateLimit-Requests-Remaining', None)  # оставщиеся запросы
+        self.limit_response = headers.get('X-RateLimit-Requests-Limit', None)  # установленный лимит
+
     def get_data(self, query_dict: dict, not_debug: bool = True) -> None:
         """
         Формирует все параметры запроса в data_par.
         Посылает запрос. Получает ответ и при удачном исполнении, записывает ответ.
-        Делает три попытки.
+        Количество попыток, паузы между ними и таймауты берутся из политики для этого типа запросов,
+        пока цепь разомкнута, запрос сразу завершается неудачей.
+        Ответ 429 приостанавливает общий планировщик quota_scheduler, повтор ждет окончания паузы.
         :param query_dict: Входящие специфические для каждого запроса параметры
         :param not_debug: использовать/нет экономию запросов к hotels.com
         :return: None
         """
-        data_par = {'headers': self.headers, self.query_name: query_dict, 'timeout': 6.1}
-        for count_rec in range(3):
+        policy = policy_for(self.tail_url)
+        breaker = breaker_for(self.tail_url)
+        data_par = {'headers': self.headers, self.query_name: query_dict,
+                    'timeout': (policy.connect_timeout, policy.read_timeout)}
+        self.status = False
+        self.json_encoders = None
+        self.error = None
+        for count_rec in range(policy.attempts):
+            if not breaker.allow():
+                count_event(self.tail_url, "short_circuit")
+                break
             try:
                 response = requests.request(self.method, self.url, **data_par)
-                response.raise_for_status()
+                quota_scheduler.update_from_headers(response.headers)
+                if response.status_code == 429 or response.status_code >= 500:
+                    count_event(self.tail_url, f"http_{response.status_code}")
+                    if response.status_code == 429:
+                        quota_scheduler.too_many_requests(response.headers)
+                    elif breaker.record_failure():
+                        count_event(self.tail_url, "breaker_open")
+                else:
+                    response.raise_for_status()
+                    self.set_limits(response.headers)
 
-                self.current_costs_response = response.headers.get('X-RateLimit-Requests-Remaining', None) # оставщиеся запросы
-                self.limit_response = response.headers.get('X-RateLimit-Requests-Limit', None) # установленный лимит
+                    not_debug or print(f"Данные получены по запросу.\n{self.get_requests_limit_balance()}.")
 
-                not_debug or print(f"Данные получены по запросу.\n{self.get_requests_limit_balance()}.")
-
-                if response.status_code == requests.codes.ok:
-                    self.status = True
                     self.json_encoders = response.json()
+                    self.status = True
+                    breaker.record_success()
                     break
-                else:
-                    self.status = False
-                    self.json_encoders = None
             except requests.exceptions.Timeout as err:
-                pass
-            except requests.exceptions.RequestException as err:
-                self.status = False
+                count_event(self.tail_url, "timeout")
+                if breaker.record_failure():
+                    count_event(self.tail_url, "breaker_open")
+            except requests.exceptions.ConnectionError as err:
+                count_event(self.tail_url, "connection_error")
+                if breaker.record_failure():
+                    count_event(self.tail_url, "breaker_open")
+            except requests.exceptions.HTTPError as err:
+                count_event(self.tail_url, "client_error")
+                breaker.record_success()
+                self.error = f"http_{err.response.status_code}"
+                break
+            except (requests.exceptions.RequestException, ValueError) as err:
+                count_event(self.tail_url, "client_error")
+                breaker.record_success()
+                break
+            if count_rec + 1 < policy.attempts:
+                count_event(self.tail_url, "retry")
+                # после 429 повтор не раньше паузы планировщика, как и в get_data_async
+                time.sleep(max(policy.backoff(count_rec), quota_scheduler.paused_until - time.monotonic()))
+
+    async def get_data_async(self, query_dict: dict, not_debug: bool = True,
+                             priority: int = PRIORITY_INTERACTIVE) -> None:
+        """
+        Асинхронный вариант get_data. Запрос отправляется через общую keep-alive сессию http_pool,
+        поэтому ожидание ответа Hotels.com не останавливает event loop бота.
+        Каждая попытка ждет разрешения планировщика quota_scheduler, который может отбросить
+        запрос с низким приоритетом, если заканчивается лимит запросов.
+        Повторы с экспоненциальной паузой, раздельные таймауты соединения и чтения и размыкатель цепи
+        настраиваются политикой для каждого типа запросов.
+        :param query_dict: Входящие специфические для каждого запроса параметры
+        :param not_debug: использовать/нет экономию запросов к hotels.com
+        :param priority: приоритет запроса для планировщика
+        :return: None
+        """
+        policy = policy_for(self.tail_url)
+        breaker = breaker_for(self.tail_url)
+        timeout = aiohttp.ClientTimeout(sock_connect=policy.connect_timeout, sock_read=policy.read_timeout)
+        data_par = {'headers': self.headers, self.query_name: query_dict, 'timeout': timeout}
+        session = await http_pool.get_session()
+        self.status = False
+        self.json_encoders = None
+        self.error = None
+        for count_rec in range(policy.attempts):
+            if not breaker.allow():
+                count_event(self.tail_url, "short_circuit")
+                not_debug or print(f"Цепь разомкнута, запрос не отправлен: {self.tail_url} {breaker}")
+                break
+            if not await quota_scheduler.acquire(priority):
+                not_debug or print(f"Запрос отброшен планировщиком: {quota_scheduler}")
+                break
+            try:
+                async with session.request(self.method, self.url, **data_par) as response:
+                    quota_scheduler.update_from_headers(response.headers)
+                    if response.status == 429 or response.status >= 500:
+                        count_event(self.tail_url, f"http_{response.status}")
+                        if response.status == 429:
+                            quota_scheduler.too_many_requests(response.headers)
+                        elif breaker.record_failure():
+                            count_event(self.tail_url, "breaker_open")
+                    else:
+                        response.raise_for_status()
+                        self.set_limits(response.headers)
+
+                        not_debug or print(f"Данные получены по запросу.\n{self.get_requests_limit_balance()}.")
+
+                        self.json_encoders = await response.json(content_type=None)
+                        self.status = True
+                        breaker.record_success()
+                        break
+            except asyncio.TimeoutError as err:
+                count_event(self.tail_url, "timeout")
+                if breaker.record_failure():
+                    count_event(self.tail_url, "breaker_open")
+            except aiohttp.ClientResponseError as err:
+                # сервер ответил, значит он доступен, ошибка в самом запросе
+                count_event(self.tail_url, "client_error")
+                breaker.record_success()
+                self.error = f"http_{err.status}"
+                break
+            except aiohttp.ClientError as err:
+                count_event(self.tail_url, "connection_error")
+                if breaker.record_failure():
+                    count_event(self.tail_url, "breaker_open")
+            except ValueError as err:
+                count_event(self.tail_url, "bad_json")
+                breaker.record_success()
                 self.json_encoders = None
                 break
-            time.sleep(random.randint(1, 3))
+            if count_rec + 1 < policy.attempts:
+                count_event(self.tail_url, "retry")
+                await asyncio.sleep(policy.backoff(count_rec))
 
     def read_json_file(self, file_name: str = "") -> bool:
         """
-        Читает данные из указанного файла в атрибут json_encoders
+        Читает данные из указанного файла в атрибут json_encoders.
+        Если есть сжатый вариант файла (.gz, .zst), то читается он.
         :param file_name:
         :return: True если файл прочитан
         """
         if file_name:
-            file_name = file_name.strip().lower()
+            file_name = file_name.strip()
             try:
-                with open(file_name, 'r', encoding='utf-8') as file_in:
-                    self.json_encoders = json.loads(file_in.read())
-                    self.status = True if self.json_encoders else False
-                    return self.status
-            except OSError as err:
+                created, raw = read_file(file_name)
+                if raw is None:
+                    raise FileNotFoundError(file_name)
+                self.json_encoders = json.loads(raw)
+                self.status = True if self.json_encoders else False
+                return self.status
+            except (OSError, ValueError) as err:
                 print(f">read_json_fil: файл {file_name} не найден.\n{err}")
         return False
 
     def write_json_file(self, file_name: str = "") -> bool:
         """
-            Записывает данные в указанный файл из атрибута json_encoders
+            Записывает данные в указанный файл из атрибута json_encoders.
+            Файл сжимается методом CACHE_COMPRESSION.
             :param file_name:
             :return: True если файл записан
         """
-        if file_name:
+        if file_name and self.json_encoders:
             try:
-                with open(file_name, "w", encoding='utf-8') as file_out:
-                    if self.json_encoders:
-                        json.dump(self.json_encoders, file_out, ensure_ascii=False)
-                        self.status = True if self.json_encoders else False
-                        return self.status
+                write_file(file_name, json.dumps(self.json_encoders, ensure_ascii=False).encode("utf-8"))
+                self.status = True
+                return self.status
             except OSError as err:
                 print(f">>write_json_file: файл {file_name} записать не удалось.\n{err}")
         return False
@@ -139,15 +260,16 @@ class SiteApi(BaseModel):
     def get_smart_data(self, query_dict: dict = None, data_file: str = "", not_debug: bool = True) -> None:
         """
         Для уменьшения количества обращений к серверу, данные берутся из файла, который создается при каждом запросе.
-        Если файл с данными существует, то данные читаются из него, если файла еще нет,
-        то отправляется запрос к серверу и полученные данные записываются в файл для дальнейшего использования.
+        Если файл с данными существует и еще свежий (CACHE_TTL для этого типа запросов), то данные читаются из него,
+        если файла еще нет или он устарел, то отправляется запрос к серверу
+        и полученные данные записываются в файл для дальнейшего использования.
 
         :param query_dict:
         :param data_file:
         :param not_debug:
         :return:
         """
-        if data_file and os.path.exists(data_file):
+        if data_file and file_freshness(data_file, self.endpoint) == FRESH:
             self.read_json_file(data_file)
             not_debug or print(f"Данные прочитаны их файла.")
         else:
@@ -157,6 +279,183 @@ class SiteApi(BaseModel):
                 if self.status and data_file:
                     self.write_json_file(data_file)
 
+    async def get_smart_data_async(self, query_dict: dict = None, data_file: str = "", not_debug: bool = True,
+                                   priority: int = PRIORITY_INTERACTIVE) -> None:
+        """
+        Асинхронный вариант get_smart_data.
+        Если файл с данными существует и еще свежий, то данные читаются из него, иначе запрос к серверу
+        отправляется через get_data_async и ответ записывается в файл.
+
+        :param query_dict:
+        :param data_file:
+        :param not_debug:
+        :param priority: приоритет запроса для планировщика
+        :return:
+        """
+        if data_file and file_freshness(data_file, self.endpoint) == FRESH:
+            self.read_json_file(data_file)
+            not_debug or print(f"Данные прочитаны их файла.")
+        else:
+            if query_dict:
+                await self.get_data_async(query_dict, not_debug=not_debug, priority=priority)
+                if self.status and data_file:
+                    self.write_json_file(data_file)
+
+
+async def fetch_json_async(request: ApiRequest, data_file: str = "", not_debug: bool = True,
+                           priority: int = PRIORITY_INTERACTIVE) -> Tuple[bool, Any]:
+    """
+    Получает ответ Hotels.com на запрос request.
+    Если указан файл data_file, то ответ ищется в кэше response_cache: сначала в памяти, потом в файле.
+    Свежий ответ отдается сразу. Устаревший, но еще в пределах CACHE_STALE_GRACE, тоже отдается сразу,
+    а новый ответ запрашивается в фоне с приоритетом PRIORITY_PREFETCH.
+    Одинаковые запросы, пришедшие одновременно от разных пользователей, объединяются single_flight
+    по ключу request.key: к серверу уходит один запрос, остальные ждут его ответ.
+    Полученный ответ общий для всех ожидающих, изменять его нельзя.
+    :param request: неизменяемый запрос
+    :param data_file: имя файла для записи/чтения ответа
+    :param not_debug: Вывод в консоль отладочных сообщений
+    :param priority: приоритет запроса для планировщика quota_scheduler
+    :return: кортеж (статус ответа, ответ в json формате)
+    """
+    if data_file:
+        if response_cache.get_negative(request.key, request.endpoint):
+            not_debug or print(f"Отрицательный ответ прочитан из кэша. {response_cache.negative_stats()}")
+            return False, None
+        created, json_data = await response_cache.get_async(request.key, data_file)
+        state = freshness(created, request.endpoint)
+        if state == FRESH:
+            not_debug or print(f"Данные прочитаны из кэша. {response_cache}")
+            return True, json_data
+        if state == STALE:
+            not_debug or print(f"Данные прочитаны из устаревшего кэша, обновляются в фоне.")
+            refresh_in_background(request, data_file)
+            return True, json_data
+
+    result = await single_flight.do(request.key, lambda: download_json_async(request, data_file, not_debug, priority))
+    not_debug or print(f"Объединение запросов: {single_flight}")
+    return result
+
+
+async def download_json_async(request: ApiRequest, data_file: str = "", not_debug: bool = True,
+                              priority: int = PRIORITY_INTERACTIVE) -> Tuple[bool, Any]:
+    """
+    Отправляет запрос request на сервер и, если указан файл data_file, запоминает ответ в кэше response_cache.
+    Ошибку в самом запросе (например, ответ 400) запоминает как отрицательный ответ на NEGATIVE_CACHE_TTL.
+    :return: кортеж (статус ответа, ответ в json формате)
+    """
+    site_api = SiteApi(**request.url)
+    await site_api.get_data_async(request.query, not_debug=not_debug, priority=priority)
+    if site_api.status and data_file:
+        await response_cache.put_async(request.key, data_file, site_api.json_encoders, request.endpoint)
+    elif site_api.error:
+        response_cache.put_negative(request.key, request.endpoint, site_api.error)
+    return site_api.status, site_api.json_encoders
+
+
+async def fetch_parsed_async(request: ApiRequest, parse: Callable[[Any], Any], parser_version: int,
+                             data_file: str = "", not_debug: bool = True,
+                             priority: int = PRIORITY_INTERACTIVE) -> Any:
+    """
+    Получает разобранный ответ Hotels.com на запрос request.
+    Если указан файл data_file и установлен CACHE_PARSED, то в кэше хранится результат разбора parse(),
+    а не полный ответ сервера, поэтому повторный запрос не разбирает заново сотни килобайт json.
+    Ключ результата разбора содержит parser_version, поэтому после изменения разбора
+    старые результаты не используются. Полный ответ хранится в кэше, только если установлен CACHE_RAW.
+    Результат общий для всех, изменять его нельзя.
+    :param request: неизменяемый запрос
+    :param parse: функция разбора ответа сервера
+    :param parser_version: версия функции разбора
+    :param data_file: имя файла для записи/чтения полного ответа
+    :param not_debug: Вывод в консоль отладочных сообщений
+    :param priority: приоритет запроса для планировщика quota_scheduler
+    :return: результат разбора или None
+    """
+    if not (data_file and CACHE_PARSED):
+        status, json_data = await fetch_json_async(request, data_file, not_debug=not_debug, priority=priority)
+        if not status:
+            return None
+        return remember_empty(request, parse(json_data)) if data_file else parse(json_data)
+
+    if response_cache.get_negative(request.key, request.endpoint):
+        not_debug or print(f"Отрицательный ответ прочитан из кэша. {response_cache.negative_stats()}")
+        return None
+    parsed_key = f"{request.key}.parsed-v{parser_version}"
+    parsed_file = data_file.replace(".json", f".parsed-v{parser_version}.json")
+    created, parsed = await response_cache.get_async(parsed_key, parsed_file)
+    state = freshness(created, request.endpoint)
+    if state == FRESH:
+        not_debug or print(f"Разобранные данные прочитаны из кэша. {response_cache}")
+        return parsed
+    if state == STALE and not single_flight.in_flight(parsed_key):
+        task = asyncio.ensure_future(single_flight.do(
+            parsed_key,
+            lambda: parse_json_async(request, parse, parsed_key, parsed_file, data_file, PRIORITY_PREFETCH)
+        ))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    if state == STALE:
+        return parsed
+    return await single_flight.do(
+        parsed_key, lambda: parse_json_async(request, parse, parsed_key, parsed_file, data_file, priority, not_debug)
+    )
+
+
+async def parse_json_async(request: ApiRequest, parse: Callable[[Any], Any], parsed_key: str, parsed_file: str,
+                           data_file: str, priority: int = PRIORITY_INTERACTIVE, not_debug: bool = True) -> Any:
+    """
+    Берет полный ответ из кэша, если он свежий, иначе запрашивает его у сервера.
+    Разбирает ответ и запоминает результат разбора в кэше с временем создания полного ответа.
+    Пустой результат разбора запоминается как отрицательный ответ (remember_empty).
+    :return: результат разбора или None
+    """
+    raw_file = data_file if CACHE_RAW else ""
+    created, json_data = await response_cache.get_async(request.key, raw_file) if raw_file else (None, None)
+    if freshness(created, request.endpoint) == FRESH:
+        status = True
+    else:
+        created = None
+        status, json_data = await single_flight.do(
+            request.key, lambda: download_json_async(request, raw_file, not_debug, priority)
+        )
+    if not status:
+        return None
+    parsed = remember_empty(request, parse(json_data))
+    if parsed:
+        await response_cache.put_async(parsed_key, parsed_file, parsed, request.endpoint, created)
+    return parsed
+
+
+def remember_empty(request: ApiRequest, parsed: Any) -> Any:
+    """
+    Единое место, где пустой результат разбора считается отрицательным ответом "empty" на NEGATIVE_CACHE_TTL.
+    Его вызывают оба пути fetch_parsed_async: с кэшем результатов разбора и с кэшем полных ответов,
+    поэтому пустой ответ не запрашивается повторно при любом значении CACHE_PARSED.
+    :return: parsed без изменений
+    """
+    if not parsed:
+        response_cache.put_negative(request.key, request.endpoint, "empty")
+    return parsed
+
+
+""" фоновые задачи обновления кэша, ссылки хранятся, чтобы задачи не удалил сборщик мусора """
+background_tasks: set = set()
+
+
+def refresh_in_background(request: ApiRequest, data_file: str) -> None:
+    """
+    Запускает фоновое обновление устаревшего ответа в кэше.
+    Повторный вызов, пока обновление еще выполняется, нового запроса не создает.
+    """
+    if single_flight.in_flight(request.key):
+        return None
+    task = asyncio.ensure_future(
+        single_flight.do(request.key, lambda: download_json_async(request, data_file, priority=PRIORITY_PREFETCH))
+    )
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return None
+
 
 if __name__ == '__main__':
     # устанавливаем название региона
@@ -2,6 +2,8 @@ import asyncio
 
 from bot.define_bot import bot, dp
 from bot.settings_bot import set_main_menu, register_all_handlers
+from bot.price_watcher import price_watch_loop
+from api_service import http_pool, response_cache
 
 
 async def main():
@@ -10,15 +12,21 @@ async def main():
     Основная функция для запуска бота.
     Вызывается set_main_menu() для создания основного меню бота.
     Регистрируются хэндлеры register_all_handlers()
+    Запускаем в фоне проверку цен подписок price_watch_loop()
     Запускаем бота start_polling()
+    При остановке закрываем общий пул соединений к Hotels.com http_pool и дисковый кэш ответов response_cache.
     """
     await set_main_menu(dp)
     register_all_handlers(dp)
+    watcher = asyncio.ensure_future(price_watch_loop())
     try:
         print('Бот запустился.')
         await dp.start_polling()
 
     finally:
+        watcher.cancel()
+        await http_pool.close()
+        response_cache.close()
         await bot.close()
 
 
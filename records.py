@@ -0,0 +1,121 @@
+from collections import namedtuple
+from typing import Any, List, Union
+
+
+class RecordMixin:
+    """
+    Компактная неизменяемая запись на основе кортежа (namedtuple), без словаря на каждый объект.
+    Поддерживает чтение полей как у словаря: record['price'], record.get('price'),
+    поэтому используется везде, где раньше был словарь отеля, региона или подробностей отеля.
+    json сохраняет запись как список значений в порядке _fields, load() восстанавливает ее
+    из списка или из словаря старого формата.
+    Записи неизменяемые, поэтому общие списки из кэша можно отдавать без копирования,
+    а изменение поля создает новую запись: record._replace(price=...).
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        return tuple.__getitem__(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._fields
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        """ Значения полей неизменяемые (строки, числа, кортежи), поэтому копия не нужна """
+        return self
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """ Значение поля или default, если поля нет или оно не задано """
+        value = getattr(self, key, None) if key in self._fields else None
+        return default if value is None else value
+
+    def keys(self) -> tuple:
+        return self._fields
+
+    def to_dict(self) -> dict:
+        return dict(zip(self._fields, self))
+
+    @classmethod
+    def load(cls, value: Union[tuple, list, dict, None]):
+        """
+        Восстанавливает запись из любой сохраненной формы: записи, списка значений
+        или словаря, как в старых записях истории и кэша.
+        """
+        if value is None or isinstance(value, cls):
+            return value
+        if isinstance(value, dict):
+            return cls(**{x: y for x, y in value.items() if x in cls._fields})
+        return cls(*value)
+
+
+def record_type(name: str, fields: tuple, doc: str) -> type:
+    """ Создает тип записи с полями fields, незаданные поля равны None """
+    base = namedtuple(name, fields, defaults=(None,) * len(fields))
+    return type(name, (RecordMixin, base), {"__slots__": (), "__doc__": doc})
+
+
+Hotel = record_type(
+    "Hotel", ('id', 'name', 'dist', 'unit', 'price', 'currency', 'image', 'bestdeal', 'region_id',
+             'stars', 'score'),
+    "Отель из списка предложений offer_json_parse"
+)
+Region = record_type(
+    "Region", ('id', 'type', 'a3_code', 'country_name', 'name'),
+    "Регион из списка place_json_parse"
+)
+HotelSummary = record_type(
+    "HotelSummary", ('id', 'name', 'address', 'country', 'location', 'stars', 'map_url'),
+    "Подробности отеля из summary_json_parse, без списка фотографий"
+)
+
+
+def from_rows(record_class: type, rows: Union[List[Any], None]) -> Union[List[tuple], None]:
+    """ Список записей из списка значений, прочитанного из кэша или json """
+    return None if rows is None else [record_class.load(x) for x in rows]
+
+
+if __name__ == '__main__':
+    """
+    Сравнение словарей и записей: память сессии с 10 отелями, копия данных сессии и запись истории в json.
+    python records.py
+    """
+    import json
+    import timeit
+    import tracemalloc
+    from copy import deepcopy
+
+    def hotel_dict(number: int) -> dict:
+        return {'id': str(1000000 + number), 'name': f"Hotel number {number}", 'dist': 1.5 + number,
+                'unit': "KILOMETER", 'price': 100.0 + number, 'currency': "USD",
+                'image': f"https://images.example/{number}.jpg", 'bestdeal': 2.5 + number}
+
+    def session(make_hotel, make_region, make_summary) -> dict:
+        hotels = [make_hotel(hotel_dict(x)) for x in range(10)]
+        return {
+            'region_info': make_region({'id': "2452", 'type': "CITY", 'a3_code': "DEU",
+                                        'country_name': "Germany", 'name': "Munich, Bavaria, Germany"}),
+            'dates': ["15/02/2027", "22/02/2027"], 'adults': 2, 'children': [5, 7],
+            'hotels_list': hotels, 'hotel': hotels[3],
+            'hotel_info': make_summary({'id': "1000003", 'name': "Hotel number 3", 'address': "Street 1",
+                                        'country': "DE", 'location': (48.1, 11.5), 'stars': 4.0,
+                                        'map_url': "https://maps.example/3.png"}),
+        }
+
+    for title, makers in (("словари", (dict, dict, dict)), ("записи", (Hotel.load, Region.load, HotelSummary.load))):
+        tracemalloc.start()
+        sessions = [session(*makers) for _ in range(1000)]
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        history = {x: y for x, y in sessions[0].items() if x != 'hotels_list'}
+        dumps = timeit.timeit(lambda: json.dumps(history), number=20000) / 20000
+        copies = timeit.timeit(lambda: deepcopy(sessions[0]), number=2000) / 2000
+        print(f"{title}: 1000 сессий {memory / 1024:.0f} КБ, строка истории {len(json.dumps(history))} байт, "
+              f"json.dumps истории {dumps * 1e6:.1f} мкс, deepcopy сессии {copies * 1e6:.1f} мкс")
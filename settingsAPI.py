@@ -1,6 +1,9 @@
-from typing import Union, List
+from typing import Union, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+from copy import deepcopy
+import hashlib
+import json
 import re
 import os
 
@@ -21,6 +24,18 @@ def create_file_name(*args, relative_position: str = ".") -> Union[str, None]:
     return None
 
 
+def cache_file_name(request: "ApiRequest", relative_position: str = ".") -> str:
+    """
+    Создает имя файла для ответа на запрос из хэша всех нормализованных параметров запроса:
+    региона, дат, количества и возраста гостей, размера выдачи и т.д.
+    Разные параметры дают разные файлы, поэтому прочитанный из файла ответ всегда соответствует запросу.
+    :param request: неизменяемый запрос
+    :param relative_position: папка назначения
+    :return: имя файла
+    """
+    return os.path.join(relative_position, "json_data", f"{request.endpoint}_{request.key}.json")
+
+
 def str_clearing(src_data: str = None) -> Union[str, None]:
     """ Удаляет из строки повторяющиеся пробелы """
     alfa = re.compile(r"\s+")
@@ -87,6 +102,14 @@ summary_dict = {
 }
 
 
+""" короткие имена типов запросов по окончанию url """
+ENDPOINT_NAMES = {
+    place_dict["url"]["tail_url"]: "place",
+    offer_dict["url"]["tail_url"]: "offer",
+    summary_dict["url"]["tail_url"]: "summary",
+}
+
+
 class HotelsAPIsetup(BaseModel):
     """
     Класс для хранения настроек запросов к API Hotels.com.
@@ -112,9 +135,9 @@ class HotelsAPIsetup(BaseModel):
     """
     hotels_api_key = HOTELS_API_KEY
     host_api: str = "hotels4.p.rapidapi.com"
-    place: UnitRequest = UnitRequest.parse_obj(place_dict)
-    offer: UnitRequest = UnitRequest.parse_obj(offer_dict)
-    summary: UnitRequest = UnitRequest.parse_obj(summary_dict)
+    place: UnitRequest = UnitRequest.parse_obj(deepcopy(place_dict))
+    offer: UnitRequest = UnitRequest.parse_obj(deepcopy(offer_dict))
+    summary: UnitRequest = UnitRequest.parse_obj(deepcopy(summary_dict))
 
     def get_headers(self) -> dict:
         """ Формирует словарь для headers """
@@ -127,10 +150,7 @@ class HotelsAPIsetup(BaseModel):
 
     def set_results_size(self, size: int = 5) -> None:
         """ Записывает в словарь запроса списка отелей элемент "resultsSize" """
-        if 0 < size < MAX_RESULT_SIZE:
-            self.offer.query["resultsSize"] = size
-        else:
-            self.offer.query["resultsSize"] = MAX_RESULT_SIZE
+        self.offer.query["resultsSize"] = results_size_value(size)
 
     def set_target_place(self, target_place: str) -> None:
         """ Записывает в словарь запроса поиска региона название региона """
@@ -138,52 +158,151 @@ class HotelsAPIsetup(BaseModel):
 
     def set_target_destination(self, target_region_id: str = "") -> None:
         """ Записывает в словарь запроса списка отелей id требуемого региона """
-        target_region_id = str_no_space(target_region_id)
-        if target_region_id and target_region_id.isdigit():
-            self.offer.query["destination"]["regionId"] = target_region_id
-        else:
-            self.offer.query["destination"]["regionId"] = ""
+        self.offer.query["destination"]["regionId"] = digits_id_value(target_region_id)
 
     def set_dates(self, checkin_date: str = "", checkout_date: str = "") -> None:
         """ Записывает в словарь запроса списка отелей дату заезда и выезда """
-        if not checkin_date.strip() or not checkout_date.strip():
-            return None
-        else:
-            try:
-                checkin = datetime.strptime(checkin_date, "%d/%m/%Y").date()
-                checkout = datetime.strptime(checkout_date, "%d/%m/%Y").date()
-                self.offer.query["checkInDate"]["day"] = checkin.day
-                self.offer.query["checkInDate"]["month"] = checkin.month
-                self.offer.query["checkInDate"]["year"] = checkin.year
-                self.offer.query["checkOutDate"]["day"] = checkout.day
-                self.offer.query["checkOutDate"]["month"] = checkout.month
-                self.offer.query["checkOutDate"]["year"] = checkout.year
-            except Exception as err:
-                print(err)
+        dates = dates_value(checkin_date, checkout_date)
+        if dates:
+            self.offer.query["checkInDate"].update(dates[0])
+            self.offer.query["checkOutDate"].update(dates[1])
         return None
 
     def set_guests_numbers(self, adults: int = 1, children: Union[List[int], None] = None) -> None:
         """ Записывает в словарь запроса списка отелей количество взрослых жильцов и список возрастов детей """
-        if 0 < adults < MAX_ADULTS:
-            self.offer.query["rooms"][0]["adults"] = adults
-        else:
-            self.offer.query["rooms"][0]["adults"] = 1
-
-        if children:
-            self.offer.query["rooms"][0]["children"] = [
-                                                           {"age": x} for x in children
-                                                           if isinstance(x, int) and MIN_AGE_CHILD < x < MAX_AGE_CHILD
-                                                       ][:MAX_CHILDREN]
-        else:
-            self.offer.query["rooms"][0]["children"] = []
+        self.offer.query["rooms"][0].update(room_value(adults, children))
 
     def set_property_id(self, property_id: str = "") -> None:
         """ Записывает в словарь запроса получения информации об отеле id этого отеля """
-        property_id = str_no_space(property_id)
-        if property_id and property_id.isdigit():
-            self.summary.query["propertyId"] = str_no_space(property_id)
-        else:
-            self.summary.query["propertyId"] = ""
+        self.summary.query["propertyId"] = digits_id_value(property_id)
+
+
+def results_size_value(size: int = 5) -> int:
+    """ Возвращает допустимое значение "resultsSize" для запроса списка отелей """
+    if 0 < size < MAX_RESULT_SIZE:
+        return size
+    return MAX_RESULT_SIZE
+
+
+def digits_id_value(src_id: str = "") -> str:
+    """ Возвращает id региона или отеля без пробелов, если он состоит только из цифр, иначе пустую строку """
+    src_id = str_no_space(src_id) if src_id else None
+    if src_id and src_id.isdigit():
+        return src_id
+    return ""
+
+
+def dates_value(checkin_date: str = "", checkout_date: str = "") -> Union[tuple, None]:
+    """
+    Преобразует строки дат заезда и выезда в словари для запроса списка отелей.
+    :return: кортеж из двух словарей {"day", "month", "year"} или None если даты некорректные
+    """
+    if not checkin_date.strip() or not checkout_date.strip():
+        return None
+    try:
+        checkin = datetime.strptime(checkin_date, "%d/%m/%Y").date()
+        checkout = datetime.strptime(checkout_date, "%d/%m/%Y").date()
+    except Exception as err:
+        print(err)
+        return None
+    return ({"day": checkin.day, "month": checkin.month, "year": checkin.year},
+            {"day": checkout.day, "month": checkout.month, "year": checkout.year})
+
+
+def room_value(adults: int = 1, children: Union[List[int], None] = None) -> dict:
+    """ Возвращает словарь комнаты с количеством взрослых жильцов и списком возрастов детей """
+    room = {"adults": adults if 0 < adults < MAX_ADULTS else 1}
+    if children:
+        room["children"] = [
+                               {"age": x} for x in children
+                               if isinstance(x, int) and MIN_AGE_CHILD < x < MAX_AGE_CHILD
+                           ][:MAX_CHILDREN]
+    else:
+        room["children"] = []
+    return room
+
+
+class ApiRequest(BaseModel):
+    """
+    Неизменяемый запрос к API Hotels.com.
+    Создается заново для каждого обращения к серверу функциями build_..._request,
+    поэтому параллельные запросы разных пользователей не делят между собой общие словари.
+    tail_url, method, content_type, query_name: параметры url запроса для SiteApi
+    payload: параметры запроса, сериализованные в json с отсортированными ключами
+    """
+    tail_url: str
+    method: str
+    content_type: Optional[str] = None
+    query_name: str
+    payload: str
+
+    class Config:
+        frozen = True
+
+    @property
+    def url(self) -> dict:
+        """ Словарь для создания экземпляра SiteApi """
+        return {"tail_url": self.tail_url, "method": self.method,
+                "content_type": self.content_type, "query_name": self.query_name}
+
+    @property
+    def query(self) -> dict:
+        """ Новая копия словаря параметров запроса """
+        return json.loads(self.payload)
+
+    @property
+    def endpoint(self) -> str:
+        """ Короткое имя типа запроса: place, offer или summary """
+        return ENDPOINT_NAMES.get(self.tail_url, self.tail_url.strip("/").replace("/", "_"))
+
+    @property
+    def key(self) -> str:
+        """ Ключ, одинаковый для всех запросов с одинаковыми параметрами """
+        return hashlib.sha1(f"{self.method} {self.tail_url} {self.payload}".encode("utf-8")).hexdigest()
+
+
+def make_request(template: dict, query: dict) -> ApiRequest:
+    """
+    Создает неизменяемый запрос из шаблона place_dict, offer_dict или summary_dict
+    :param template: шаблон запроса
+    :param query: заполненный словарь параметров запроса
+    :return: запрос
+    """
+    payload = json.dumps(query, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return ApiRequest(**template["url"], payload=payload)
+
+
+def build_place_request(target_place: str) -> ApiRequest:
+    """ Создает запрос поиска региона по названию """
+    query = deepcopy(place_dict["query"])
+    query["q"] = target_place
+    return make_request(place_dict, query)
+
+
+def build_offer_request(region_id: str, in_date: str, out_date: str,
+                        adults: int = 1, children: Union[List[int], None] = None,
+                        results_size: int = 5, start_index: int = 0) -> ApiRequest:
+    """
+    Создает запрос списка отелей в регионе на указанные даты для указанных жильцов.
+    Возрасты детей сортируются, чтобы одинаковый состав гостей давал одинаковый запрос.
+    start_index - номер первого отеля в выдаче сервера, у каждой страницы выдачи свой ключ запроса.
+    """
+    query = deepcopy(offer_dict["query"])
+    query["destination"]["regionId"] = digits_id_value(region_id)
+    dates = dates_value(in_date, out_date)
+    if dates:
+        query["checkInDate"], query["checkOutDate"] = dates
+    query["rooms"] = [room_value(adults, sorted(children) if children else None)]
+    query["resultsSize"] = results_size_value(results_size)
+    query["resultsStartingIndex"] = max(0, int(start_index))
+    return make_request(offer_dict, query)
+
+
+def build_summary_request(property_id: str) -> ApiRequest:
+    """ Создает запрос подробной информации об отеле """
+    query = deepcopy(summary_dict["query"])
+    query["propertyId"] = digits_id_value(property_id)
+    return make_request(summary_dict, query)
 
 
 # создаем экземпляр класса с настройками для всех запросов
@@ -209,3 +328,9 @@ if __name__ == '__main__':
     set.set_property_id("1383519")
     print(f"summary.query = {set.summary.query}")
     print(f"summary.urly =\t{set.summary.url}")
+
+    request = build_offer_request("2205", "15/02/2023", "22/02/2023", adults=2, children=[2, 7], results_size=10)
+    print(f"request.url =\t{request.url}")
+    print(f"request.query =\t{request.query}")
+    print(f"request.key =\t{request.key}")
+    print(f"cache file =\t{cache_file_name(request)}")
@@ -1,6 +1,11 @@
 
 NAME = 'site_api_package'
 
-from .place import get_places_list, show_places
-from .hotels import get_hotels_list, show_hotels, sort_hotel_list
-from .summary import get_summary_list, show_summary, show_images_list
+from records import Hotel, Region, HotelSummary, from_rows
+from .ranking import rank_hotels, rank_scores
+from .region_index import RegionIndex, region_index, normalize_name
+from .place import get_places_list, get_places_list_async, show_places
+from .hotels import get_hotels_list, get_hotels_list_async, show_hotels, sort_hotel_list, sort_orders
+from .hotels import get_hotels_multi_async, merge_hotel_lists, get_price_grid_async, shift_dates
+from .summary import get_summary_list, get_summary_list_async, show_summary, show_images_list
+from .offer_filter import build_filter_index, filter_hotels, filtered_order, unknown_stars
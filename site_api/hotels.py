@@ -1,8 +1,30 @@
-from settingsAPI import api_setting, str_no_space, create_file_name
-from init_site_api import SiteApi
+from settingsAPI import build_offer_request, str_no_space, create_file_name, cache_file_name
+from init_site_api import SiteApi, fetch_parsed_async
+from api_service import response_cache
+from records import Hotel, from_rows
+from site_api.ranking import rank_hotels
+from constants import PRIORITY_INTERACTIVE
 
-from typing import Any, Union, List
-from constants import MAX_RESULT_SIZE
+import asyncio
+from datetime import datetime, date, timedelta
+from typing import Any, Callable, Dict, Union, List, Tuple
+from constants import SORT_LIST, RANK_WEIGHTS, MAX_RESULT_SIZE, MULTI_REGION_CONCURRENCY, FLEX_DAYS, FLEX_CONCURRENCY
+
+""" версия разбора ответа, при изменении offer_json_parse увеличить, чтобы не использовать старый кэш """
+PARSER_VERSION = 2
+
+
+""" ключи сортировки списка отелей для методов SORT_LIST """
+SORT_KEYS = {
+    "lowprice": lambda x: x['price'],
+    "highprice": lambda x: -x['price'],
+    "bestdeal": lambda x: x['bestdeal'],
+}
+
+
+def sort_key(methods: str = "lowprice") -> Callable[[Any], Any]:
+    """ Ключ сортировки для указанного метода, для неизвестного метода - цена, затем расстояние """
+    return SORT_KEYS.get(methods, lambda x: (x['price'], x['dist']))
 
 
 def sort_hotel_list(src: list, methods: str = "lowprice") -> None:
@@ -13,23 +35,44 @@ def sort_hotel_list(src: list, methods: str = "lowprice") -> None:
     по интегральному показателю минимальное расстояние от цента + минимальная цена
     :return: None
     """
-    if methods == "lowprice":
-        sort_func = lambda x: x['price']
-    elif methods == "highprice":
-        sort_func = lambda x: -x['price']
-    elif methods == "bestdeal":
-        sort_func = lambda x: x['bestdeal']
-    else:
-        sort_func = lambda x: (x['price'], x['dist'])
-    src.sort(key=sort_func, reverse=False)
+    src.sort(key=sort_key(methods), reverse=False)
+
+
+def sort_orders(hotels: Union[List, None], methods: Tuple[str, ...] = SORT_LIST) -> Dict[str, Tuple[int, ...]]:
+    """
+    Вычисляет один раз порядок отелей для каждого метода сортировки.
+    Сам список не меняется, поэтому смена сортировки в меню - это выбор готового порядка,
+    а отель с номером n в меню - hotels[orders[method][n - 1]].
+    :param hotels: Список отелей
+    :param methods: Методы сортировки
+    :return: {метод сортировки: кортеж индексов отелей в порядке сортировки}
+    """
+    hotels = hotels or []
+    return {
+        method_i: tuple(sorted(range(len(hotels)), key=lambda i, key=sort_key(method_i): key(hotels[i])))
+        for method_i in methods
+    }
+
+
+def set_bestdeal(hotels: List[dict], weights: Tuple[float, ...] = RANK_WEIGHTS) -> None:
+    """
+    Вычисляет для каждого отеля значение 'bestdeal' - взвешенную сумму цены, расстояния от центра,
+    звезд и оценки гостей, приведенных к шкале 0..1 внутри списка (site_api.ranking).
+    Записи отелей неизменяемые, поэтому в списке они заменяются новыми.
+    :param hotels: Список отелей, изменяется на месте
+    :param weights: Веса показателей RANK_FACTORS
+    :return: None
+    """
+    if hotels:
+        hotels[:] = rank_hotels(hotels, weights)
 
 
 def offer_json_parse(json_link: Any, sort_method: str = "lowprice") -> Union[List, None]:
     """
         Создает список отелей отсортированный в соответствии с указанным методом.
         Разбирает ответ сервера Hotels.com
-        Для каждого отеля создается значение 'bestdeal в котором вычисляется показатель -
-        минимальное расстояние от цента + минимальная цена.
+        Для каждого отеля создается значение 'bestdeal в котором вычисляется показатель
+        по цене, расстоянию от центра, звездам и оценке гостей с весами RANK_WEIGHTS.
         :param json_link: Ссылка данные об отелях полученные из запроса к серверу в json формате
         :param sort_method: Метод сортировки
         :return: Список отелей
@@ -43,20 +86,21 @@ def offer_json_parse(json_link: Any, sort_method: str = "lowprice") -> Union[Lis
                 price = hotel_i.get('price').get('lead', None) if hotel_i.get('price', None) else None
                 currency_info = hotel_i.get('price').get('lead').get('currencyInfo', None) if hotel_i.get('price', None) and hotel_i.get('price').get('lead', None) else None
                 hotel_image = hotel_i.get('propertyImage').get('image', None) if hotel_i.get('propertyImage', None) else None
+                reviews = hotel_i.get('reviews', None) or {}
 
-                hotels_offer.append({
-                    'id': hotel_i.get('id', ''),
-                    'name': hotel_i.get('name', ''),
-                    'dist': distance.get('value', 0) if distance else 0,
-                    'unit': distance.get('unit', '') if distance else '',
-                    'price': price.get('amount', 0) if price else 0,
-                    'currency': currency_info.get('code', '') if currency_info else '',
-                    'image': hotel_image. get('url', '') if hotel_image else ''
-                })
+                hotels_offer.append(Hotel(
+                    id=hotel_i.get('id', ''),
+                    name=hotel_i.get('name', ''),
+                    dist=distance.get('value', 0) if distance else 0,
+                    unit=distance.get('unit', '') if distance else '',
+                    price=price.get('amount', 0) if price else 0,
+                    currency=currency_info.get('code', '') if currency_info else '',
+                    image=hotel_image. get('url', '') if hotel_image else '',
+                    stars=hotel_i.get('star', None),
+                    score=reviews.get('score', None) if reviews.get('total', None) else None
+                ))
             if hotels_offer:
-                min_price = min(hotels_offer, key=lambda x: x['price'])['price']
-                min_dist = min(hotels_offer, key=lambda x: x['dist'])['dist']
-                [x.update({'bestdeal': round(abs(x['price'] - min_price) + abs(x['dist'] - min_dist), 2)}) for x in hotels_offer]
+                set_bestdeal(hotels_offer)
                 sort_hotel_list(hotels_offer, sort_method)
                 return hotels_offer
     return None
@@ -66,7 +110,8 @@ def offer_json_parse(json_link: Any, sort_method: str = "lowprice") -> Union[Lis
 def get_hotels_list(region_id: str, in_date: str, out_date: str,
                     adults: int, children: List[int], results_size: int = 5,
                     sort_method: str = "lowprice",
-                    file_name: str = "", not_debug: bool = True) -> Union[List, None]:
+                    file_name: str = "", not_debug: bool = True, use_cache: bool = False,
+                    start_index: int = 0) -> Union[List, None]:
     """
     Формирует запрос на сервер Hotels.com для получения предложения отелей, посылает его на сервер.
     Полученный ответ разбирает на список отелей.
@@ -80,6 +125,9 @@ def get_hotels_list(region_id: str, in_date: str, out_date: str,
     :param file_name:   Имя файла в который записываем ответ сервера или читаем
                         в него если такой файл уже записан
     :param not_debug:   Вывод в консоль отладочных сообщений
+    :param use_cache:   Если имя файла не указано, то ответ сервера пишется/читается в файл,
+                        имя которого вычисляется из всех параметров запроса
+    :param start_index: Номер первого отеля в выдаче сервера, для следующих страниц выдачи
     :return:            Список отелей
     """
     offers = None
@@ -87,21 +135,150 @@ def get_hotels_list(region_id: str, in_date: str, out_date: str,
     if not region_id or not region_id.isdigit():
         return None
     else:
-        api_setting.set_target_destination(region_id)
-        api_setting.set_dates(in_date, out_date)
-        if len(children) > 0:
-            api_setting.set_guests_numbers(adults, children)
-        else:
-            api_setting.set_guests_numbers(adults)
-        api_setting.set_results_size(results_size)
-
-        offer = SiteApi(**api_setting.offer.url)
-        offer.get_smart_data(api_setting.offer.query, file_name, not_debug=not_debug)
+        request = build_offer_request(region_id, in_date, out_date, adults, children, results_size, start_index)
+        if use_cache and not file_name:
+            file_name = cache_file_name(request)
+        offer = SiteApi(**request.url)
+        offer.get_smart_data(request.query, file_name, not_debug=not_debug)
         if offer.status:
             offers = offer_json_parse(offer.json_encoders, sort_method)
     return offers
 
 
+async def get_hotels_list_async(region_id: str, in_date: str, out_date: str,
+                                adults: int, children: List[int], results_size: int = 5,
+                                sort_method: str = "lowprice",
+                                file_name: str = "", not_debug: bool = True,
+                                priority: int = PRIORITY_INTERACTIVE, use_cache: bool = False,
+                                start_index: int = 0) -> Union[List, None]:
+    """
+    Асинхронный вариант get_hotels_list, не блокирует event loop бота на время запроса.
+    Параметры те же, что и у get_hotels_list.
+    :param priority:    Приоритет запроса для планировщика запросов
+    :return:            Список отелей, пустой список, если у сервера нет отелей,
+                        или None, если ответ получить не удалось
+    """
+    offers = None
+    region_id = str_no_space(region_id)
+    if not region_id or not region_id.isdigit():
+        return None
+    else:
+        request = build_offer_request(region_id, in_date, out_date, adults, children, results_size, start_index)
+        if use_cache and not file_name:
+            file_name = cache_file_name(request)
+        hotels = await fetch_parsed_async(
+            request, offer_json_parse, PARSER_VERSION, file_name, not_debug=not_debug, priority=priority
+        )
+        if hotels:
+            offers = from_rows(Hotel, hotels)
+            sort_hotel_list(offers, sort_method)
+        elif response_cache.is_empty(request.key, request.endpoint):
+            offers = []
+    return offers
+
+
+def merge_hotel_lists(hotels_lists: List[Union[List, None]], sort_method: str = "lowprice",
+                      regions_id: List[str] = None) -> Union[List, None]:
+    """
+    Объединяет списки отелей нескольких регионов в один список без повторов по id отеля.
+    Записи отелей неизменяемые, поэтому общие списки из кэша не изменяются.
+    Значение 'bestdeal' вычисляется заново по всему объединенному списку.
+    :param hotels_lists: Списки отелей регионов
+    :param sort_method: Метод сортировки
+    :param regions_id: id регионов списков, если указаны, то каждому отелю добавляется 'region_id'
+    :return: Объединенный список отелей, пустой список, если все регионы ответили без отелей,
+             или None, если отелей нет и ответ хотя бы одного региона получить не удалось
+    """
+    merged = {}
+    for index, hotels in enumerate(hotels_lists):
+        for hotel_i in hotels or []:
+            if hotel_i.id not in merged:
+                merged[hotel_i.id] = hotel_i._replace(region_id=regions_id[index]) if regions_id else hotel_i
+    if not merged:
+        return None if any(x is None for x in hotels_lists) else []
+    offers = list(merged.values())
+    set_bestdeal(offers)
+    sort_hotel_list(offers, sort_method)
+    return offers
+
+
+async def get_hotels_multi_async(regions_id: List[str], in_date: str, out_date: str,
+                                 adults: int, children: List[int], results_size: int = 5,
+                                 sort_method: str = "lowprice", not_debug: bool = True,
+                                 priority: int = PRIORITY_INTERACTIVE, use_cache: bool = False,
+                                 concurrency: int = MULTI_REGION_CONCURRENCY,
+                                 start_index: int = 0) -> Union[List, None]:
+    """
+    Ищет отели сразу в нескольких регионах. Запросы по регионам выполняются одновременно,
+    но не больше concurrency, поэтому общее время близко ко времени самого медленного региона.
+    Результаты объединяются merge_hotel_lists. Остальные параметры те же, что и у get_hotels_list_async.
+    :param regions_id: Список id регионов
+    :param concurrency: Сколько регионов запрашивается одновременно
+    :return: Объединенный список отелей
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def region_offers(region_id: str) -> Union[List, None]:
+        async with semaphore:
+            return await get_hotels_list_async(
+                region_id, in_date, out_date, adults, children, results_size, sort_method,
+                not_debug=not_debug, priority=priority, use_cache=use_cache, start_index=start_index
+            )
+
+    regions_id = list(dict.fromkeys(regions_id))
+    hotels_lists = await asyncio.gather(*[region_offers(x) for x in regions_id])
+    return merge_hotel_lists(hotels_lists, sort_method, regions_id)
+
+
+def shift_dates(in_date: str, out_date: str, shift: int) -> Tuple[str, str]:
+    """
+    Сдвигает даты заезда и выезда на shift дней, количество ночей не меняется.
+    :param in_date: Дата заезда в формате dd/mm/YYYY
+    :param out_date: Дата выезда в формате dd/mm/YYYY
+    :param shift: На сколько дней сдвинуть, отрицательное значение - раньше
+    :return: Кортеж сдвинутых дат в том же формате
+    """
+    return tuple(
+        (datetime.strptime(x, "%d/%m/%Y") + timedelta(days=shift)).strftime("%d/%m/%Y") for x in (in_date, out_date)
+    )
+
+
+async def get_price_grid_async(regions_id: List[str], in_date: str, out_date: str,
+                               adults: int, children: List[int], results_size: int = 5,
+                               days: int = FLEX_DAYS, not_debug: bool = True,
+                               priority: int = PRIORITY_INTERACTIVE, use_cache: bool = False,
+                               concurrency: int = FLEX_CONCURRENCY) -> List[dict]:
+    """
+    Сетка цен для гибких дат: ищет отели для дат заезда, сдвинутых на -days..+days дней,
+    с тем же количеством ночей. Варианты запрашиваются одновременно, но не больше concurrency,
+    каждый вариант проходит через кэш и планировщик запросов, как обычный поиск.
+    Даты заезда в прошлом пропускаются.
+    :param regions_id: Список id регионов
+    :param days: На сколько дней сдвигать дату заезда в каждую сторону
+    :param concurrency: Сколько вариантов дат запрашивается одновременно
+    :return: Список вариантов по возрастанию даты заезда:
+             {'shift', 'in_date', 'out_date', 'price', 'currency', 'name'} самого дешевого отеля,
+             'price' равна None, если отелей не найдено
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    today = date.today()
+    variants = [shift_dates(in_date, out_date, x) + (x,) for x in range(-days, days + 1)]
+    variants = [x for x in variants if datetime.strptime(x[0], "%d/%m/%Y").date() >= today]
+
+    async def cheapest(shifted_in: str, shifted_out: str, shift: int) -> dict:
+        async with semaphore:
+            hotels = await get_hotels_multi_async(
+                regions_id, shifted_in, shifted_out, adults, children, results_size, "lowprice",
+                not_debug=not_debug, priority=priority, use_cache=use_cache
+            )
+        hotels = [x for x in hotels or [] if x['price']]
+        best = hotels[0] if hotels else {}
+        return {'shift': shift, 'in_date': shifted_in, 'out_date': shifted_out,
+                'price': best.get('price', None), 'currency': best.get('currency', ''), 'name': best.get('name', '')}
+
+    return list(await asyncio.gather(*[cheapest(*x) for x in variants]))
+
+
 def show_hotels(hotels: list = None) -> None:
     """
         Выводит в консоль список отелей
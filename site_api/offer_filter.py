@@ -0,0 +1,109 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Sequence, Set, Tuple, Union
+
+from site_api.hotels import sort_key
+from site_api.ranking import distance_km
+
+""" показатели фильтра: цена и расстояние в километрах - не больше, звезды - не меньше """
+FILTER_FACTORS = ("price", "dist", "stars")
+""" значение в индексе звезд для отеля, у которого звезды неизвестны: условие 'не меньше звезд' его не отсекает """
+UNKNOWN_STARS = float("inf")
+
+
+def build_filter_index(hotels: Union[List, None]) -> Dict[str, Tuple[tuple, tuple]]:
+    """
+    Строит для каждого показателя FILTER_FACTORS отсортированный индекс: значения по возрастанию
+    и номера отелей в том же порядке. Звезды известны не у всех отелей, отели без звезд входят в индекс
+    со значением UNKNOWN_STARS, поэтому фильтр по звездам их не убирает, а не оставляет пустое меню.
+    Индекс строится один раз для списка отелей, после этого каждое условие фильтра - поиск диапазона bisect.
+    :param hotels: Список отелей
+    :return: {показатель: (значения по возрастанию, номера отелей в списке)}
+    """
+    columns = {
+        "price": lambda x: x.price,
+        "dist": lambda x: distance_km(x.dist, x.unit),
+        "stars": lambda x: UNKNOWN_STARS if x.stars is None else x.stars,
+    }
+    index = {}
+    for factor_i in FILTER_FACTORS:
+        pairs = sorted((float(y), x) for x, y in enumerate(map(columns[factor_i], hotels or [])) if y is not None)
+        index[factor_i] = (tuple(x[0] for x in pairs), tuple(x[1] for x in pairs))
+    return index
+
+
+def unknown_stars(index: Dict[str, Tuple[tuple, tuple]]) -> int:
+    """ Количество отелей в индексе, у которых звезды неизвестны """
+    values = index["stars"][0]
+    return len(values) - bisect_left(values, UNKNOWN_STARS)
+
+
+def range_lookup(column_index: Tuple[tuple, tuple], low: float = None, high: float = None) -> tuple:
+    """
+    Номера отелей, у которых значение показателя в диапазоне low <= значение <= high.
+    :param column_index: Индекс показателя из build_filter_index
+    :param low: Нижняя граница, если не указана, то без ограничения
+    :param high: Верхняя граница, если не указана, то без ограничения
+    """
+    values, hotels_id = column_index
+    start = 0 if low is None else bisect_left(values, low)
+    end = len(values) if high is None else bisect_right(values, high)
+    return hotels_id[start:end]
+
+
+def filter_hotels(index: Dict[str, Tuple[tuple, tuple]], criteria: Dict[str, float]) -> Union[Set[int], None]:
+    """
+    Номера отелей, подходящих под все условия фильтра.
+    Условия проверяются поиском диапазона в индексе, результаты пересекаются начиная с самого короткого.
+    :param index: Индекс из build_filter_index
+    :param criteria: Условия {'price': не дороже, 'dist': не дальше км, 'stars': не меньше звезд}
+    :return: Множество номеров отелей или None, если условий нет
+    """
+    ranges = []
+    for factor_i, value_i in (criteria or {}).items():
+        if factor_i == "stars":
+            ranges.append(range_lookup(index[factor_i], low=value_i))
+        elif factor_i in FILTER_FACTORS:
+            ranges.append(range_lookup(index[factor_i], high=value_i))
+    if not ranges:
+        return None
+    ranges.sort(key=len)
+    found = set(ranges[0])
+    for range_i in ranges[1:]:
+        found.intersection_update(range_i)
+    return found
+
+
+def filtered_order(hotels: List, found: Set[int], sort_method: str, blocks: Sequence[int] = (0,)) -> Tuple[int, ...]:
+    """
+    Порядок подходящих под фильтр отелей для метода сортировки.
+    Сортируются только найденные отели, при равных значениях порядок тот же, что у sort_orders.
+    Если список отелей собран из нескольких страниц выдачи, то отели сортируются внутри своей страницы,
+    а страницы идут по порядку, поэтому дозагруженная страница не меняет номера уже показанных отелей.
+    :param blocks: Номера первых отелей каждой страницы выдачи в списке, по возрастанию
+    """
+    key = sort_key(sort_method)
+    return tuple(sorted(sorted(found), key=lambda i: (bisect_right(blocks, i), key(hotels[i]))))
+
+
+if __name__ == '__main__':
+    """
+    Сравнение поиска по индексу с полным просмотром списка.
+    python -m site_api.offer_filter
+    """
+    import random
+    import timeit
+    from records import Hotel
+
+    hotels_list = [
+        Hotel(id=str(x), name=f"Hotel {x}", dist=random.uniform(0, 10), unit="KILOMETER",
+              price=random.uniform(30, 500), currency="USD", stars=random.choice((None, 2.0, 3.0, 4.0, 5.0)))
+        for x in range(300)
+    ]
+    filter_index = build_filter_index(hotels_list)
+    condition = {"price": 120, "dist": 3, "stars": 4}
+    scan = lambda: {i for i, x in enumerate(hotels_list)
+                    if x.price <= 120 and x.dist <= 3 and (x.stars is None or x.stars >= 4)}
+    assert filter_hotels(filter_index, condition) == scan()
+    print(f"индекс 300 отелей: {timeit.timeit(lambda: build_filter_index(hotels_list), number=200) / 200 * 1e6:.0f} мкс")
+    print(f"фильтр по индексу: {timeit.timeit(lambda: filter_hotels(filter_index, condition), number=2000) / 2000 * 1e6:.1f} мкс")
+    print(f"полный просмотр: {timeit.timeit(scan, number=2000) / 2000 * 1e6:.1f} мкс")
@@ -1,11 +1,17 @@
 from typing import Union
-from settingsAPI import api_setting, str_clearing, create_file_name
-from init_site_api import SiteApi
+from settingsAPI import build_place_request, str_clearing, create_file_name, cache_file_name
+from init_site_api import SiteApi, fetch_parsed_async
+from site_api.region_index import region_index
+from records import Region, from_rows
+from constants import PRIORITY_INTERACTIVE
 
 from typing import Any
 
 from constants import REGION_TYPE_FILTER
 
+""" версия разбора ответа, при изменении place_json_parse увеличить, чтобы не использовать старый кэш """
+PARSER_VERSION = 1
+
 
 def place_json_parse(json_link: Any) -> Union[list, None]:
     """
@@ -19,18 +25,19 @@ def place_json_parse(json_link: Any) -> Union[list, None]:
         places = []
         success = json_link.get('rc', False)
         if success and success == "OK":
-            places = [{
-                'id': x.get('gaiaId', ""),
-                'type': x.get('type', ""),
-                'a3_code': x['hierarchyInfo']['country']['isoCode3'],
-                'country_name': x['hierarchyInfo']['country']['name'],
-                'name': x['regionNames']['fullName']
-            } for x in json_link['sr'] if x.get('gaiaId', False) and x.get('type', "") in REGION_TYPE_FILTER]
+            places = [Region(
+                id=x.get('gaiaId', ""),
+                type=x.get('type', ""),
+                a3_code=x['hierarchyInfo']['country']['isoCode3'],
+                country_name=x['hierarchyInfo']['country']['name'],
+                name=x['regionNames']['fullName']
+            ) for x in json_link['sr'] if x.get('gaiaId', False) and x.get('type', "") in REGION_TYPE_FILTER]
         return places
     return None
 
 
-def get_places_list(target_place: str = "", file_name: str = "", not_debug: bool = True) -> Union[list, None]:
+def get_places_list(target_place: str = "", file_name: str = "", not_debug: bool = True,
+                    use_cache: bool = False) -> Union[list, None]:
     """
     Формирует запрос на сервер Hotels.com для получения доступных регионов, посылает его на сервер.
     Полученный ответ разбирает на список регионов.
@@ -38,6 +45,8 @@ def get_places_list(target_place: str = "", file_name: str = "", not_debug: bool
     :param file_name: имя файла, в который запишется ответ
                       или данные прочитаются из этого файла если ранее такой запрос уже был.
     :param not_debug: Вывод в консоль отладочных сообщений.
+    :param use_cache: Если имя файла не указано, то ответ пишется/читается в файл,
+                      имя которого вычисляется из всех параметров запроса.
     :return: Список регионов.
     """
     places_out = None
@@ -45,12 +54,47 @@ def get_places_list(target_place: str = "", file_name: str = "", not_debug: bool
     if not target_place:
         return None
     else:
-        api_setting.set_target_place(target_place)
-        place = SiteApi(**api_setting.place.url)
+        request = build_place_request(target_place)
+        if use_cache and not file_name:
+            file_name = cache_file_name(request)
+        place = SiteApi(**request.url)
 
-        place.get_smart_data(api_setting.place.query, file_name, not_debug=not_debug)
+        place.get_smart_data(request.query, file_name, not_debug=not_debug)
         if place.status and place.json_encoders.get('rc', False) == 'OK':
             places_out = place_json_parse(place.json_encoders)
+            region_index.add(target_place, places_out)
+    return places_out
+
+
+async def get_places_list_async(target_place: str = "", file_name: str = "",
+                                not_debug: bool = True, priority: int = PRIORITY_INTERACTIVE,
+                                use_cache: bool = False) -> Union[list, None]:
+    """
+    Асинхронный вариант get_places_list, не блокирует event loop бота на время запроса.
+    Найденные регионы добавляются в локальный индекс region_index.
+    :param target_place: Название искомого региона
+    :param file_name: имя файла, в который запишется ответ
+                      или данные прочитаются из этого файла если ранее такой запрос уже был.
+    :param not_debug: Вывод в консоль отладочных сообщений.
+    :param priority: Приоритет запроса для планировщика запросов.
+    :param use_cache: Если имя файла не указано, то ответ пишется/читается в файл,
+                      имя которого вычисляется из всех параметров запроса.
+    :return: Список регионов.
+    """
+    places_out = None
+    target_place = str_clearing(target_place)
+    if not target_place:
+        return None
+    else:
+        request = build_place_request(target_place)
+        if use_cache and not file_name:
+            file_name = cache_file_name(request)
+        places = await fetch_parsed_async(
+            request, place_json_parse, PARSER_VERSION, file_name, not_debug=not_debug, priority=priority
+        )
+        if places:
+            places_out = from_rows(Region, places)
+            region_index.add(target_place, places_out)
     return places_out
 
 
@@ -0,0 +1,176 @@
+import difflib
+import json
+import os
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Union
+
+from records import Region
+from constants import REGION_INDEX_FILE, REGION_INDEX_MIN_PREFIX, REGION_INDEX_FUZZY_CUTOFF, REGION_INDEX_LIMIT
+
+""" транслитерация кириллицы, чтобы 'мюнхен' и 'myunkhen' попадали в один ключ """
+CYRILLIC_TRANSLIT = dict(zip(
+    "абвгдеёжзийклмнопрстуфхцчшщъыьэюя",
+    ["a", "b", "v", "g", "d", "e", "e", "zh", "z", "i", "y", "k", "l", "m", "n", "o", "p", "r", "s", "t", "u",
+     "f", "kh", "ts", "ch", "sh", "shch", "", "y", "", "e", "yu", "ya"]
+))
+
+
+def normalize_name(src: str) -> str:
+    """
+    Нормализует название региона: нижний регистр, без диакритики (münchen -> munchen),
+    кириллица транслитерируется, знаки препинания и повторяющиеся пробелы удаляются.
+    """
+    src = unicodedata.normalize("NFKD", src.lower())
+    src = "".join(CYRILLIC_TRANSLIT.get(x, x) for x in src if not unicodedata.combining(x))
+    return " ".join("".join(x if x.isalnum() else " " for x in src).split())
+
+
+class RegionIndex:
+    """
+    Локальный индекс известных регионов, собранный из всех ответов place_json_parse.
+    Хранит ответы на уже введенные названия, нормализованные названия регионов и их id,
+    по ним ищет точное совпадение, совпадение начала (префиксное дерево) и похожие названия (difflib).
+    Ответ сервера дополняет индекс, каждое дополнение дописывается строкой в файл file_name (jsonl),
+    поэтому после перезапуска индекс восстанавливается чтением файла без запросов к серверу.
+    Найденные списки регионов общие для всех, изменять их нельзя.
+    """
+
+    def __init__(self, file_name: str = REGION_INDEX_FILE):
+        self.file_name = file_name
+        self.regions: Dict[str, Region] = {}  # id региона: регион
+        self.order: Dict[str, int] = {}  # id региона: порядковый номер добавления
+        self.answers: Dict[str, List[str]] = {}  # нормализованное название: id регионов ответа сервера
+        self.trie: dict = {}  # префиксное дерево, в ключе "" множество id регионов
+        self.popularity: Counter = Counter()  # сколько раз регион был в ответах
+        self.hits: Counter = Counter()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self.regions)
+
+    def __str__(self):
+        """ Строковое представление класса """
+        return f"индекс регионов: {len(self.regions)} регионов, {len(self.answers)} названий, {dict(self.hits)}"
+
+    def load(self) -> None:
+        """ Восстанавливает индекс из файла, строки с ошибками пропускаются """
+        self.loaded = True
+        if not os.path.exists(self.file_name):
+            return
+        with open(self.file_name, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                    self._add(record["query"], record["regions"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+    def _insert(self, key: str, region_id: str) -> None:
+        """ Добавляет ключ в префиксное дерево """
+        node = self.trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node.setdefault("", set()).add(region_id)
+
+    def _add(self, query: str, regions: List[dict]) -> None:
+        """ Добавляет в индекс ответ сервера regions на название query """
+        query = normalize_name(query)
+        if not query:
+            return
+        regions = [Region.load(x) for x in regions]
+        self.answers[query] = [x['id'] for x in regions]
+        for region in regions:
+            self.regions[region['id']] = region
+            self.order.setdefault(region['id'], len(self.order))
+            self.popularity[region['id']] += 1
+            self._insert(query, region['id'])
+            name = normalize_name(region['name'])
+            self._insert(name, region['id'])
+            # город без области и страны: "munich, bavaria, germany" -> "munich"
+            self._insert(normalize_name(region['name'].split(",")[0]), region['id'])
+
+    def add(self, query: str, regions: List[dict]) -> None:
+        """
+        Добавляет в индекс ответ сервера на название query и дописывает его в файл.
+        :param query: введенное название региона
+        :param regions: список регионов из place_json_parse
+        """
+        if not self.loaded:
+            self.load()
+        if not regions or self.answers.get(normalize_name(query)) == [x['id'] for x in regions]:
+            return
+        self._add(query, regions)
+        with open(self.file_name, "a", encoding="utf-8") as file:
+            file.write(json.dumps({"query": query, "regions": regions}, ensure_ascii=False) + "\n")
+
+    def _prefix(self, key: str) -> List[str]:
+        """
+        id регионов, ключи которых начинаются с key.
+        Первыми идут регионы с ключом равным key, затем самые популярные, затем добавленные раньше.
+        """
+        node = self.trie
+        for char in key:
+            node = node.get(char, None)
+            if node is None:
+                return []
+        exact = node.get("", set())
+        found, stack = set(), [node]
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char:
+                    stack.append(child)
+                else:
+                    found.update(child)
+        return sorted(found, key=lambda x: (x not in exact, -self.popularity[x], self.order[x]))
+
+    def lookup(self, query: str) -> Union[List[Region], None]:
+        """
+        Ищет ответ сервера на то же название. Только такой ответ заменяет запрос к серверу.
+        :param query: введенное название региона
+        :return: список регионов или None, если нужен запрос к серверу
+        """
+        if not self.loaded:
+            self.load()
+        region_ids = self.answers.get(normalize_name(query), None)
+        self.hits["exact" if region_ids else "miss"] += 1
+        if not region_ids:
+            return None
+        return [self.regions[x] for x in region_ids[:REGION_INDEX_LIMIT]]
+
+    def suggest(self, query: str) -> List[Region]:
+        """
+        Подсказки для названия, на которое ответа сервера еще нет: регионы, названия которых
+        начинаются с query (не короче REGION_INDEX_MIN_PREFIX), иначе похожие названия
+        с коэффициентом не ниже REGION_INDEX_FUZZY_CUTOFF.
+        Подсказки не заменяют запрос к серверу: 'bari' начинает 'bariloche', но сервер найдет и сам Bari.
+        :param query: введенное название региона
+        :return: список регионов, возможно пустой
+        """
+        if not self.loaded:
+            self.load()
+        key = normalize_name(query)
+        if not key:
+            return []
+        region_ids, kind = [], "miss"
+        if len(key) >= REGION_INDEX_MIN_PREFIX:
+            region_ids, kind = self._prefix(key), "prefix"
+        if not region_ids:
+            close = difflib.get_close_matches(key, self.answers.keys(), n=1, cutoff=REGION_INDEX_FUZZY_CUTOFF)
+            region_ids, kind = (self.answers[close[0]], "fuzzy") if close else ([], "miss")
+        if region_ids:
+            self.hits[kind] += 1
+        return [self.regions[x] for x in region_ids[:REGION_INDEX_LIMIT]]
+
+
+""" общий индекс регионов """
+region_index = RegionIndex()
+
+
+if __name__ == '__main__':
+    print("-- Region index --")
+    index = RegionIndex(os.path.join("..", REGION_INDEX_FILE))
+    for name in ["munchen", "мюнхен", "munc", "munhen"]:
+        print(name, index.lookup(name), index.suggest(name))
+    print(index)
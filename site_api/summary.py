@@ -1,12 +1,17 @@
-from settingsAPI import api_setting, str_no_space, create_file_name
+from settingsAPI import build_summary_request, str_no_space, create_file_name, cache_file_name
 from constants import MAX_IMAGE_SIZE
-from init_site_api import SiteApi
+from init_site_api import SiteApi, fetch_parsed_async
+from records import HotelSummary
+from constants import PRIORITY_INTERACTIVE
 from requests import request
 from typing import Any
 import os
 from PIL import Image
 from typing import Union, List
 
+""" версия разбора ответа, при изменении summary_json_parse увеличить, чтобы не использовать старый кэш """
+PARSER_VERSION = 1
+
 
 def summary_json_parse(json_link: Any) -> Union[List, None]:
     """
@@ -17,29 +22,32 @@ def summary_json_parse(json_link: Any) -> Union[List, None]:
         :return: Список подробностей отеля
     """
     if json_link and json_link.get('data').get('propertyInfo').get('summary'):
-        summary = [{}, []]
         info = json_link['data']['propertyInfo']['summary']
         coordinates = info['location']['coordinates']
-        summary[0] = {"id": info['id'],
-                           "name": info['name'],
-                           "address": info['location']['address']['addressLine'],
-                           "country": info['location']['address']['countryCode'],
-                           "location": (coordinates['latitude'], coordinates['longitude']),
-                           }
         stars = info.get('overview').get('propertyRating')
-        summary[0]["stars"] = stars.get('rating', None) if stars else None
 
         images = json_link['data']['propertyInfo']['propertyGallery']['images']
-        summary[1] = [image_i['image']['url'] for image_i in images][:MAX_IMAGE_SIZE]
 
         location = json_link['data']['propertyInfo']['summary'].get('location', None)
         map_url = location.get('staticImage', None) if location else None
-        summary[0]['map_url'] = map_url.get('url', None) if map_url else None
+        summary = [
+            HotelSummary(
+                id=info['id'],
+                name=info['name'],
+                address=info['location']['address']['addressLine'],
+                country=info['location']['address']['countryCode'],
+                location=(coordinates['latitude'], coordinates['longitude']),
+                stars=stars.get('rating', None) if stars else None,
+                map_url=map_url.get('url', None) if map_url else None
+            ),
+            [image_i['image']['url'] for image_i in images][:MAX_IMAGE_SIZE]
+        ]
         return summary
     return None
 
 
-def get_summary_list(look_hotel_id: str = "", file_name: str = "", not_debug: bool = True) -> Union[List, None]:
+def get_summary_list(look_hotel_id: str = "", file_name: str = "", not_debug: bool = True,
+                     use_cache: bool = False) -> Union[List, None]:
     """
         Формирует запрос на сервер Hotels.com для получения информации об отеле.
         Полученный ответ разбирает на список с нужными данными.
@@ -47,6 +55,8 @@ def get_summary_list(look_hotel_id: str = "", file_name: str = "", not_debug: bo
         :param file_name: имя файла, в который запишется ответ
                           или данные прочитаются из этого файла если ранее такой запрос уже был.
         :param not_debug: Вывод в консоль отладочных сообщений.
+        :param use_cache: Если имя файла не указано, то ответ пишется/читается в файл,
+                          имя которого вычисляется из всех параметров запроса.
         :return: Список регионов.
     """
     summary_out = None
@@ -54,14 +64,46 @@ def get_summary_list(look_hotel_id: str = "", file_name: str = "", not_debug: bo
     if not look_hotel_id or not look_hotel_id.isdigit():
         return None
     else:
-        api_setting.set_property_id(property_id=look_hotel_id)
-        summary = SiteApi(**api_setting.summary.url)
-        summary.get_smart_data(api_setting.summary.query, file_name, not_debug=not_debug)
+        request = build_summary_request(look_hotel_id)
+        if use_cache and not file_name:
+            file_name = cache_file_name(request)
+        summary = SiteApi(**request.url)
+        summary.get_smart_data(request.query, file_name, not_debug=not_debug)
         if summary.status:
             summary_out = summary_json_parse(summary.json_encoders)
     return summary_out
 
 
+async def get_summary_list_async(look_hotel_id: str = "", file_name: str = "",
+                                 not_debug: bool = True, priority: int = PRIORITY_INTERACTIVE,
+                                 use_cache: bool = False) -> Union[List, None]:
+    """
+        Асинхронный вариант get_summary_list, не блокирует event loop бота на время запроса.
+        :param look_hotel_id: Id отеля
+        :param file_name: имя файла, в который запишется ответ
+                          или данные прочитаются из этого файла если ранее такой запрос уже был.
+        :param not_debug: Вывод в консоль отладочных сообщений.
+        :param priority: Приоритет запроса для планировщика запросов.
+        :param use_cache: Если имя файла не указано, то ответ пишется/читается в файл,
+                          имя которого вычисляется из всех параметров запроса.
+        :return: Список подробностей отеля.
+    """
+    summary_out = None
+    look_hotel_id = str_no_space(look_hotel_id)
+    if not look_hotel_id or not look_hotel_id.isdigit():
+        return None
+    else:
+        request = build_summary_request(look_hotel_id)
+        if use_cache and not file_name:
+            file_name = cache_file_name(request)
+        summary = await fetch_parsed_async(
+            request, summary_json_parse, PARSER_VERSION, file_name, not_debug=not_debug, priority=priority
+        )
+        if summary:
+            summary_out = [HotelSummary.load(summary[0]), list(summary[1])]
+    return summary_out
+
+
 def show_image_file(link_file: str) -> None:
     """ Показывает изображение по ссылке """
     img = Image.open(link_file)
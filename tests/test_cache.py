@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+import zlib
+
+import pytest
+
+import init_site_api
+from api_service.cache import FRESH, STALE, EXPIRED, MISSING, FileTier, MemoryTier, ResponseCache, freshness
+from api_service.sqlite_store import SqliteTier
+from constants import CACHE_TTL, CACHE_STALE_GRACE, NEGATIVE_CACHE_TTL, CACHE_DB_BUSY_TIMEOUT, CACHE_DB_TOUCH_INTERVAL
+from settingsAPI import build_offer_request
+
+
+def test_freshness_ttl_and_stale_grace():
+    now = time.time()
+    ttl, grace = CACHE_TTL["offer"], CACHE_STALE_GRACE["offer"]
+    assert freshness(None, "offer", now) == MISSING
+    assert freshness(now - ttl + 1, "offer", now) == FRESH
+    assert freshness(now - ttl - 1, "offer", now) == (STALE if grace else EXPIRED)
+    assert freshness(now - ttl - grace - 1, "offer", now) == EXPIRED
+
+
+def test_memory_tier_evicts_least_recently_used():
+    tier = MemoryTier(max_bytes=40)
+    tier.put("a", "a", size=10)
+    tier.put("b", "b", size=10)
+    tier.put("c", "c", size=10)
+    tier.get("a")
+    tier.put("d", "d", size=10)
+    tier.put("e", "e", size=10)
+    assert tier.get("b") == (None, None)
+    assert tier.get("a")[1] == "a"
+    assert tier.size <= 40 and tier.evictions == 1
+
+
+def test_memory_tier_skips_oversized_value():
+    tier = MemoryTier(max_bytes=40)
+    assert not tier.put("big", "x", size=11)
+    assert len(tier) == 0
+
+
+def test_response_cache_promotes_disk_answer_to_memory(tmp_path):
+    file_name = str(tmp_path / "offer.json")
+    FileTier().put("key", file_name, "offer", {"hotels": [1, 2]})
+    cache = ResponseCache(memory=MemoryTier(), disk=FileTier())
+    assert cache.get("key", file_name)[1] == {"hotels": [1, 2]}
+    assert cache.get("key", "")[1] == {"hotels": [1, 2]}
+    assert cache.stats()["disk"]["hits"] == 1 and cache.stats()["memory"]["hits"] == 1
+
+
+def test_negative_answer_expires_after_ttl(monkeypatch):
+    cache = ResponseCache(memory=MemoryTier(), disk=FileTier())
+    cache.put_negative("key", "offer", "empty")
+    assert cache.get_negative("key", "offer") == "empty"
+    later = time.time() + NEGATIVE_CACHE_TTL["offer"] + 1
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert cache.get_negative("key", "offer") is None
+
+
+@pytest.mark.parametrize("cache_parsed", [True, False])
+def test_empty_result_is_cached_negatively_on_both_paths(monkeypatch, tmp_path, cache_parsed):
+    cache = ResponseCache(memory=MemoryTier(), disk=FileTier())
+    monkeypatch.setattr(init_site_api, "response_cache", cache)
+    monkeypatch.setattr(init_site_api, "CACHE_PARSED", cache_parsed)
+    downloads = []
+
+    async def download_json_async(request, data_file="", not_debug=True, priority=0):
+        downloads.append(request.key)
+        return True, {"data": {"propertySearch": {"properties": []}}}
+
+    monkeypatch.setattr(init_site_api, "download_json_async", download_json_async)
+    request = build_offer_request("2734", "10/10/2030", "12/10/2030", 2, [], 10)
+    parse = lambda x: x["data"]["propertySearch"]["properties"] or None
+    for _ in range(2):
+        result = asyncio.run(init_site_api.fetch_parsed_async(request, parse, 1, str(tmp_path / "offer.json")))
+        assert result is None
+    assert len(downloads) == 1
+    assert cache.get_negative(request.key, request.endpoint) == "empty"
+
+
+@pytest.fixture
+def sqlite_tier(tmp_path):
+    tier = SqliteTier(str(tmp_path / "cache.db"), max_bytes=10 ** 6)
+    yield tier
+    tier.close()
+
+
+def test_sqlite_tier_keeps_pragmas_on_its_connection(sqlite_tier):
+    sqlite_tier.put("key", "", "offer", {"hotels": [1]})
+    assert sqlite_tier.connect.execute("PRAGMA synchronous;").fetchone()[0] == 1
+    assert sqlite_tier.connect.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    assert sqlite_tier.connect.execute("PRAGMA busy_timeout;").fetchone()[0] == CACHE_DB_BUSY_TIMEOUT
+
+
+def test_sqlite_tier_reads_do_not_write(sqlite_tier):
+    sqlite_tier.put("key", "", "offer", {"hotels": [1]})
+    changes = sqlite_tier.connect.total_changes
+    for _ in range(10):
+        assert sqlite_tier.get("key")[1] == {"hotels": [1]}
+    assert sqlite_tier.connect.total_changes == changes and sqlite_tier.touch_writes == 0
+    assert sqlite_tier.get("missing") == (None, None, 0)
+
+
+def test_sqlite_tier_batches_access_times_for_eviction(sqlite_tier, monkeypatch):
+    body = {"text": "x" * 1000}
+    for key in ("old", "read", "new"):
+        sqlite_tier.put(key, "", "offer", body)
+    later = time.time() + CACHE_DB_TOUCH_INTERVAL + 1
+    monkeypatch.setattr(time, "time", lambda: later)
+    sqlite_tier.get("read")
+    sqlite_tier.get("read")
+    assert sqlite_tier.touch_writes == 0
+    sqlite_tier.put("newest", "", "offer", body)
+    assert sqlite_tier.touch_writes == 1
+    rows = sqlite_tier.connect.execute("SELECT key FROM responses ORDER BY last_access;").fetchall()
+    assert [x[0] for x in rows][:2] == ["old", "new"]
+    sqlite_tier.max_bytes = 0
+    sqlite_tier.put("last", "", "offer", body)
+    assert sqlite_tier.get("old")[0] is None and sqlite_tier.evictions == 5
+
+
+def test_response_cache_uses_sqlite_off_the_event_loop(sqlite_tier):
+    cache = ResponseCache(memory=MemoryTier(), disk=sqlite_tier)
+    loop_thread = threading.get_ident()
+    threads = []
+    get = sqlite_tier.get
+    sqlite_tier.get = lambda *args: threads.append(threading.get_ident()) or get(*args)
+
+    async def main():
+        await cache.put_async("key", "cache", {"hotels": [1]}, "offer")
+        cache.memory.pop("key")
+        return await cache.get_async("key", "cache")
+
+    assert asyncio.run(main())[1] == {"hotels": [1]}
+    assert threads and loop_thread not in threads
+    assert cache.memory.get("key")[1] == {"hotels": [1]}
+
+
+def test_corrupt_cache_file_is_a_logged_miss(tmp_path, capsys):
+    file_name = str(tmp_path / "offer.json.gz")
+    with open(file_name, "wb") as file:
+        file.write(b"not gzip")
+    tier = FileTier()
+    assert tier.get("key", file_name) == (None, None, 0)
+    assert tier.misses == 1 and file_name in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("body", [b"junk", "junk", zlib.compress(b"{not json")])
+def test_sqlite_tier_drops_corrupt_row(sqlite_tier, body):
+    sqlite_tier.put("key", "", "offer", {"hotels": [1]})
+    with sqlite_tier.connect:
+        sqlite_tier.connect.execute("UPDATE responses SET body = ? WHERE key = ?;", (body, "key"))
+    assert sqlite_tier.get("key") == (None, None, 0)
+    assert sqlite_tier.misses == 1
+    assert sqlite_tier.connect.execute("SELECT COUNT(*) FROM responses;").fetchone()[0] == 0
+    cache = ResponseCache(memory=MemoryTier(), disk=sqlite_tier)
+    assert asyncio.run(cache.get_async("key", "cache")) == (None, None)
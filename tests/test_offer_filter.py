@@ -0,0 +1,79 @@
+import random
+
+from db import HotelsCatalog
+from records import Hotel, HotelSummary
+from site_api import build_filter_index, filter_hotels, filtered_order, sort_orders, unknown_stars
+from site_api.offer_filter import range_lookup
+from site_api.ranking import distance_km
+
+
+def make_hotels(size: int = 200, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    return [
+        Hotel(id=str(x), name=f"Hotel {x}", dist=rnd.uniform(0, 10), unit=rnd.choice(("MILE", "KILOMETER")),
+              price=round(rnd.uniform(30, 500), 2), currency="USD", bestdeal=rnd.random(),
+              stars=rnd.choice((None, 2.0, 3.0, 4.0, 5.0)))
+        for x in range(size)
+    ]
+
+
+def scan(hotels: list, criteria: dict) -> set:
+    return {
+        i for i, x in enumerate(hotels)
+        if x.price <= criteria.get("price", float("inf"))
+        and distance_km(x.dist, x.unit) <= criteria.get("dist", float("inf"))
+        and (x.stars is None or x.stars >= criteria.get("stars", 0))
+    }
+
+
+def test_range_lookup_bounds_are_inclusive():
+    index = build_filter_index([Hotel(id=str(x), name="", dist=0, unit="", price=float(x), currency="")
+                                for x in (10, 20, 20, 30)])
+    assert sorted(range_lookup(index["price"], high=20)) == [0, 1, 2]
+    assert sorted(range_lookup(index["price"], low=20)) == [1, 2, 3]
+    assert range_lookup(index["price"], low=31) == ()
+
+
+def test_filter_matches_full_scan():
+    hotels = make_hotels()
+    index = build_filter_index(hotels)
+    for criteria in ({"price": 120}, {"dist": 3}, {"stars": 4}, {"price": 250, "dist": 5, "stars": 3}):
+        assert filter_hotels(index, criteria) == scan(hotels, criteria)
+    assert filter_hotels(index, {}) is None
+
+
+def test_unknown_stars_are_kept_and_counted():
+    hotels = [Hotel(id=str(x), name="", dist=1, unit="KILOMETER", price=100.0, currency="", stars=None)
+              for x in range(5)]
+    index = build_filter_index(hotels)
+    assert filter_hotels(index, {"stars": 4}) == set(range(5))
+    assert unknown_stars(index) == 5
+    hotels[0] = hotels[0]._replace(stars=5.0)
+    hotels[1] = hotels[1]._replace(stars=2.0)
+    index = build_filter_index(hotels)
+    assert filter_hotels(index, {"stars": 4}) == {0, 2, 3, 4}
+    assert unknown_stars(index) == 3
+
+
+def test_filtered_order_follows_sort_orders():
+    hotels = make_hotels()
+    found = filter_hotels(build_filter_index(hotels), {"price": 300})
+    for sort_method, order in sort_orders(hotels).items():
+        assert filtered_order(hotels, found, sort_method) == tuple(x for x in order if x in found)
+
+
+def test_filtered_order_sorts_inside_page_blocks():
+    hotels = make_hotels(20)
+    found = set(range(20))
+    order = filtered_order(hotels, found, "lowprice", (0, 10))
+    assert set(order[:10]) == set(range(10)) and set(order[10:]) == set(range(10, 20))
+    assert [hotels[x].price for x in order[:10]] == sorted(hotels[x].price for x in range(10))
+
+
+def test_catalog_stars_lookup(tmp_path):
+    catalog = HotelsCatalog(str(tmp_path / "catalog.db"))
+    for hotel_id, stars in (("1", 4.0), ("2", None)):
+        catalog.put_hotel([HotelSummary(id=hotel_id, name="Hotel", address="", country="", location=None,
+                                        stars=stars, map_url=""), []])
+    assert catalog.get_stars(["1", "2", "3"]) == {"1": 4.0}
+    assert catalog.get_stars([]) == {}
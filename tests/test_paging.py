@@ -0,0 +1,159 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import site_api
+from bot.handlers import machine_bot
+from constants import LEXICON, RANK_WEIGHTS
+from records import Hotel
+
+PAGE_SIZE = 10
+
+
+class FakeState:
+    """ Машина состояний с одним словарем данных вместо FSMContext """
+
+    def __init__(self, data: dict):
+        self.data = data
+
+    def proxy(self):
+        data = self.data
+
+        class Proxy:
+            async def __aenter__(self):
+                return data
+
+            async def __aexit__(self, *args):
+                return False
+
+        return Proxy()
+
+
+def make_page(start: int, size: int = PAGE_SIZE, price: float = 100.0) -> list:
+    return [Hotel(id=str(x), name=f"Hotel {x}", dist=1.0, unit="KILOMETER", price=price + x, currency="USD")
+            for x in range(start, start + size)]
+
+
+@pytest.fixture
+def bot_session(monkeypatch):
+    """
+    Сессия меню отелей с загруженной первой страницей выдачи.
+    Ответы сервера на следующие страницы задаются очередью pages[номер страницы], без ответа - пустая страница.
+    """
+    pages = {}
+    requests = []
+
+    async def get_hotels_list_async(**kwargs):
+        requests.append(kwargs['start_index'])
+        answers = pages.get(kwargs['start_index'] // PAGE_SIZE, None)
+        return answers.pop(0) if answers else []
+
+    async def user_result_size(user_id):
+        return PAGE_SIZE
+
+    async def user_rank_weights(user_id):
+        return RANK_WEIGHTS
+
+    async def bot_edit_message(**kwargs):
+        return True
+
+    monkeypatch.setattr(site_api, "get_hotels_list_async", get_hotels_list_async)
+    monkeypatch.setattr(machine_bot, "user_result_size", user_result_size)
+    monkeypatch.setattr(machine_bot, "user_rank_weights", user_rank_weights)
+    monkeypatch.setattr(machine_bot, "bot_edit_message", bot_edit_message)
+    monkeypatch.setattr(machine_bot, "prefetch_hotels_page", lambda user_id, data: None)
+    monkeypatch.setattr(machine_bot, "prefetch_hotel_summaries", lambda user_id, hotels: None)
+    data = {
+        'region_info': {'id': "123"}, 'dates': ["01/01/2030", "05/01/2030"], 'adults': 2, 'children': [],
+        'invitation_message': SimpleNamespace(chat=SimpleNamespace(id=1), message_id=2),
+    }
+    machine_bot.set_hotels_menu(data, site_api.rank_hotels(make_page(0)), PAGE_SIZE, "highprice")
+    return SimpleNamespace(data=data, pages=pages, requests=requests, state=FakeState(data))
+
+
+def press(session, button: str) -> list:
+    answers = []
+
+    async def answer(text=None):
+        answers.append(text)
+
+    callback = SimpleNamespace(data=button, from_user=SimpleNamespace(id=7), answer=answer)
+    asyncio.run(machine_bot.hotels_page_buttons(callback, session.state))
+    return answers
+
+
+def menu_ids(data: dict) -> list:
+    return [x.id for x in machine_bot.page_hotels(data)]
+
+
+def test_loaded_page_does_not_move_shown_hotels(bot_session):
+    bot_session.pages[1] = [make_page(10, price=200.0)]
+    first_page = menu_ids(bot_session.data)
+    press(bot_session, "page next")
+    assert menu_ids(bot_session.data) == [str(x) for x in range(19, 9, -1)]
+    press(bot_session, "page prev")
+    assert menu_ids(bot_session.data) == first_page
+    assert machine_bot.menu_order(bot_session.data)[:PAGE_SIZE] == tuple(range(9, -1, -1))
+
+
+def test_every_sort_keeps_pages_as_blocks(bot_session):
+    bot_session.pages[1] = [make_page(10, price=0.0)]
+    press(bot_session, "page next")
+    for sort_method in ("lowprice", "highprice", "bestdeal"):
+        order = bot_session.data['hotels_orders'][sort_method]
+        assert set(order[:PAGE_SIZE]) == set(range(PAGE_SIZE))
+        assert set(order[PAGE_SIZE:]) == set(range(PAGE_SIZE, 2 * PAGE_SIZE))
+
+
+def test_failed_page_can_be_requested_again(bot_session):
+    bot_session.pages[1] = [None, make_page(10)]
+    assert press(bot_session, "page next") == [LEXICON['page_not_loaded']]
+    assert bot_session.data['menu_page'] == 0
+    assert bot_session.data['pages_loaded'] == 1 and not bot_session.data['pages_done']
+    assert press(bot_session, "page next") == [None]
+    assert bot_session.data['menu_page'] == 1 and len(bot_session.data['hotels_list']) == 2 * PAGE_SIZE
+
+
+def test_empty_page_ends_paging(bot_session):
+    assert press(bot_session, "page next") == [LEXICON['no_more_hotels']]
+    assert bot_session.data['pages_done'] and not machine_bot.has_next_page(bot_session.data)
+    press(bot_session, "page next")
+    assert bot_session.requests == [PAGE_SIZE]
+
+
+def test_filter_keeps_blocks(bot_session):
+    bot_session.pages[1] = [make_page(10, price=0.0)]
+    press(bot_session, "page next")
+    bot_session.data['hotels_filter'] = {'price': 108.0}
+    order = machine_bot.menu_order(bot_session.data)
+    assert order == (8, 7, 6, 5, 4, 3, 2, 1, 0) + tuple(range(19, 9, -1))
+
+
+def test_hotel_list_tells_empty_answer_from_failure(monkeypatch):
+    from api_service import FileTier, MemoryTier, ResponseCache
+    from site_api import hotels
+
+    cache = ResponseCache(memory=MemoryTier(), disk=FileTier())
+    monkeypatch.setattr(hotels, "response_cache", cache)
+
+    async def fetch_parsed_async(request, *args, **kwargs):
+        if request.query["resultsStartingIndex"]:
+            cache.put_negative(request.key, request.endpoint, "empty")
+        return None
+
+    monkeypatch.setattr(hotels, "fetch_parsed_async", fetch_parsed_async)
+    query = dict(region_id="123", in_date="01/01/2030", out_date="05/01/2030", adults=2, children=[])
+    assert asyncio.run(hotels.get_hotels_list_async(**query, start_index=10)) == []
+    assert asyncio.run(hotels.get_hotels_list_async(**query, start_index=0)) is None
+
+
+def test_menu_takes_stars_from_catalog(monkeypatch, tmp_path):
+    from db import HotelsCatalog
+    from records import HotelSummary
+
+    monkeypatch.setattr(HotelsCatalog, "db_name", str(tmp_path / "catalog.db"))
+    HotelsCatalog().put_hotel([HotelSummary(id="3", name="Hotel 3", address="", country="", location=None,
+                                            stars=4.0, map_url=""), []])
+    hotels = machine_bot.add_catalog_stars(make_page(0))
+    assert [x.stars for x in hotels if x.stars is not None] == [4.0] and hotels[3].stars == 4.0
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from api_service import prefetch
+from api_service.prefetch import Prefetcher
+from api_service.scheduler import PriorityTicket, QuotaScheduler, current_priority, request_ticket
+from api_service.single_flight import SingleFlight
+from constants import PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+
+PAUSE = 0.05
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    """ Планировщик, приостановленный на PAUSE секунд: запросы ждут в очереди """
+    quota = QuotaScheduler(rate=1000.0, burst=1)
+    quota.throttle(PAUSE)
+    monkeypatch.setattr(prefetch, "quota_scheduler", quota)
+    return quota
+
+
+def test_promote_moves_ticket_requests_ahead(scheduler):
+    order = []
+
+    async def request(name: str, ticket: PriorityTicket = None):
+        if ticket is not None:
+            request_ticket.set(ticket)
+        await scheduler.acquire(PRIORITY_PREFETCH)
+        order.append(name)
+
+    async def main():
+        ticket = PriorityTicket(PRIORITY_PREFETCH)
+        tasks = [asyncio.ensure_future(request("other")), asyncio.ensure_future(request("ticket", ticket))]
+        await asyncio.sleep(0)
+        scheduler.promote(ticket)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["ticket", "other"]
+    assert scheduler.stats()["promoted"] == {PRIORITY_INTERACTIVE: 1}
+    assert scheduler.granted == {PRIORITY_INTERACTIVE: 1, PRIORITY_PREFETCH: 1}
+
+
+def test_take_runs_queued_prefetch_at_once():
+    prefetcher = Prefetcher(concurrency=1)
+    priorities = []
+
+    async def blocking():
+        await asyncio.sleep(10)
+
+    async def wanted():
+        priorities.append(current_priority(PRIORITY_PREFETCH))
+        return ["hotel"]
+
+    async def main():
+        prefetcher.start(1, "slow", blocking)
+        prefetcher.start(1, "wanted", wanted)
+        await asyncio.sleep(0)
+        result = await asyncio.wait_for(prefetcher.take(1, "wanted"), 1)
+        prefetcher.cancel(1)
+        return result
+
+    assert asyncio.run(main()) == (True, ["hotel"])
+    assert priorities == [PRIORITY_INTERACTIVE]
+    assert prefetcher.counters["promoted"] == 1 and prefetcher.counters["used"] == 1
+
+
+def test_take_promotes_request_waiting_in_shared_flight(scheduler):
+    prefetcher = Prefetcher()
+    flights = SingleFlight()
+
+    async def download():
+        await scheduler.acquire(PRIORITY_PREFETCH)
+        return ["hotel"]
+
+    async def main():
+        prefetcher.start(1, "offer", lambda: flights.do("offer", download))
+        await asyncio.sleep(PAUSE / 5)
+        return await asyncio.wait_for(prefetcher.take(1, "offer"), 1)
+
+    assert asyncio.run(main()) == (True, ["hotel"])
+    assert scheduler.granted == {PRIORITY_INTERACTIVE: 1}
+
+
+def test_untaken_result_expires():
+    prefetcher = Prefetcher(result_ttl=0.01)
+
+    async def done():
+        return ["hotel"]
+
+    async def main():
+        prefetcher.start(1, "offer", done)
+        await asyncio.sleep(0.05)
+        return await prefetcher.take(1, "offer")
+
+    assert asyncio.run(main()) == (False, None)
+    assert prefetcher.counters["expired"] == 1 and prefetcher.counters["wasted"] == 1
+    assert not prefetcher._tasks
+
+
+@pytest.mark.parametrize("head_start", [0.0, 0.01])
+def test_user_does_not_wait_for_offer_prefetch_priority(monkeypatch, head_start):
+    import site_api
+    from api_service import offer_prefetcher
+    from bot.handlers import machine_bot
+    from records import Hotel
+
+    hotels = [Hotel(id="1", name="Hotel", dist=1.0, unit="KILOMETER", price=100.0, currency="USD")]
+    requests = []
+
+    async def get_hotels_list_async(**kwargs):
+        await asyncio.sleep(0.02)
+        requests.append(current_priority(kwargs['priority']))
+        return list(hotels)
+
+    async def user_result_size(user_id):
+        return 10
+
+    monkeypatch.setattr(site_api, "get_hotels_list_async", get_hotels_list_async)
+    monkeypatch.setattr(machine_bot, "user_result_size", user_result_size)
+    monkeypatch.setattr(machine_bot, "PREFETCH_OFFER", True)
+    monkeypatch.setattr(machine_bot, "guests_counter", machine_bot.Counter())
+    adults, children = machine_bot.PREFETCH_OFFER_GUESTS
+    data = {'region_info': {'id': "123"}, 'dates': ["01/01/2030", "05/01/2030"]}
+
+    async def main():
+        await machine_bot.prefetch_hotel_offer(7, data)
+        await asyncio.sleep(head_start)
+        data.update(adults=adults, children=list(children))
+        return await machine_bot.request_hotel_data(7, data)
+
+    assert asyncio.run(main()) == hotels
+    assert requests == [PRIORITY_INTERACTIVE]
+    assert offer_prefetcher.counters["promoted"] >= 1
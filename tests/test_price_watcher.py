@@ -0,0 +1,84 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import site_api
+from bot import price_watcher
+from constants import LEXICON, MAX_RESULT_SIZE, PRICE_WATCH_MAX_PAGES, PRICE_WATCH_UNTRACKED_AFTER
+from db import PriceWatch
+from records import Hotel
+
+
+def make_hotels(start: int, size: int = MAX_RESULT_SIZE) -> list:
+    return [Hotel(id=str(x), name=f"Hotel {x}", dist=1.0, unit="KILOMETER", price=100.0 + x, currency="USD")
+            for x in range(start, start + size)]
+
+
+def add_watch(storage: PriceWatch, user_id: int, hotel_id: str, results_size: int, price: float = 200.0) -> None:
+    storage.add_watch(user_id=user_id, chat_id=user_id, hotel={'id': hotel_id, 'name': f"Hotel {hotel_id}",
+                                                               'price': price, 'currency': "USD"},
+                      region_id="123", dates=["01/01/2099", "05/01/2099"], adults=2, children=[],
+                      results_size=results_size)
+
+
+@pytest.fixture
+def watcher(monkeypatch, tmp_path):
+    """ Подписки во временной БД, выдача сервера - страницы по MAX_RESULT_SIZE отелей, всего total отелей """
+    session = SimpleNamespace(total=3 * MAX_RESULT_SIZE, requests=[], sent=[], fail=False)
+    monkeypatch.setattr(PriceWatch, "db_name", str(tmp_path / "watch.db"))
+
+    async def get_hotels_list_async(**kwargs):
+        session.requests.append((kwargs['start_index'], kwargs['results_size']))
+        if session.fail:
+            return None
+        start = kwargs['start_index']
+        return make_hotels(start, max(0, min(kwargs['results_size'], session.total - start)))
+
+    async def send_message(chat_id, text):
+        session.sent.append((chat_id, text))
+
+    monkeypatch.setattr(site_api, "get_hotels_list_async", get_hotels_list_async)
+    monkeypatch.setattr(price_watcher, "bot", SimpleNamespace(send_message=send_message))
+    session.storage = PriceWatch()
+    return session
+
+
+def test_results_size_does_not_split_groups(watcher):
+    add_watch(watcher.storage, 1, "3", results_size=5)
+    add_watch(watcher.storage, 2, "4", results_size=10)
+    groups = price_watcher.group_watches(watcher.storage.get_all_watches())
+    assert len(groups) == 1
+    counters = asyncio.run(price_watcher.poll_price_watches())
+    assert counters["requests"] == 1 and watcher.requests == [(0, MAX_RESULT_SIZE)]
+    assert counters["drops"] == 2
+
+
+def test_hotel_beyond_first_page_is_found(watcher):
+    add_watch(watcher.storage, 1, str(MAX_RESULT_SIZE + 2), results_size=5)
+    counters = asyncio.run(price_watcher.poll_price_watches())
+    assert watcher.requests == [(0, MAX_RESULT_SIZE), (MAX_RESULT_SIZE, MAX_RESULT_SIZE)]
+    assert counters["drops"] == 1 and counters["untracked"] == 0
+
+
+def test_missing_hotel_is_reported_and_removed(watcher, monkeypatch):
+    add_watch(watcher.storage, 1, "999", results_size=5)
+    asyncio.run(price_watcher.poll_price_watches())
+    assert len(watcher.requests) == PRICE_WATCH_MAX_PAGES and not watcher.sent
+    assert watcher.storage.get_all_watches()
+
+    later = time.time() + PRICE_WATCH_UNTRACKED_AFTER + 1
+    monkeypatch.setattr(time, "time", lambda: later)
+    counters = asyncio.run(price_watcher.poll_price_watches())
+    assert counters["untracked"] == 1 and not watcher.storage.get_all_watches()
+    assert watcher.sent and watcher.sent[0][1].startswith(LEXICON['watch_untracked'])
+
+
+def test_failed_search_keeps_watch(watcher, monkeypatch):
+    add_watch(watcher.storage, 1, "3", results_size=5)
+    watcher.fail = True
+    later = time.time() + PRICE_WATCH_UNTRACKED_AFTER + 1
+    monkeypatch.setattr(time, "time", lambda: later)
+    counters = asyncio.run(price_watcher.poll_price_watches())
+    assert counters["untracked"] == 0 and watcher.storage.get_all_watches() and not watcher.sent
@@ -0,0 +1,72 @@
+from array import array
+from math import isclose
+
+import pytest
+
+from bot.handlers.commands_bot import check_weights_string
+from constants import MILE_KM, RANK_WEIGHTS
+from records import Hotel
+from site_api.ranking import UNKNOWN, UNKNOWN_RANK, check_weights, distance_km, normalize, rank_hotels, rank_scores
+
+
+def hotel(hotel_id: str, price: float, dist: float = 1.0, unit: str = "KILOMETER", stars=None, score=None) -> Hotel:
+    return Hotel(id=hotel_id, name=f"Hotel {hotel_id}", dist=dist, unit=unit, price=price, currency="USD",
+                 stars=stars, score=score)
+
+
+def test_distance_in_km():
+    assert isclose(distance_km(2, "MILE"), 2 * MILE_KM)
+    assert distance_km(2, "KILOMETER") == 2.0
+    assert distance_km(None, "MILE") == 0.0
+
+
+def test_normalize_scale_and_unknown_values():
+    assert list(normalize(array('d', [10, 20, 30]), weight=2)) == [0.0, 1.0, 2.0]
+    assert list(normalize(array('d', [10, 20, 30]), higher_better=True)) == [1.0, 0.5, 0.0]
+    assert list(normalize(array('d', [5, UNKNOWN, 5]))) == [0.0, UNKNOWN_RANK, 0.0]
+    assert list(normalize(array('d', [UNKNOWN, UNKNOWN]), weight=2)) == [2 * UNKNOWN_RANK] * 2
+
+
+def test_check_weights_falls_back_to_defaults():
+    assert check_weights((2, 2, 0, 0)) == (0.5, 0.5, 0.0, 0.0)
+    default = check_weights(RANK_WEIGHTS)
+    for weights in (None, (), (1, 1), (0, 0, 0, 0), (-1, 1, 1, 1)):
+        assert check_weights(weights) == default
+
+
+def test_rank_scores_prefer_cheap_near_and_good():
+    hotels = [hotel("cheap", 50, dist=5), hotel("near", 200, dist=0.5), hotel("best", 50, dist=0.5, score=9.5),
+              hotel("worst", 200, dist=5, score=6.0)]
+    scores = rank_scores(hotels, (1, 1, 0, 1))
+    assert min(range(4), key=scores.__getitem__) == 2
+    assert max(range(4), key=scores.__getitem__) == 3
+    assert isclose(scores[0], scores[1])
+
+
+def test_zero_weight_ignores_factor():
+    hotels = [hotel("1", 100, stars=5.0), hotel("2", 100, stars=2.0)]
+    assert list(rank_scores(hotels, (1, 0, 0, 0))) == [0.0, 0.0]
+    assert rank_scores(hotels, (0, 0, 1, 0))[0] < rank_scores(hotels, (0, 0, 1, 0))[1]
+
+
+def test_rank_hotels_returns_new_records():
+    hotels = [hotel("1", 100), hotel("2", 300)]
+    ranked = rank_hotels(hotels, (1, 0, 0, 0))
+    assert [x.bestdeal for x in ranked] == [0.0, 1.0]
+    assert all(x.bestdeal is None for x in hotels)
+    assert rank_hotels([]) == [] and rank_hotels(None) is None
+
+
+@pytest.mark.parametrize("text, weights", [
+    ("1 0.5 0 2", (1.0, 0.5, 0.0, 2.0)),
+    ("  1   1 0 0 ", (1.0, 1.0, 0.0, 0.0)),
+    ("-1 1 1 1", None),
+    ("1 1 1 +1", None),
+    ("1,5 1 1 1", None),
+    ("1 1 1", None),
+    ("0 0 0 0", None),
+    ("1 1 1 1 1", None),
+    ("1 1 1 x1", None),
+])
+def test_weights_string(text, weights):
+    assert check_weights_string(text) == weights
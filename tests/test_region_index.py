@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+import site_api
+from bot.handlers import machine_bot
+from site_api.region_index import RegionIndex, normalize_name
+
+BARILOCHE = {'id': "1", 'type': "CITY", 'a3_code': "ARG", 'country_name': "Argentina",
+             'name': "San Carlos de Bariloche, Rio Negro, Argentina"}
+BARI = {'id': "2", 'type': "CITY", 'a3_code': "ITA", 'country_name': "Italy", 'name': "Bari, Apulia, Italy"}
+MUNICH = {'id': "3", 'type': "CITY", 'a3_code': "DEU", 'country_name': "Germany",
+          'name': "München, Bavaria, Germany"}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = RegionIndex(str(tmp_path / "regions.jsonl"))
+    index.add("bariloche", [BARILOCHE])
+    index.add("мюнхен", [MUNICH])
+    return index
+
+
+def test_normalize_name():
+    assert normalize_name("  München,   Bavaria ") == "munchen bavaria"
+    assert normalize_name("Мюнхен") == "myunkhen"
+
+
+def test_lookup_returns_only_exact_answers(index):
+    assert [x['id'] for x in index.lookup("Bariloche")] == ["1"]
+    assert [x['id'] for x in index.lookup("МЮНХЕН")] == ["3"]
+    assert index.lookup("bari") is None
+    assert index.lookup("barilochee") is None
+    assert index.hits["exact"] == 2 and index.hits["miss"] == 2
+
+
+def test_suggest_prefix_and_fuzzy(index):
+    assert [x['id'] for x in index.suggest("bari")] == ["1"]
+    assert [x['id'] for x in index.suggest("munc")] == ["3"]
+    assert [x['id'] for x in index.suggest("barilochee")] == ["1"]
+    assert index.suggest("bar") == [] and index.suggest("") == []
+    assert index.hits["prefix"] == 2 and index.hits["fuzzy"] == 1
+
+
+def test_index_is_restored_from_file(index):
+    restored = RegionIndex(index.file_name)
+    assert [x['id'] for x in restored.lookup("bariloche")] == ["1"]
+    assert len(restored) == 2
+
+
+def test_request_region_name_asks_server_for_prefix_hits(index, monkeypatch):
+    requests = []
+
+    async def get_places_list_async(target_place, **kwargs):
+        requests.append(target_place)
+        places = [BARI] if target_place == "bari" else None
+        if places:
+            index.add(target_place, places)
+        return places
+
+    monkeypatch.setattr(site_api, "region_index", index)
+    monkeypatch.setattr(site_api, "get_places_list_async", get_places_list_async)
+
+    async def main():
+        return [[x['id'] for x in await machine_bot.request_region_name({'region_name': name})]
+                for name in ("bari", "bari", "barilochee", "bariloche")]
+
+    assert asyncio.run(main()) == [["2", "1"], ["2"], ["1"], ["1"]]
+    assert requests == ["bari", "barilochee"]
@@ -0,0 +1,22 @@
+import time
+from types import SimpleNamespace
+
+import init_site_api
+from api_service.scheduler import QuotaScheduler
+from init_site_api import SiteApi, site
+
+
+def test_sync_429_pauses_shared_scheduler(monkeypatch):
+    quota = QuotaScheduler(rate=1000.0, burst=1)
+    responses = [SimpleNamespace(status_code=429, headers={'Retry-After': "3"}),
+                 SimpleNamespace(status_code=200, headers={}, raise_for_status=lambda: None, json=lambda: {"ok": 1})]
+    sleeps = []
+    monkeypatch.setattr(init_site_api, "quota_scheduler", quota)
+    monkeypatch.setattr(init_site_api.requests, "request", lambda *args, **kwargs: responses.pop(0))
+    monkeypatch.setattr(init_site_api.time, "sleep", sleeps.append)
+
+    place = SiteApi(**site.place.url)
+    place.get_data(site.place.query)
+    assert place.status and place.json_encoders == {"ok": 1}
+    assert quota.paused_until > time.monotonic() + 2
+    assert len(sleeps) == 1 and sleeps[0] > 2
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+from collections import Counter
+from datetime import date, timedelta
+from typing import List, Tuple
+
+import site_api
+from api_service import http_pool, quota_scheduler, response_cache
+from constants import PRIORITY_WARMER, WARMER_CONCURRENCY, UsersConstants
+
+
+class CacheWarmer:
+    """
+    Заполняет кэш ответов Hotels.com заранее, например ночью, чтобы первые утренние запросы
+    пользователей брались из кэша. Запросы идут с приоритетом PRIORITY_WARMER,
+    поэтому при малом остатке месячного лимита планировщик quota_scheduler их отбрасывает.
+    Одновременно выполняется не больше concurrency запросов.
+    """
+
+    def __init__(self, concurrency: int = WARMER_CONCURRENCY, not_debug: bool = True):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.not_debug = not_debug
+        self.counters: Counter = Counter()
+
+    def __str__(self):
+        """ Строковое представление класса """
+        return ", ".join(f"{name}: {count}" for name, count in sorted(self.counters.items()))
+
+    def stopped(self) -> bool:
+        """ Остановить прогрев, если лимит запросов зарезервирован для пользователей """
+        return quota_scheduler.should_shed(PRIORITY_WARMER)
+
+    async def regions(self, target: str, per_name: int = 1) -> List[str]:
+        """
+        Возвращает id регионов: число считается id региона, иначе ищутся регионы с таким названием.
+        :param target: название или id региона
+        :param per_name: сколько первых найденных регионов прогревать для одного названия
+        :return: список id регионов
+        """
+        if target.isdigit():
+            return [target]
+        async with self.semaphore:
+            places = await site_api.get_places_list_async(
+                target_place=target, priority=PRIORITY_WARMER, use_cache=True, not_debug=self.not_debug
+            )
+        self.counters["regions"] += 1
+        return [x['id'] for x in (places or [])[:per_name]]
+
+    async def offers(self, region_id: str, dates: Tuple[str, str], guests: Tuple[int, List[int]],
+                     results_size: int, summaries: int) -> None:
+        """
+        Прогревает список отелей региона на даты dates для гостей guests
+        и подробности первых summaries самых дешевых отелей.
+        """
+        if self.stopped():
+            self.counters["skipped"] += 1
+            return
+        async with self.semaphore:
+            hotels = await site_api.get_hotels_list_async(
+                region_id=region_id, in_date=dates[0], out_date=dates[1],
+                adults=guests[0], children=guests[1], results_size=results_size,
+                priority=PRIORITY_WARMER, use_cache=True, not_debug=self.not_debug
+            )
+        self.counters["offers" if hotels else "empty_offers"] += 1
+        await asyncio.gather(*[self.summary(hotel['id']) for hotel in (hotels or [])[:summaries]])
+
+    async def summary(self, hotel_id: str) -> None:
+        """ Прогревает подробности отеля """
+        if self.stopped():
+            self.counters["skipped"] += 1
+            return
+        async with self.semaphore:
+            summary = await site_api.get_summary_list_async(
+                look_hotel_id=hotel_id, priority=PRIORITY_WARMER, use_cache=True, not_debug=self.not_debug
+            )
+        self.counters["summaries" if summary else "empty_summaries"] += 1
+
+    async def run(self, targets: List[str], dates_list: List[Tuple[str, str]],
+                  guests_list: List[Tuple[int, List[int]]], results_size: int,
+                  summaries: int, per_name: int = 1) -> None:
+        """ Прогревает кэш для всех сочетаний регионов, дат и гостей """
+        regions_id = await asyncio.gather(*[self.regions(x, per_name) for x in targets])
+        regions_id = list(dict.fromkeys(x for ids in regions_id for x in ids))
+        await asyncio.gather(*[
+            self.offers(region_id, dates, guests, results_size, summaries)
+            for region_id in regions_id for dates in dates_list for guests in guests_list
+        ])
+
+
+def date_window(start: int, days: int, nights: List[int]) -> List[Tuple[str, str]]:
+    """
+    Создает пары дат заезда и выезда в формате бота dd/mm/YYYY.
+    :param start: через сколько дней от сегодняшнего первая дата заезда
+    :param days: количество дат заезда подряд
+    :param nights: варианты количества ночей
+    :return: список пар (дата заезда, дата выезда)
+    """
+    first = date.today() + timedelta(days=start)
+    checkins = [first + timedelta(days=x) for x in range(days)]
+    return [(x.strftime("%d/%m/%Y"), (x + timedelta(days=n)).strftime("%d/%m/%Y")) for x in checkins for n in nights]
+
+
+def guests_value(src: str) -> Tuple[int, List[int]]:
+    """
+    Разбирает сочетание гостей: "2" - двое взрослых, "2:5,7" - двое взрослых и дети 5 и 7 лет.
+    Возраст детей сортируется так же, как в запросе, чтобы ключ кэша совпадал с запросом бота.
+    """
+    adults, _, children = src.partition(":")
+    return int(adults), sorted(int(x) for x in children.split(",") if x.strip())
+
+
+async def main(args: argparse.Namespace) -> None:
+    """ Прогревает кэш и закрывает общий пул соединений и дисковый кэш """
+    warmer = CacheWarmer(args.concurrency, not_debug=not args.debug)
+    try:
+        await warmer.run(
+            args.regions, date_window(args.start, args.days, args.nights),
+            [guests_value(x) for x in args.guests], args.results, args.summaries, args.per_name
+        )
+    finally:
+        await http_pool.close()
+        response_cache.close()
+    print(f"прогрев: {warmer}")
+    print(f"кэш: {response_cache}")
+    print(f"планировщик: {quota_scheduler}")
+
+
+if __name__ == '__main__':
+    """
+    Прогревает кэш ответов Hotels.com для популярных регионов, дат и гостей.
+    python warm_cache.py Munchen 2452 --start 1 --days 7 --nights 1 3 --guests 2 2:5,7 --summaries 3
+    """
+    parser = argparse.ArgumentParser(description="Заполняет кэш ответов Hotels.com заранее")
+    parser.add_argument("regions", nargs="+", help="названия регионов или id регионов")
+    parser.add_argument("--per-name", type=int, default=1, help="сколько найденных регионов брать для названия")
+    parser.add_argument("--start", type=int, default=1, help="через сколько дней первая дата заезда")
+    parser.add_argument("--days", type=int, default=7, help="количество дат заезда подряд")
+    parser.add_argument("--nights", type=int, nargs="+", default=[1], help="варианты количества ночей")
+    parser.add_argument("--guests", nargs="+", default=["2"], help='сочетания гостей: "2" или "2:5,7"')
+    parser.add_argument("--results", type=int, default=UsersConstants.RESULT_SIZE,
+                        help="количество отелей в выдаче, как в настройках пользователя")
+    parser.add_argument("--summaries", type=int, default=0, help="сколько первых отелей прогревать подробно")
+    parser.add_argument("--concurrency", type=int, default=WARMER_CONCURRENCY, help="одновременных запросов")
+    parser.add_argument("--debug", action="store_true", help="выводить отладочные сообщения")
+    asyncio.run(main(parser.parse_args()))